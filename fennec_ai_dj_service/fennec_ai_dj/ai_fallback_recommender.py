@@ -1,6 +1,56 @@
-import random
-from fennec_ai_dj.spotify_api import get_audio_features
+# fennec_ai_dj/ai_fallback_recommender.py
+"""
+Spotify-search fallback for when the local catalog can't answer.
 
+• genres: the GENRES_PER_QUERY genre prototypes closest to the user's
+  profile (raw audio features, compared in FEATURE_SCALE units)
+• candidate pool: SEARCH_PAGES pages of every genre searched concurrently,
+  deduped by id, the user's own seed tracks removed
+• features: feature_store.backfill – shared cache, cold ids fetched as
+  concurrent 100-id /audio-features calls
+• scoring: one (n, 5) matrix op, scaled distance to the profile
+
+Latency is one round of parallel searches plus one round of feature calls
+(none once the candidates are cached).
+
+   recs = await generate_recommendations_async(tok, enriched_tracks, count=5)
+"""
+from __future__ import annotations
+import random, asyncio
+import numpy as np
+
+from fennec_ai_dj.spotify_client import spotify
+from fennec_ai_dj.spotify_api import feature_store
+from fennec_ai_dj.feature_store import COLS
+from fennec_ai_dj.local_ml.track_json import track_obj
+
+SEARCH_LIMIT     = 50     # /v1/search maximum per page
+SEARCH_PAGES     = 2
+GENRES_PER_QUERY = 3
+
+# rough centre of each genre in COLS order (danceability, energy, valence, acousticness, tempo)
+GENRE_PROFILES = {
+    "pop":       (0.65, 0.65, 0.55, 0.20, 118),
+    "dance":     (0.75, 0.80, 0.55, 0.08, 124),
+    "edm":       (0.62, 0.85, 0.40, 0.05, 128),
+    "hip-hop":   (0.78, 0.62, 0.50, 0.15, 100),
+    "r-n-b":     (0.68, 0.55, 0.50, 0.25, 105),
+    "latin":     (0.72, 0.72, 0.70, 0.20, 115),
+    "rock":      (0.50, 0.78, 0.50, 0.10, 125),
+    "metal":     (0.42, 0.92, 0.30, 0.01, 130),
+    "indie":     (0.55, 0.55, 0.45, 0.30, 118),
+    "soul":      (0.60, 0.50, 0.55, 0.40, 105),
+    "chill":     (0.60, 0.40, 0.40, 0.50, 100),
+    "acoustic":  (0.52, 0.35, 0.45, 0.75, 112),
+    "jazz":      (0.55, 0.35, 0.50, 0.65, 110),
+    "sad":       (0.45, 0.35, 0.20, 0.55, 105),
+    "classical": (0.30, 0.15, 0.25, 0.90, 100),
+}
+_GENRES  = list(GENRE_PROFILES)
+_PROTO   = np.array([GENRE_PROFILES[g] for g in _GENRES], dtype=np.float64)
+FEATURE_SCALE = np.array([0.15, 0.20, 0.25, 0.30, 25.0])   # ≈ one spread per feature
+
+# ─── profile ─────────────────────────────────────────────────────────────────
 def compute_user_profile(tracks):
     keys = ["danceability", "energy", "tempo", "valence", "acousticness"]
     profile = {k: 0.0 for k in keys}
@@ -16,51 +66,66 @@ def compute_user_profile(tracks):
         profile[k] /= len(valid)
     return profile
 
-def search_candidate_tracks(access_token, genre="pop"):
-    import requests
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"q": f"genre:{genre}", "type": "track", "limit": 20}
-    res = requests.get("https://api.spotify.com/v1/search", headers=headers, params=params)
+def _vec(profile:dict) -> np.ndarray:
+    return np.array([profile[c] for c in COLS], dtype=np.float64)
+
+def genres_for(profile:dict, n:int=GENRES_PER_QUERY) -> list[str]:
+    d = np.linalg.norm((_PROTO - _vec(profile)) / FEATURE_SCALE, axis=1)
+    return [_GENRES[i] for i in np.argsort(d)[:n]]
+
+# ─── candidate pool ──────────────────────────────────────────────────────────
+async def search_candidate_tracks(access_token, genre="pop", limit=SEARCH_LIMIT, offset=0):
+    """One /v1/search page; failures → [] (the other pages still count)."""
+    try:
+        res = await spotify.aget("/search", access_token, {"q": f"genre:{genre}", "type": "track",
+                                                           "limit": limit, "offset": offset})
+    except Exception as e:
+        print("Search failed:", genre, offset, e)
+        return []
     if res.status_code != 200:
         print("Search failed:", res.text)
         return []
-    items = res.json().get("tracks", {}).get("items", [])
     return [{
         "id": t["id"],
         "name": t["name"],
         "artist": t["artists"][0]["name"],
         "album": t["album"]["name"],
         "image": t["album"]["images"][0]["url"] if t["album"].get("images") else ""
-    } for t in items]
+    } for t in res.json().get("tracks", {}).get("items", []) if t and t.get("id")]
+
+async def candidate_pool(access_token, genres:list[str], pages:int=SEARCH_PAGES) -> list[dict]:
+    """Every genre × page at once, deduped (first hit wins)."""
+    res = await asyncio.gather(*(search_candidate_tracks(access_token, g, SEARCH_LIMIT, p*SEARCH_LIMIT)
+                                 for g in genres for p in range(pages)))
+    pool = {}
+    for page in res:
+        for t in page:
+            pool.setdefault(t["id"], t)
+    return list(pool.values())
 
-def score_candidates(user_profile, candidates, features):
-    def dist(a, b):
-        return sum((a[k] - b.get(k, 0.0))**2 for k in a) ** 0.5
-    scored = [(t, dist(user_profile, f)) for t, f in zip(candidates, features) if f]
-    scored.sort(key=lambda x: x[1])
-    return [t for t, _ in scored]
+# ─── scoring ─────────────────────────────────────────────────────────────────
+def score_candidates(user_profile, candidates, features) -> list[dict]:
+    """Candidates with features, closest first.  features: id → raw COLS vector."""
+    have = [t for t in candidates if t["id"] in features]
+    if not have: return []
+    X = np.stack([features[t["id"]] for t in have])
+    d = np.linalg.norm((X - _vec(user_profile)) / FEATURE_SCALE, axis=1)
+    return [have[i] for i in np.argsort(d, kind="stable")]
 
-def generate_recommendations(access_token, enriched_tracks):
+async def generate_recommendations_async(access_token, enriched_tracks, count:int=5):
     profile = compute_user_profile(enriched_tracks)
     if profile:
-        candidates = search_candidate_tracks(access_token, genre="pop")
+        seen = {t.get("id") for t in enriched_tracks}
+        candidates = [c for c in await candidate_pool(access_token, genres_for(profile))
+                      if c["id"] not in seen]
         if candidates:
-            ids = [c["id"] for c in candidates]
-            features = get_audio_features(ids, access_token)
-            top = score_candidates(profile, candidates, features)[:5]
-            return _reformat_for_frontend(top)
-    return _reformat_for_frontend(random.sample(enriched_tracks, min(5, len(enriched_tracks))))
+            features = await feature_store.backfill([c["id"] for c in candidates], access_token)
+            top = score_candidates(profile, candidates, features)[:count]
+            if top:
+                return _reformat_for_frontend(top)
+    return _reformat_for_frontend(random.sample(enriched_tracks, min(count, len(enriched_tracks))))
 
 def _reformat_for_frontend(tracks):
-    formatted = []
-    for t in tracks:
-        formatted.append({
-            "id": t.get("id"),
-            "name": t.get("name"),
-            "artists": [{"name": t.get("artist", "Unknown")}],
-            "album": {
-                "name": t.get("album", "Unknown"),
-                "images": [{"url": t.get("image", "")}]
-            }
-        })
-    return formatted
+    # same response shape as the catalog fragments (local_ml.track_json)
+    return [track_obj(t.get("id"), t.get("name"), t.get("artist", "Unknown"),
+                      t.get("album"), t.get("image")) for t in tracks]
@@ -0,0 +1,173 @@
+# fennec_ai_dj/daily_mix.py
+"""
+Batch "daily mix" precompute for many users at once.
+
+   python -m fennec_ai_dj.daily_mix build [--workers 4] [--shard-size 256] [--k 50]
+   python -m fennec_ai_dj.daily_mix show USER_ID
+
+Per shard of users (one process each):
+  1. every user's weighted seed ids → catalog rows in one id_positions call
+  2. profiles = Σw·x / Σw for all users at once (np.add.at / bincount into
+     an (users,5) matrix, already in the scaler's normalised space); users
+     whose dislikes outweigh their likes (Σw ≤ 0) get no mix
+  3. one kmeans.predict over the matrix → mood cluster per user
+  4. one (users × catalog) distance pass → top-k per user, dislikes masked
+Results land in DailyMixStore (SQLite, WAL).  Mixes only see feedback,
+not the live Spotify seeds, so /recommendations serves one only when asked
+(?mix=true) instead of fetching seeds and ranking.
+
+   build_daily_mixes({user: {track_id: weight}}, excludes={user: [ids]})
+"""
+from __future__ import annotations
+import os, sys, json, time, sqlite3, argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import Lock
+import numpy as np
+
+DEFAULT_DB  = os.path.join(os.path.dirname(__file__), "daily_mix.db")
+DB_PATH     = os.getenv("DAILY_MIX_DB", DEFAULT_DB)
+MIX_SIZE    = int(os.getenv("DAILY_MIX_SIZE", "50"))
+MAX_AGE     = float(os.getenv("DAILY_MIX_MAX_AGE", str(26*3600)))
+SHARD_SIZE  = 256
+FEEDBACK_WEIGHTS = {"like":3, "dislike":-3}      # same as main.WEIGHTS
+
+# ─── store ───────────────────────────────────────────────────────────────────
+class DailyMixStore:
+    def __init__(self, db_path:str=DB_PATH):
+        self._lock = Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS daily_mix(
+            user_id TEXT PRIMARY KEY, built_at REAL NOT NULL,
+            cluster INTEGER, track_ids TEXT NOT NULL)""")
+        self._db.commit()
+
+    def put_many(self, rows:list[tuple[str,int|None,list[str]]]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO daily_mix VALUES (?,?,?,?)",
+                                 [(u, now, c, json.dumps(ids)) for u, c, ids in rows])
+            self._db.commit()
+
+    def delete_many(self, users:list[str]):
+        with self._lock:
+            self._db.executemany("DELETE FROM daily_mix WHERE user_id=?", [(u,) for u in users])
+            self._db.commit()
+
+    def get(self, user_id:str, max_age:float=MAX_AGE) -> dict|None:
+        with self._lock:
+            row = self._db.execute("SELECT built_at, cluster, track_ids FROM daily_mix "
+                                   "WHERE user_id=?", (user_id,)).fetchone()
+        if not row or time.time() - row[0] > max_age:
+            return None
+        return {"built_at":row[0], "cluster":row[1], "track_ids":json.loads(row[2])}
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM daily_mix").fetchone()[0]
+
+# ─── batch compute (runs inside a worker process) ────────────────────────────
+def compute_shard(users:list[str], seeds:list[dict[str,float]],
+                  excludes:list[list[str]], k:int=MIX_SIZE) -> list[tuple[str,int|None,list[str]]]:
+    """(user, cluster, top-k track ids) for every user with a usable profile."""
+    from fennec_ai_dj.local_ml.local_song_recommender import registry
+    art = registry.current()                       # one artifact version for the whole shard
+    catalog, ranker, kmeans = art.catalog, art.ranker, art.kmeans
+
+    uidx = np.repeat(np.arange(len(users)), [len(s) for s in seeds])
+    ids  = [t for s in seeds for t in s]
+    w    = np.fromiter((x for s in seeds for x in s.values()), dtype=np.float64, count=len(ids))
+    pos  = catalog.id_positions(ids)
+    hit  = pos >= 0
+    uidx, w, pos = uidx[hit], w[hit], pos[hit]
+
+    # Σw·x / Σw in scaled space == scaler.transform(Σw·raw / Σw) – it's affine
+    num = np.zeros((len(users), ranker.matrix.shape[1]), dtype=np.float64)
+    np.add.at(num, uidx, w[:, None] * ranker.matrix[pos])
+    den = np.bincount(uidx, weights=w, minlength=len(users))
+    ok  = (np.bincount(uidx, minlength=len(users)) > 0) & (den > 0)   # Σw ≤ 0: num/den would point at the dislikes
+    if not ok.any():
+        return []
+    q = num[ok] / den[ok, None]
+
+    clusters = kmeans.predict(q)
+    excl = [catalog.id_positions(excludes[i]) for i in np.flatnonzero(ok)]
+    top  = ranker.top_k_scaled(q, k, excludes=[e[e >= 0] for e in excl])
+    out_users = [users[i] for i in np.flatnonzero(ok)]
+    return [(u, int(c), list(catalog.ids_at(rows)))
+            for u, c, rows in zip(out_users, clusters, top)]
+
+def _shard_job(args):
+    return compute_shard(*args)
+
+def build_daily_mixes(user_seeds:dict[str,dict[str,float]],
+                      excludes:dict[str,list[str]]|None=None, k:int=MIX_SIZE,
+                      workers:int|None=None, shard_size:int=SHARD_SIZE,
+                      store:DailyMixStore|None=None) -> int:
+    """Compute + store mixes; returns the number of users written."""
+    store    = DailyMixStore() if store is None else store
+    excludes = excludes or {}
+    users    = list(user_seeds)
+    shards   = [(users[i:i+shard_size],
+                 [user_seeds[u] for u in users[i:i+shard_size]],
+                 [list(excludes.get(u, ())) for u in users[i:i+shard_size]], k)
+                for i in range(0, len(users), shard_size)]
+    workers = workers or min(len(shards), os.cpu_count() or 1)
+    written = 0
+    def _store(shard, rows):
+        nonlocal written
+        store.put_many(rows); written += len(rows)
+        got = {u for u, _, _ in rows}                 # no usable profile now → old mix goes
+        store.delete_many([u for u in shard[0] if u not in got])
+    if workers <= 1:
+        for shard in shards:
+            _store(shard, _shard_job(shard))
+        return written
+    # spawn: workers mmap the catalog themselves; no forked locks/threads
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        for shard, rows in zip(shards, pool.map(_shard_job, shards)):
+            _store(shard, rows)
+    return written
+
+def feedback_seeds(backend) -> tuple[dict[str,dict[str,float]], dict[str,list[str]]]:
+    """Weighted seeds + exclusions for every user in the feedback store."""
+    seeds, excl = {}, {}
+    for u in backend.users():
+        likes, dislikes = backend.liked(u), backend.disliked(u)
+        seeds[u] = ({t:FEEDBACK_WEIGHTS["like"] for t in likes} |
+                    {t:FEEDBACK_WEIGHTS["dislike"] for t in dislikes})
+        excl[u] = dislikes
+    return seeds, excl
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="daily_mix")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--workers",    type=int, default=None)
+    b.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    b.add_argument("--k",          type=int, default=MIX_SIZE)
+    b.add_argument("--db",         default=DB_PATH)
+    s = sub.add_parser("show")
+    s.add_argument("user_id")
+    s.add_argument("--db", default=DB_PATH)
+    args = ap.parse_args(argv)
+
+    store = DailyMixStore(args.db)
+    if args.cmd == "show":
+        print(json.dumps(store.get(args.user_id, float("inf")), indent=2)); return 0
+
+    from fennec_ai_dj.feedback_backends import open_backend
+    fb = open_backend(legacy_json=None)
+    seeds, excl = feedback_seeds(fb)
+    fb.close()
+    t0 = time.perf_counter()
+    n = build_daily_mixes(seeds, excl, args.k, args.workers, args.shard_size, store)
+    dt = time.perf_counter() - t0
+    print(f"✅ {n}/{len(seeds)} daily mixes in {dt:.1f}s ({n/max(dt,1e-9):.0f} users/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
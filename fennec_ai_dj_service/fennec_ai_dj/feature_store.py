@@ -0,0 +1,284 @@
+# fennec_ai_dj/feature_store.py
+"""
+Audio features for seed tracks the local catalog doesn't have.
+
+Catalog rows carry their features; any other Spotify id used to be dropped
+from the profile.  This store keeps their /audio-features vectors instead:
+
+   memory  : bounded LRU
+   disk    : SQLite table (WAL) – shared by workers, survives restarts
+   positive: never expire (a track's audio features don't change), so an id
+             is fetched from Spotify once, ever
+   negative: ids Spotify answers `null` for (long TTL)
+   backfill: ids asked for within BACKFILL_LINGER_MS are coalesced into
+             deduplicated 100-id /audio-features calls, one set per caller
+             token; an id already in flight is awaited, never requested
+             twice.  A call that fails is retried for its ids with the
+             token of another caller that asked for them
+
+   found, cold = feature_store.get_many(ids)      # id → (5,) raw AUDIO_COLS vector
+   found = await feature_store.backfill(ids, tok) # get_many + fetch the cold ones
+   feature_store.prefetch(ids, tok)               # same, fire-and-forget
+   X = catalog_units(found[tid])                  # → catalog scale, for profiles
+
+Vectors are stored in Spotify's units (0-1, tempo in BPM); the catalog keeps
+the 0-1 columns in 1e-3 units, so anything mixed with catalog rows goes
+through catalog_units().
+
+   python -m fennec_ai_dj.feature_store check     # stored vs catalog, same ids
+"""
+from __future__ import annotations
+import os, sys, time, sqlite3, asyncio, weakref, argparse
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+DEFAULT_DB   = os.path.join(os.path.dirname(__file__), "audio_features.db")
+DB_PATH      = os.getenv("AUDIO_FEATURES_DB", DEFAULT_DB)   # "" → memory only
+MAX_ITEMS    = int(os.getenv("AUDIO_FEATURES_MAX_ITEMS", "100000"))
+NEGATIVE_TTL = float(os.getenv("AUDIO_FEATURES_NEGATIVE_TTL", str(30*24*3600)))
+LINGER       = float(os.getenv("BACKFILL_LINGER_MS", "5")) / 1000
+BATCH        = 100    # /v1/audio-features accepts at most 100 ids per call
+CONCURRENCY  = 4
+
+COLS = ["danceability","energy","valence","acousticness","tempo"]   # == main.AUDIO_COLS
+
+# /audio-features → catalog units (filter_engine._SCALE_1K columns are stored ×1e-3)
+CATALOG_SCALE = np.array([1e-3, 1e-3, 1e-3, 1e-3, 1.0])
+
+_MISSING = object()   # marker for negative entries
+
+def vector(obj:dict|None) -> np.ndarray|None:
+    """/audio-features object → raw COLS vector (None if any is absent)."""
+    if not obj or any(obj.get(c) is None for c in COLS): return None
+    return np.array([obj[c] for c in COLS], dtype=np.float64)
+
+def catalog_units(x:np.ndarray) -> np.ndarray:
+    """Raw COLS vector(s) → the catalog's units (the scale profiles are built in)."""
+    return np.asarray(x, dtype=np.float64) * CATALOG_SCALE
+
+class _LoopState:
+    """Backfill bookkeeping for one event loop (futures can't cross loops)."""
+    def __init__(self):
+        self.inflight: dict[str,asyncio.Future] = {}
+        self.pending: dict[str,list[str]] = {}     # token → ids it brought in
+        self.tokens: dict[str,list[str]] = {}      # in-flight id → tokens asking for it
+        self.flush: asyncio.Task|None = None
+        self.sem = asyncio.Semaphore(CONCURRENCY)
+        self.tasks: set[asyncio.Task] = set()
+
+class AudioFeatureStore:
+    def __init__(self, db_path:str|None=DB_PATH, fetch=None, max_items:int=MAX_ITEMS,
+                 negative_ttl:float=NEGATIVE_TTL, linger:float=LINGER, clock=time.time):
+        self.fetch = fetch                    # async (ids, tok) → list[obj|None]; raises on error
+        self.max_items, self.negative_ttl = max_items, negative_ttl
+        self.linger, self.clock = linger, clock
+        self._mem: OrderedDict[str,tuple[object,float]] = OrderedDict()
+        self._lock = Lock()
+        self._loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._db: sqlite3.Connection|None = None
+        self.counters = {"memory_hits":0, "disk_hits":0, "negative_hits":0, "misses":0,
+                         "fetched":0, "calls":0, "coalesced":0, "errors":0, "retried":0}
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute("""CREATE TABLE IF NOT EXISTS audio_features(
+                    id TEXT PRIMARY KEY, x BLOB, missing INTEGER NOT NULL DEFAULT 0,
+                    fetched_at REAL NOT NULL)""")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print("⚠️ audio feature store: disk store disabled:", e)
+                self._db = None
+
+    def _fresh(self, value, ts:float, now:float) -> bool:
+        return value is not _MISSING or now - ts < self.negative_ttl
+
+    def _remember(self, tid:str, value, ts:float):
+        self._mem[tid] = (value, ts)
+        self._mem.move_to_end(tid)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    # ─── read ────────────────────────────────────────────────────────────────
+    def get_many(self, ids:list[str]) -> tuple[dict[str,np.ndarray], list[str]]:
+        """
+        (id → vector for stored ids, ids never fetched).
+        Negatively cached ids appear in neither.
+        """
+        now, out, cold = self.clock(), {}, []
+        with self._lock:
+            for tid in dict.fromkeys(ids):
+                hit = self._mem.get(tid)
+                if hit and self._fresh(hit[0], hit[1], now):
+                    self._mem.move_to_end(tid)
+                    if hit[0] is _MISSING: self.counters["negative_hits"] += 1
+                    else:
+                        out[tid] = hit[0]; self.counters["memory_hits"] += 1
+                else:
+                    cold.append(tid)
+            if cold and self._db is not None:
+                cold = self._load(cold, now, out)
+            self.counters["misses"] += len(cold)
+        return out, cold
+
+    def _load(self, ids:list[str], now:float, out:dict) -> list[str]:
+        found = {}
+        for i in range(0, len(ids), 500):          # SQLite variable limit
+            chunk = ids[i:i+500]
+            q = ("SELECT id, x, missing, fetched_at FROM audio_features "
+                 f"WHERE id IN ({','.join('?'*len(chunk))})")
+            try:
+                for tid, x, missing, ts in self._db.execute(q, chunk):
+                    found[tid] = (_MISSING if missing else np.frombuffer(x, np.float64), ts)
+            except sqlite3.Error as e:
+                print("⚠️ audio feature store read failed:", e)
+                break
+        cold = []
+        for tid in ids:
+            hit = found.get(tid)
+            if hit and self._fresh(hit[0], hit[1], now):
+                self._remember(tid, *hit)
+                if hit[0] is _MISSING: self.counters["negative_hits"] += 1
+                else:
+                    out[tid] = hit[0]; self.counters["disk_hits"] += 1
+            else:
+                cold.append(tid)
+        return cold
+
+    # ─── write ───────────────────────────────────────────────────────────────
+    def put_many(self, xs:dict[str,np.ndarray], missing=()):
+        now = self.clock()
+        missing = [tid for tid in missing if tid not in xs]
+        rows = [(tid, np.asarray(x, np.float64).tobytes(), 0, now) for tid, x in xs.items()]
+        rows += [(tid, None, 1, now) for tid in missing]
+        with self._lock:
+            for tid, x in xs.items():
+                self._remember(tid, np.asarray(x, np.float64), now)
+            for tid in missing:
+                self._remember(tid, _MISSING, now)
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO audio_features VALUES (?,?,?,?)", rows)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print("⚠️ audio feature store write failed:", e)
+
+    # ─── backfill ────────────────────────────────────────────────────────────
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        st = self._loops.get(loop)
+        if st is None:
+            st = self._loops[loop] = _LoopState()
+        return st
+
+    async def backfill(self, ids:list[str], access_token:str) -> dict[str,np.ndarray]:
+        """Stored vectors for ids, fetching the never-seen ones first."""
+        out, cold = self.get_many(ids)
+        if not cold or self.fetch is None: return out
+        st, loop = self._state(), asyncio.get_running_loop()
+        futs = {}
+        for tid in cold:
+            f = st.inflight.get(tid)
+            if f is None:
+                f = st.inflight[tid] = loop.create_future()
+                st.pending.setdefault(access_token, []).append(tid)
+                st.tokens[tid] = [access_token]
+            else:
+                self.counters["coalesced"] += 1
+                if access_token not in st.tokens[tid]: st.tokens[tid].append(access_token)
+            futs[tid] = f
+        if st.pending and st.flush is None:
+            st.flush = loop.create_task(self._flush(st))
+        await asyncio.wait(futs.values())          # wait() never cancels shared futures
+        for tid, f in futs.items():
+            x = f.result()
+            if x is not None: out[tid] = x
+        return out
+
+    def prefetch(self, ids:list[str], access_token:str):
+        """backfill() in the background (the task is kept referenced until done)."""
+        if not ids or self.fetch is None: return
+        st = self._state()
+        t = asyncio.get_running_loop().create_task(self.backfill(ids, access_token))
+        st.tasks.add(t)
+        t.add_done_callback(st.tasks.discard)
+
+    async def _flush(self, st:_LoopState):
+        await asyncio.sleep(self.linger)           # let concurrent requests pile in
+        pending, st.pending, st.flush = st.pending, {}, None
+        await asyncio.gather(*(self._fetch_batch(st, ids[i:i+BATCH], tok)
+                               for tok, ids in pending.items()
+                               for i in range(0, len(ids), BATCH)))
+
+    async def _fetch_batch(self, st:_LoopState, chunk:list[str], token:str,
+                           tried:frozenset=frozenset()):
+        xs, asked = {}, set(chunk)
+        try:
+            async with st.sem:
+                self.counters["calls"] += 1
+                objs = await self.fetch(chunk, token)
+            for obj in objs:
+                x = vector(obj)
+                if x is not None and obj.get("id") in asked: xs[obj["id"]] = x
+            self.put_many(xs, missing=chunk)           # errors raise before this: not cached
+            self.counters["fetched"] += len(xs)
+        except Exception as e:
+            self.counters["errors"] += 1
+            print("⚠️ audio feature backfill failed:", e)
+            # an expired/revoked token shouldn't fail everyone coalesced into this call
+            tried, retry = tried | {token}, {}
+            for tid in chunk:
+                alt = next((t for t in st.tokens.get(tid, ()) if t not in tried), None)
+                if alt is not None: retry.setdefault(alt, []).append(tid)
+            if retry:
+                self.counters["retried"] += sum(map(len, retry.values()))
+                await asyncio.gather(*(self._fetch_batch(st, ids, t, tried)
+                                       for t, ids in retry.items()))
+        finally:
+            for tid in chunk:                          # retried ids were resolved above
+                st.tokens.pop(tid, None)
+                f = st.inflight.pop(tid, None)
+                if f is not None and not f.done(): f.set_result(xs.get(tid))
+
+    def __len__(self): return len(self._mem)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, memory_items=len(self._mem),
+                        disk=self._db is not None,
+                        in_flight=sum(len(s.inflight) for s in self._loops.values()))
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def check(store:AudioFeatureStore, catalog, tol:float=1e-6) -> int:
+    """Stored vectors of ids the catalog also has must equal its rows (catalog units)."""
+    if store._db is None:
+        print("no disk store"); return 0
+    ids = [r[0] for r in store._db.execute("SELECT id FROM audio_features WHERE missing=0")]
+    codes = catalog.encode(ids)
+    both = [t for t, c in zip(ids, codes.tolist()) if c >= 0]
+    if not both:
+        print("no stored id is in the catalog"); return 0
+    found, _ = store.get_many(both)
+    rows = catalog.encode(list(found))
+    X = np.column_stack([np.asarray(catalog[c])[rows] for c in COLS]).astype(np.float64)
+    err = np.abs(catalog_units(np.stack(list(found.values()))) - X).max(axis=1)
+    bad = int((err > tol * np.maximum(1, np.abs(X).max(axis=1))).sum())
+    print(f"{'❌' if bad else '✅'} {len(found)} ids in both, {bad} differ "
+          f"(max |Δ| {float(err.max()):.3g})")
+    return 1 if bad else 0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="feature_store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("check")
+    c.add_argument("--db", default=DB_PATH)
+    args = ap.parse_args(argv)
+
+    from fennec_ai_dj.local_ml.local_song_recommender import catalog
+    return check(AudioFeatureStore(args.db), catalog)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# fennec_ai_dj/feedback_backends.py
+"""
+Storage backends behind user_feedback_store.
+
+   sqlite  (default)  one SQLite file in WAL mode, shared by every uvicorn
+                      worker; rows indexed by (user_id, feedback)
+   log                FeedbackLog – append-only WAL + snapshot, single process
+
+   FEEDBACK_BACKEND=sqlite|log     FEEDBACK_DB=<path>     FEEDBACK_DIR=<dir>
+
+Migration from the old JSON file (or from the log store):
+
+   python -m fennec_ai_dj.feedback_backends migrate [--json user_feedback.json]
+                                                    [--from-log DIR] [--to sqlite|log]
+"""
+from __future__ import annotations
+import os, sys, json, time, sqlite3, argparse
+from abc import ABC, abstractmethod
+from threading import Lock
+
+from fennec_ai_dj.feedback_log import FeedbackLog
+
+HERE        = os.path.dirname(__file__)
+LEGACY_JSON = os.path.join(HERE, "user_feedback.json")
+DEFAULT_DB  = os.path.join(HERE, "user_feedback.db")
+DEFAULT_DIR = os.path.join(HERE, "feedback_store")
+
+class FeedbackBackend(ABC):
+    """Interface every backend implements (FeedbackLog matches it as-is)."""
+    @abstractmethod
+    def put(self, user_id:str, track_id:str, feedback:str, durable:bool=False): ...
+    @abstractmethod
+    def put_many(self, rows:list[tuple[str,str,str]]): ...
+    @abstractmethod
+    def user_feedback(self, user_id:str) -> dict[str,str]: ...
+    @abstractmethod
+    def liked(self, user_id:str) -> list[str]: ...
+    @abstractmethod
+    def disliked(self, user_id:str) -> list[str]: ...
+    @abstractmethod
+    def users(self) -> list[str]: ...
+    def sync(self): pass
+    def close(self): pass
+    def stats(self) -> dict: return {}
+
+FeedbackBackend.register(FeedbackLog)
+
+# ─── SQLite ──────────────────────────────────────────────────────────────────
+class SqliteFeedbackBackend(FeedbackBackend):
+    """
+    Each write is one committed upsert, so every worker process sees every
+    like immediately – no per-process copy, no whole-file rewrite.
+    rowid order = order of the latest feedback, like the log backend.
+    """
+    def __init__(self, db_path:str=DEFAULT_DB, timeout:float=10.0):
+        self.db_path = db_path
+        self._lock = Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=timeout)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS feedback(
+                user_id TEXT NOT NULL, track_id TEXT NOT NULL,
+                feedback TEXT NOT NULL CHECK (feedback IN ('like','dislike')),
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, track_id));
+            CREATE INDEX IF NOT EXISTS ix_feedback_user_fb ON feedback(user_id, feedback);
+            CREATE TABLE IF NOT EXISTS feedback_meta(key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+
+    def put(self, user_id:str, track_id:str, feedback:str, durable:bool=False):
+        self.put_many([(user_id, track_id, feedback)])
+
+    def put_many(self, rows:list[tuple[str,str,str]]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO feedback VALUES (?,?,?,?)",
+                                 [(u, t, f, now) for u, t, f in rows])
+            self._db.commit()
+
+    def _tracks(self, user_id:str, feedback:str) -> list[str]:
+        with self._lock:
+            cur = self._db.execute("SELECT track_id FROM feedback "
+                                   "WHERE user_id=? AND feedback=? ORDER BY rowid",
+                                   (user_id, feedback))
+            return [r[0] for r in cur]
+
+    def liked(self, user_id:str) -> list[str]:    return self._tracks(user_id, "like")
+    def disliked(self, user_id:str) -> list[str]: return self._tracks(user_id, "dislike")
+
+    def user_feedback(self, user_id:str) -> dict[str,str]:
+        with self._lock:
+            cur = self._db.execute("SELECT track_id, feedback FROM feedback "
+                                   "WHERE user_id=? ORDER BY feedback='dislike', rowid",
+                                   (user_id,))
+            return dict(cur.fetchall())
+
+    def users(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT user_id FROM feedback")]
+
+    def import_once(self, key:str, load) -> int:
+        """Run load() → rows and insert them, at most once per key across workers."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute("SELECT 1 FROM feedback_meta WHERE key=?", (key,)).fetchone():
+                    self._db.rollback(); return 0
+                rows, now = load(), time.time()
+                self._db.executemany("INSERT OR IGNORE INTO feedback VALUES (?,?,?,?)",
+                                     [(u, t, f, now) for u, t, f in rows])
+                self._db.execute("INSERT INTO feedback_meta VALUES (?,?)", (key, str(now)))
+                self._db.commit()
+                return len(rows)
+            except Exception:
+                self._db.rollback(); raise
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, u = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM feedback").fetchone()
+        return {"backend":"sqlite", "rows":n, "users":u}
+
+# ─── helpers ─────────────────────────────────────────────────────────────────
+def json_rows(path:str) -> list[tuple[str,str,str]]:
+    """Flatten the old {user: {track: fb}} file into rows."""
+    if not os.path.exists(path): return []
+    with open(path) as f:
+        data = json.load(f)
+    return [(u, t, fb) for u, tracks in data.items() for t, fb in tracks.items()
+            if fb in ("like","dislike")]
+
+def log_rows(src) -> list[tuple[str,str,str]]:
+    return [(u, t, fb) for u in src.users() for t, fb in src.user_feedback(u).items()]
+
+def open_backend(kind:str|None=None, legacy_json:str|None=LEGACY_JSON):
+    kind = (kind or os.getenv("FEEDBACK_BACKEND", "sqlite")).lower()
+    if kind == "log":
+        return FeedbackLog(
+            os.getenv("FEEDBACK_DIR", DEFAULT_DIR),
+            fsync_interval=float(os.getenv("FEEDBACK_FSYNC_INTERVAL", "0.05")),
+            compact_every=int(os.getenv("FEEDBACK_COMPACT_EVERY", "50000")),
+            legacy_json=legacy_json,
+        )
+    if kind == "sqlite":
+        be = SqliteFeedbackBackend(os.getenv("FEEDBACK_DB", DEFAULT_DB))
+        if legacy_json:
+            try:
+                n = be.import_once("legacy_json", lambda: json_rows(legacy_json))
+                if n: print(f"📥 imported {n} feedback rows from {legacy_json}")
+            except Exception as e:
+                print("⚠️ Failed to import legacy feedback file:", e)
+        return be
+    raise ValueError(f"unknown FEEDBACK_BACKEND {kind!r} (sqlite|log)")
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="feedback_backends")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="copy feedback into the configured backend")
+    m.add_argument("--json",     default=LEGACY_JSON)
+    m.add_argument("--from-log", default=None, help="FeedbackLog directory to copy from")
+    m.add_argument("--to",       default=None, help="sqlite|log (default $FEEDBACK_BACKEND)")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+
+    dst = open_backend(args.to if args.cmd == "migrate" else None, legacy_json=None)
+    try:
+        if args.cmd == "stats":
+            print(dst.stats()); return 0
+        if args.from_log:
+            src = FeedbackLog(args.from_log)
+            rows = log_rows(src); src.close()
+        else:
+            rows = json_rows(args.json)
+        dst.put_many(rows)
+        dst.sync()
+        print(f"✅ migrated {len(rows)} feedback rows → {dst.stats()}")
+    finally:
+        dst.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
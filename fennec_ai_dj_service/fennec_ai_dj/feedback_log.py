@@ -0,0 +1,217 @@
+# fennec_ai_dj/feedback_log.py
+"""
+Log-structured storage engine for like/dislike feedback.
+
+   <dir>/wal.jsonl        append-only write-ahead log   [seq, user, track, fb]
+   <dir>/snapshot.jsonl   compacted state: {"seq":S} header + one line per user
+
+• put() appends one line and updates the in-memory per-user index – O(1),
+  no rewrite of the whole store
+• a background flusher fsyncs the WAL every `fsync_interval` (group commit);
+  put(durable=True) blocks until its record is on disk
+• once the WAL holds `compact_every` records it is rotated and a new
+  snapshot is written off the request path
+• recovery = snapshot + replay of WAL records with seq > snapshot seq; a torn
+  last line (crash mid-write) is dropped
+"""
+from __future__ import annotations
+import os, json, atexit, threading
+
+FORMAT = 1
+
+class _UserFeedback:
+    __slots__ = ("likes","dislikes")
+    def __init__(self):
+        self.likes:    dict[str,None] = {}   # insertion-ordered sets
+        self.dislikes: dict[str,None] = {}
+
+    def set(self, track_id:str, feedback:str):
+        self.likes.pop(track_id, None); self.dislikes.pop(track_id, None)
+        (self.likes if feedback == "like" else self.dislikes)[track_id] = None
+
+    def as_dict(self) -> dict[str,str]:
+        return {**{t:"like" for t in self.likes}, **{t:"dislike" for t in self.dislikes}}
+
+class FeedbackLog:
+    def __init__(self, path:str, fsync_interval:float=0.05,
+                 compact_every:int=50_000, legacy_json:str|None=None):
+        os.makedirs(path, exist_ok=True)
+        self.path           = path
+        self.snap_path      = os.path.join(path, "snapshot.jsonl")
+        self.wal_path       = os.path.join(path, "wal.jsonl")
+        self.old_wal_path   = os.path.join(path, "wal.old.jsonl")
+        self.fsync_interval = fsync_interval
+        self.compact_every  = compact_every
+
+        self._lock    = threading.Lock()
+        self._synced_cv = threading.Condition(self._lock)
+        self._users: dict[str,_UserFeedback] = {}
+        self._seq = self._synced = self._wal_records = 0
+        self._closed = False
+
+        self._recover(legacy_json)
+        self._wal = open(self.wal_path, "ab")
+        self._flusher = threading.Thread(target=self._flush_loop, name="feedback-log", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ─── recovery ────────────────────────────────────────────────────────────
+    def _apply(self, user_id:str, track_id:str, feedback:str):
+        u = self._users.get(user_id)
+        if u is None: u = self._users[user_id] = _UserFeedback()
+        u.set(track_id, feedback)
+
+    def _load_snapshot(self) -> int:
+        with open(self.snap_path, encoding="utf-8") as f:
+            head = json.loads(f.readline())
+            for line in f:
+                rec = json.loads(line)
+                for tid, fb in rec["f"].items():
+                    self._apply(rec["u"], tid, fb)
+        return int(head["seq"])
+
+    def _replay(self, path:str, after:int, truncate:bool) -> int:
+        """Apply WAL records with seq > after; returns number of records read."""
+        n = good = 0
+        with open(path, "rb+") as f:
+            for raw in iter(f.readline, b""):
+                try:
+                    seq, uid, tid, fb = json.loads(raw)
+                except ValueError:
+                    break                                 # torn tail
+                if not raw.endswith(b"\n"): break
+                good += len(raw); n += 1
+                self._seq = max(self._seq, seq)
+                if seq > after:
+                    self._apply(uid, tid, fb)
+            if truncate and good < os.fstat(f.fileno()).st_size:
+                f.truncate(good)
+        return n
+
+    def _recover(self, legacy_json:str|None):
+        snap_seq = 0
+        if os.path.exists(self.snap_path):
+            snap_seq = self._load_snapshot()
+            self._seq = snap_seq
+        elif legacy_json and os.path.exists(legacy_json) and not os.path.exists(self.wal_path):
+            try:
+                with open(legacy_json) as f:
+                    legacy = json.load(f)
+                for uid, tracks in legacy.items():
+                    for tid, fb in tracks.items():
+                        self._apply(uid, tid, fb)
+                if legacy:
+                    self._write_snapshot(self._copy_state(), 0)
+                    print(f"📥 imported {len(legacy)} users from {legacy_json}")
+            except Exception as e:
+                print("⚠️ Failed to import legacy feedback file:", e)
+
+        rotated = os.path.exists(self.old_wal_path)
+        if rotated:
+            self._replay(self.old_wal_path, snap_seq, truncate=False)
+        if os.path.exists(self.wal_path):
+            self._wal_records = self._replay(self.wal_path, snap_seq, truncate=True)
+        self._synced = self._seq
+        if rotated:                   # crashed mid-compaction → finish it now
+            self._write_snapshot(self._copy_state(), self._seq)
+            os.remove(self.old_wal_path)
+            open(self.wal_path, "wb").close()
+            self._wal_records = 0
+
+    # ─── writes ──────────────────────────────────────────────────────────────
+    def put(self, user_id:str, track_id:str, feedback:str, durable:bool=False):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._wal.write((json.dumps([seq, user_id, track_id, feedback],
+                                        ensure_ascii=False) + "\n").encode("utf-8"))
+            self._apply(user_id, track_id, feedback)
+            self._wal_records += 1
+            if durable:
+                while self._synced < seq and not self._closed:
+                    self._synced_cv.wait()
+
+    def put_many(self, rows:list[tuple[str,str,str]]):
+        for user_id, track_id, feedback in rows:
+            self.put(user_id, track_id, feedback)
+
+    def sync(self):
+        """Flush + fsync everything written so far (one fsync for the group)."""
+        with self._lock:
+            if self._synced == self._seq or self._wal.closed: return
+            self._wal.flush()
+            target, fd = self._seq, self._wal.fileno()
+        os.fsync(fd)
+        with self._lock:
+            self._synced = max(self._synced, target)
+            self._synced_cv.notify_all()
+
+    # ─── compaction ──────────────────────────────────────────────────────────
+    def _copy_state(self) -> dict[str,dict[str,str]]:
+        return {uid:u.as_dict() for uid, u in self._users.items()}
+
+    def _write_snapshot(self, state:dict[str,dict[str,str]], seq:int):
+        tmp = self.snap_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format":FORMAT, "seq":seq}) + "\n")
+            for uid, tracks in state.items():
+                if tracks:
+                    f.write(json.dumps({"u":uid, "f":tracks}, ensure_ascii=False) + "\n")
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.snap_path)
+
+    def compact(self):
+        """Rotate the WAL and write a snapshot covering everything before it."""
+        with self._lock:
+            self._wal.flush(); os.fsync(self._wal.fileno()); self._wal.close()
+            os.replace(self.wal_path, self.old_wal_path)
+            self._wal = open(self.wal_path, "ab")
+            state, seq = self._copy_state(), self._seq
+            self._synced, self._wal_records = seq, 0
+            self._synced_cv.notify_all()
+        self._write_snapshot(state, seq)
+        os.remove(self.old_wal_path)
+
+    def _flush_loop(self):
+        while not self._closed:
+            with self._lock:
+                self._synced_cv.wait(self.fsync_interval)
+            try:
+                self.sync()
+                if self._wal_records >= self.compact_every:
+                    self.compact()
+            except Exception as e:
+                print("❌ feedback log flush failed:", e)
+
+    def close(self):
+        if self._closed: return
+        self.sync()
+        with self._lock:
+            self._closed = True
+            self._wal.close()
+            self._synced_cv.notify_all()
+
+    # ─── reads (per-user index) ──────────────────────────────────────────────
+    def user_feedback(self, user_id:str) -> dict[str,str]:
+        with self._lock:
+            u = self._users.get(user_id)
+            return u.as_dict() if u else {}
+
+    def liked(self, user_id:str) -> list[str]:
+        with self._lock:
+            u = self._users.get(user_id)
+            return list(u.likes) if u else []
+
+    def disliked(self, user_id:str) -> list[str]:
+        with self._lock:
+            u = self._users.get(user_id)
+            return list(u.dislikes) if u else []
+
+    def users(self) -> list[str]:
+        with self._lock:
+            return list(self._users)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users":len(self._users), "seq":self._seq, "synced":self._synced,
+                    "wal_records":self._wal_records}
@@ -1,68 +1,72 @@
 # fennec_ai_dj/gpt_command_interpreter.py
 """
 Free-form → JSON intent interpreter for Fennec AI DJ
-• Uses GPT-3.5-turbo with a rich system prompt + few-shot examples
+• Uses GPT-3.5-turbo with a rich system prompt + few-shot examples,
+  through an async backend (llm_backends: openai | local stand-in)
 • Maps natural language (sad, faster, more acoustic, popular, spanish …)
   onto numeric audio-feature filters understood by the back-end.
 • Logs the interpreted object to the server console:  🧠 interpreted: {...}
+• Fast path: intent_parser handles control words and plain mood/tempo
+  phrases locally; previous LLM answers are cached by normalized text.
+  GPT is only called on a miss.  interpreter_stats() → hit rates, latency.
+• LLM calls: hard deadline (LLM_TIMEOUT → noop), identical in-flight
+  prompts share one call, at most LLM_MAX_CONCURRENCY at a time.
 2025-04-23
 """
 from __future__ import annotations
-import os, json
+import os, json, time, asyncio, weakref
+from collections import OrderedDict, deque
+from threading import Lock
 from typing import Dict
-from openai import OpenAI
 from dotenv import load_dotenv
 
-# ─── Init OpenAI client ──────────────────────────────────────────────────────
+from fennec_ai_dj.intent_parser import LEXICON, normalize, parse_local
+from fennec_ai_dj.llm_backends import make_backend
+
+# ─── Init LLM backend ────────────────────────────────────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+backend = make_backend()
+
+LLM_TIMEOUT     = float(os.getenv("LLM_TIMEOUT", "6"))
+LLM_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+_NOOP = {"intent":"control","action":"noop"}
 
 # ─── Prompts ────────────────────────────────────────────────────────────────
-_SYSTEM_PROMPT = """
+_SYSTEM_PROMPT_TMPL = """
 You are an intent-parser for an AI DJ.
 
 Return ONE JSON object *only* – no text around it.
 See examples.
 
 Shape:
-{
+{{
   "intent": "recommend" | "control",
   "filters": [  // only for "recommend"
-    {"feature":"valence","op":"<","value":0.3},
-    {"feature":"energy", "op":">","value":0.7},
+    {{"feature":"valence","op":"<","value":0.3}},
+    {{"feature":"energy", "op":">","value":0.7}},
     ...
   ],
   "limit": 20  // optional, default 20
-}
+}}
 
 Lexical → feature mapping:
-sad / sadder / depressing          → valence < 0.3
-happy / uplifting                   → valence > 0.7
-dark / gloomy                       → valence < 0.2
-chill / relaxed / tired             → energy  < 0.4
-energetic / hype / dance            → energy  > 0.7
-slow(er)                            → tempo   < 90
-fast(er) / high bpm                 → tempo   >130
-acoustic                            → acousticness >0.5
-instrumental                        → instrumentalness >0.5
-loud                                → energy >0.8
-quiet / softer                      → energy <0.3
-famous / popular                    → popularity >70
-underground / obscure               → popularity <40
+{lexicon}
 
 Comparatives like "more sad" or "slightly faster" map to the same thresholds.
 
 If a language is mentioned ("spanish track"), add:
-  {"feature":"language","op":"=","value":"spanish"}
+  {{"feature":"language","op":"=","value":"spanish"}}
 
 Control actions:
   skip, pause, resume, volume (needs direction up|down + amount 0-1)
 
 If the user text is meaningless, respond with
-  {"intent":"control","action":"noop"}.
+  {{"intent":"control","action":"noop"}}.
 
 Return ONLY valid JSON.
 """
+_SYSTEM_PROMPT = _SYSTEM_PROMPT_TMPL.format(lexicon="\n".join(
+    f"{' / '.join(words):<35} → {feat} {op} {val}" for words, feat, op, val in LEXICON))
 
 _FEW_SHOTS = [
     ("play a sad song",
@@ -115,35 +119,128 @@ _FEW_SHOTS = [
     ("volume up", {"intent":"control","action":"volume","direction":"up","amount":0.1})
 ]
 
+# built once – identical for every call
+_BASE_MESSAGES = [{"role":"system","content":_SYSTEM_PROMPT}]
+for q, ans in _FEW_SHOTS:
+    _BASE_MESSAGES.append({"role":"user","content":q})
+    _BASE_MESSAGES.append({"role":"assistant","content":json.dumps(ans, ensure_ascii=False)})
+
+# ─── LLM answer cache + metrics ──────────────────────────────────────────────
+CACHE_SIZE = int(os.getenv("COMMAND_CACHE_SIZE", "2048"))
+
+_cache: OrderedDict[str,Dict] = OrderedDict()
+_lock = Lock()
+_latency = deque(maxlen=500)          # recent LLM call latencies (ms)
+_counters = {"calls":0, "fast_path":0, "cache_hits":0, "coalesced":0,
+             "llm_calls":0, "llm_errors":0, "timeouts":0}
+
+def _cache_get(key:str) -> Dict|None:
+    with _lock:
+        obj = _cache.get(key)
+        if obj is not None:
+            _cache.move_to_end(key)
+        return obj
+
+def _cache_put(key:str, obj:Dict):
+    with _lock:
+        _cache[key] = obj
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _count(name:str):
+    with _lock:
+        _counters[name] += 1
+
+def interpreter_stats() -> Dict:
+    with _lock:
+        c, lat = dict(_counters), sorted(_latency)
+        c["cache_items"] = len(_cache)
+    c["backend"] = backend.name
+    n = c["calls"]
+    c["fast_path_rate"] = round(c["fast_path"]/n, 3) if n else 0.0
+    c["cache_hit_rate"] = round(c["cache_hits"]/n, 3) if n else 0.0
+    if lat:
+        c["llm_ms_p50"] = round(lat[len(lat)//2], 1)
+        c["llm_ms_p95"] = round(lat[min(len(lat)-1, int(len(lat)*0.95))], 1)
+    return c
+
 # ─── Core function ──────────────────────────────────────────────────────────
-def interpret_command(user_text: str) -> Dict:
+def _copy(obj:Dict) -> Dict:
+    return json.loads(json.dumps(obj))          # callers may mutate the result
+
+class _LoopState:
+    """In-flight calls + concurrency cap; asyncio objects belong to one loop."""
+    def __init__(self):
+        self.inflight: dict[str,asyncio.Future] = {}
+        self.sem = asyncio.Semaphore(LLM_CONCURRENCY)
+
+_loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    st = _loops.get(loop)
+    if st is None:
+        st = _loops[loop] = _LoopState()
+    return st
+
+async def _ask_llm(key:str, user_text:str, sem:asyncio.Semaphore) -> Dict|None:
+    async with sem:
+        _count("llm_calls")
+        t0 = time.perf_counter()
+        try:
+            content = await backend.complete(
+                _BASE_MESSAGES + [{"role":"user","content":user_text}],
+                max_tokens=160, temperature=0.15)
+            obj = json.loads(content)
+            # sanity minimal check
+            if "intent" not in obj:
+                raise ValueError("no intent field")
+            print("🧠 interpreted:", obj)    #  ← appears in server console
+            _cache_put(key, obj)
+            return obj
+        except Exception as e:
+            _count("llm_errors")
+            print("❌ interpreter error:", e)
+            return None
+        finally:
+            with _lock:
+                _latency.append((time.perf_counter()-t0)*1e3)
+
+async def interpret_command_async(user_text: str) -> Dict:
     """
     Convert user_text into a JSON-able dict as defined above.
-    Falls back to a 'noop' control if parsing fails.
+    Local parser → LLM-answer cache → LLM (coalesced, bounded, deadline).
+    Falls back to a 'noop' control if parsing fails or the deadline passes.
     """
-    # Assemble conversation with few-shot examples
-    messages = [{"role":"system","content":_SYSTEM_PROMPT}]
-    for q, ans in _FEW_SHOTS:
-        messages.append({"role":"user","content":q})
-        messages.append({"role":"assistant","content":json.dumps(ans, ensure_ascii=False)})
-
-    messages.append({"role":"user","content":user_text})
+    _count("calls")
+    obj = parse_local(user_text)
+    if obj is not None:
+        _count("fast_path")
+        return obj
 
+    key = normalize(user_text)
+    obj = _cache_get(key)
+    if obj is not None:
+        _count("cache_hits")
+        return _copy(obj)
+
+    st = _state()
+    fut = st.inflight.get(key)
+    if fut is None:
+        fut = st.inflight[key] = asyncio.ensure_future(_ask_llm(key, user_text, st.sem))
+        fut.add_done_callback(lambda _f: st.inflight.pop(key, None))
+    else:
+        _count("coalesced")
     try:
-        resp = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=messages,
-            temperature=0.15,
-            max_tokens=160
-        )
-        content = resp.choices[0].message.content.strip()
-        obj = json.loads(content)
-        # sanity minimal check
-        if "intent" not in obj:
-            raise ValueError("no intent field")
-        print("🧠 interpreted:", obj)    #  ← appears in server console
-        return obj
+        # shield: a late answer still lands in the cache for the next caller
+        obj = await asyncio.wait_for(asyncio.shield(fut), LLM_TIMEOUT)
+    except asyncio.TimeoutError:
+        _count("timeouts")
+        print(f"⏱️ interpreter timeout after {LLM_TIMEOUT}s")
+        return dict(_NOOP)
+    return _copy(obj) if obj else dict(_NOOP)
 
-    except Exception as e:
-        print("❌ interpreter error:", e)
-        return {"intent":"control","action":"noop"}
+def interpret_command(user_text: str) -> Dict:
+    """Sync wrapper for scripts; not for use inside a running event loop."""
+    return asyncio.run(interpret_command_async(user_text))
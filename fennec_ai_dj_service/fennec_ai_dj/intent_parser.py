@@ -0,0 +1,105 @@
+# fennec_ai_dj/intent_parser.py
+"""
+Deterministic local parser for the commands GPT doesn't need to see.
+
+• control: skip / pause / resume / volume up|down
+• recommend: mood / tempo / popularity words from LEXICON (the same table
+  the GPT system prompt is rendered from), plus "<language> song"
+• anything it does not fully understand (negation, numbers, unknown words,
+  contradicting filters) → None, and the caller asks the LLM
+
+   parse_local("something sad and slow")
+   → {"intent":"recommend","filters":[{valence<0.3},{tempo<90}]}
+"""
+from __future__ import annotations
+import re, unicodedata
+
+# ─── lexical → feature table (single source for the prompt + fast path) ────
+LEXICON: list[tuple[tuple[str,...], str, str, float]] = [
+    (("sad","sadder","depressing"),             "valence",          "<", 0.3),
+    (("happy","happier","uplifting"),           "valence",          ">", 0.7),
+    (("dark","gloomy"),                         "valence",          "<", 0.2),
+    (("chill","relaxed","tired","calm"),        "energy",           "<", 0.4),
+    (("energetic","hype","dance"),              "energy",           ">", 0.7),
+    (("slow","slower"),                         "tempo",            "<", 90),
+    (("fast","faster","high bpm"),              "tempo",            ">", 130),
+    (("acoustic",),                             "acousticness",     ">", 0.5),
+    (("instrumental",),                         "instrumentalness", ">", 0.5),
+    (("loud",),                                 "energy",           ">", 0.8),
+    (("quiet","softer"),                        "energy",           "<", 0.3),
+    (("famous","popular"),                      "popularity",       ">", 70),
+    (("underground","obscure"),                 "popularity",       "<", 40),
+]
+
+LANGUAGES = {"spanish","french","english","german","italian","portuguese",
+             "japanese","korean","hindi","arabic","turkish","brazilian"}
+
+# words that carry no meaning for the filter set
+_FILLER = set("""
+a an the some something me my us i we want wanna would like to please pls
+play put on give find get another more slightly bit little very really kinda
+song songs track tracks tune tunes music one stuff vibe vibes mood
+and but with also now just it make let lets s that this of for
+""".split())
+
+CONTROL: dict[str,dict] = {
+    "skip":         {"intent":"control","action":"skip"},
+    "next":         {"intent":"control","action":"skip"},
+    "skip this":    {"intent":"control","action":"skip"},
+    "next song":    {"intent":"control","action":"skip"},
+    "skip song":    {"intent":"control","action":"skip"},
+    "pause":        {"intent":"control","action":"pause"},
+    "stop":         {"intent":"control","action":"pause"},
+    "resume":       {"intent":"control","action":"resume"},
+    "unpause":      {"intent":"control","action":"resume"},
+    "continue":     {"intent":"control","action":"resume"},
+    "volume up":    {"intent":"control","action":"volume","direction":"up","amount":0.1},
+    "turn it up":   {"intent":"control","action":"volume","direction":"up","amount":0.1},
+    "volume down":  {"intent":"control","action":"volume","direction":"down","amount":0.1},
+    "turn it down": {"intent":"control","action":"volume","direction":"down","amount":0.1},
+}
+
+def normalize(text:str) -> str:
+    """lowercase, accents/punctuation stripped, whitespace collapsed."""
+    t = unicodedata.normalize("NFKD", text)
+    t = "".join(c for c in t if not unicodedata.combining(c)).lower()
+    t = re.sub(r"[^\w\s]", " ", t)
+    return " ".join(t.split())
+
+_PHRASES = sorted(((w, f, op, v) for words, f, op, v in LEXICON for w in words),
+                  key=lambda p: -len(p[0].split()))          # "high bpm" before "high"
+_POLITE  = {"please","pls","now","thanks","thank","you"}
+
+def parse_local(text:str) -> dict|None:
+    norm = normalize(text)
+    if not norm:
+        return None
+    core = " ".join(w for w in norm.split() if w not in _POLITE)
+    if core in CONTROL:
+        return dict(CONTROL[core])
+
+    toks, filters, seen = norm.split(), [], {}
+    i = 0
+    while i < len(toks):
+        for phrase, feat, op, val in _PHRASES:
+            n = len(phrase.split())
+            if " ".join(toks[i:i+n]) == phrase:
+                if seen.get(feat, op) != op:           # "chill" + "energetic"
+                    return None
+                if feat not in seen:
+                    filters.append({"feature":feat, "op":op, "value":val})
+                    seen[feat] = op
+                i += n
+                break
+        else:
+            w = toks[i]
+            if w in LANGUAGES:
+                if "language" in seen: return None
+                filters.append({"feature":"language","op":"=","value":w})
+                seen["language"] = "="
+            elif w not in _FILLER:
+                return None                            # unknown word → LLM
+            i += 1
+    if not filters:
+        return None
+    return {"intent":"recommend", "filters":filters}
@@ -0,0 +1,75 @@
+# fennec_ai_dj/llm_backends.py
+"""
+Async chat-completion backends for the command interpreter.
+
+   openai   AsyncOpenAI, per-request timeout, no SDK retries (the caller
+            owns the deadline)
+   local    deterministic stand-in: answers from intent_parser, otherwise
+            "noop"; optional fixed latency so /command can be load-tested
+            offline with no API key; only when asked for explicitly
+
+   LLM_BACKEND=openai|local       (default: openai, which needs OPENAI_API_KEY)
+   LLM_LOCAL_LATENCY_MS=300       (local backend only)
+
+   text = await backend.complete(messages, max_tokens=160, temperature=0.15)
+"""
+from __future__ import annotations
+import os, json, asyncio, weakref
+from abc import ABC, abstractmethod
+
+from fennec_ai_dj.intent_parser import parse_local
+
+MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
+
+class LLMBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, messages:list[dict], max_tokens:int=160,
+                       temperature:float=0.15) -> str: ...
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, api_key:str|None=None, model:str=MODEL, timeout:float=10.0):
+        self.api_key, self.model, self.timeout = api_key, model, timeout
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        # the SDK's connection pool belongs to one event loop
+        loop = asyncio.get_running_loop()
+        c = self._clients.get(loop)
+        if c is None:
+            from openai import AsyncOpenAI
+            c = self._clients[loop] = AsyncOpenAI(api_key=self.api_key,
+                                                  timeout=self.timeout, max_retries=0)
+        return c
+
+    async def complete(self, messages, max_tokens=160, temperature=0.15) -> str:
+        resp = await self._client().chat.completions.create(
+            model=self.model, messages=messages,
+            temperature=temperature, max_tokens=max_tokens)
+        return resp.choices[0].message.content.strip()
+
+class LocalBackend(LLMBackend):
+    name = "local"
+
+    def __init__(self, latency:float=0.0):
+        self.latency = latency
+
+    async def complete(self, messages, max_tokens=160, temperature=0.15) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        obj = parse_local(messages[-1]["content"]) or {"intent":"control","action":"noop"}
+        return json.dumps(obj)
+
+def make_backend(kind:str|None=None) -> LLMBackend:
+    kind = (kind or os.getenv("LLM_BACKEND") or "openai").lower()
+    if kind == "openai":
+        key = os.getenv("OPENAI_API_KEY")
+        if not key:
+            raise RuntimeError("OPENAI_API_KEY is not set (LLM_BACKEND=local for the offline parser)")
+        return OpenAIBackend(key, timeout=float(os.getenv("LLM_TIMEOUT", "6")))
+    if kind == "local":
+        return LocalBackend(float(os.getenv("LLM_LOCAL_LATENCY_MS", "0"))/1000)
+    raise ValueError(f"unknown LLM_BACKEND {kind!r} (openai|local)")
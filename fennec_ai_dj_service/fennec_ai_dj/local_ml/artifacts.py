@@ -0,0 +1,247 @@
+# fennec_ai_dj/local_ml/artifacts.py
+"""
+Versioned catalog + model artifacts with hot reload.
+
+One Artifacts bundle = catalog store, scaler, kmeans and everything derived
+from them (ranking matrix, text index, filter engine, response fragments).  The registry holds
+the live bundle and replaces it by reference:
+
+• reload() builds the next bundle on a background thread (catalog rebuilt
+  if the CSV changed, indexes, models) – requests keep using the old one
+• the swap is a single reference assignment; nothing is mutated in place
+• a request pins the bundle it started with (contextvar, see pin()), so
+  ids encoded, rows ranked and rows formatted all come from one version;
+  the old bundle is freed once its last pinned request finishes
+• version = catalog fingerprint + model version; the model is the one
+  models/CURRENT names (see train_clusters), else the legacy scaler.pkl /
+  kmeans_model.pkl pair (version = content digest)
+• moods: mood → cluster ids from models/<v>/moods.json, or named from the
+  centroids when a model has no mapping file
+• ivf: the model's IVF index (models/<v>/ivf, legacy: ivf/) if one was built
+  for this catalog; the ranker only uses it from IVF_MIN_ROWS rows up
+• shards: with SHARD_WORKERS set and SHARD_MIN_ROWS rows, the ranking
+  matrix and filter columns move into shared memory and exact scans run on
+  the worker pool (see sharded)
+
+   registry = ArtifactRegistry(load_artifacts)
+   with registry.pin(): art = registry.current()
+   catalog  = registry.proxy("catalog")    # module-level stand-in for the old global
+   registry.reload(force=False)            # no-op unless a source file changed
+"""
+from __future__ import annotations
+import os, json, time, hashlib, threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np, joblib
+
+from fennec_ai_dj.local_ml.ranking import RankingIndex
+from fennec_ai_dj.local_ml.text_index import TextIndex
+from fennec_ai_dj.local_ml.catalog_store import open_catalog
+from fennec_ai_dj.local_ml.filter_engine import FilterEngine
+from fennec_ai_dj.local_ml.track_json import TrackJSON
+from fennec_ai_dj.local_ml.ivf_index import IVFIndex, index_key
+from fennec_ai_dj.local_ml.sharded import attach_shards, SHARD_WORKERS, SHARD_MIN_ROWS
+from fennec_ai_dj.local_ml.train_clusters import name_clusters, current_version, MODELS_DIR
+
+BASE_DIR        = os.path.dirname(__file__)
+DATA_PATH       = os.path.join(BASE_DIR, "cleaned_tracks.csv")
+CATALOG_DIR     = os.path.join(BASE_DIR, "catalog")
+SCALER_PATH     = os.path.join(BASE_DIR, "scaler.pkl")
+KMEANS_PATH     = os.path.join(BASE_DIR, "kmeans_model.pkl")
+TEXT_INDEX_PATH = os.path.join(BASE_DIR, "text_index")
+TRACK_JSON_PATH = os.path.join(BASE_DIR, "track_json")
+IVF_DIR         = os.path.join(BASE_DIR, "ivf")
+IVF_MIN_ROWS    = int(os.getenv("IVF_MIN_ROWS", "200000"))     # below: exact search is as fast
+WATCH_SECS      = float(os.getenv("ARTIFACT_WATCH_SECS", "0"))     # 0 = reload on demand only
+
+def _stamp(path:str):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+def ivf_path(model_version:str, models_dir:str=MODELS_DIR) -> str:
+    """IVF index directory for a model: inside its version dir, else the legacy spot."""
+    d = os.path.join(models_dir, model_version)
+    return os.path.join(d, "ivf") if os.path.isdir(d) else IVF_DIR
+
+def _digest(*paths:str) -> str:
+    h = hashlib.blake2b(digest_size=4)
+    for p in paths:
+        with open(p, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _artist_codes(catalog) -> np.ndarray:
+    """int code per catalog row, equal for equal artist strings."""
+    _, codes = np.unique(np.asarray(catalog["artists"].tolist(), dtype=object).astype(str),
+                         return_inverse=True)
+    return codes
+
+# ─── bundle ──────────────────────────────────────────────────────────────────
+class Artifacts:
+    """Immutable once built; replaced as a whole, never patched."""
+    def __init__(self, catalog, scaler, kmeans, ranker, text, filters, track_json,
+                 artist_codes:np.ndarray, model_version:str, sources:dict,
+                 moods:dict[str,list[int]]|None=None, ivf:IVFIndex|None=None):
+        self.catalog, self.scaler, self.kmeans = catalog, scaler, kmeans
+        self.ranker, self.text, self.filters   = ranker, text, filters
+        self.track_json, self.ivf = track_json, ivf
+        self.artist_codes = artist_codes          # MMR groups, one int per row
+        self.model_version = model_version
+        self.moods     = moods if moods is not None else name_clusters(kmeans.cluster_centers_)
+        self.version   = f"{catalog.fingerprint[:8]}-{model_version}"
+        self.sources   = sources                  # path → stamp at load time
+        self.loaded_at = time.time()
+
+    def changed(self) -> bool:
+        return any(_stamp(p) != s for p, s in self.sources.items())
+
+def load_artifacts(csv_path:str=DATA_PATH, catalog_dir:str=CATALOG_DIR,
+                   models_dir:str=MODELS_DIR, text_path:str=TEXT_INDEX_PATH,
+                   track_json_path:str=TRACK_JSON_PATH) -> Artifacts:
+    """Build one bundle from disk (slow: run off the request path)."""
+    catalog = open_catalog(csv_path, catalog_dir, models_dir)
+    version = current_version(models_dir)
+    if version:
+        d = os.path.join(models_dir, version)
+        scaler_path, kmeans_path = os.path.join(d, "scaler.pkl"), os.path.join(d, "kmeans_model.pkl")
+        with open(os.path.join(d, "moods.json")) as f:
+            moods = {m: [int(c) for c in cs] for m, cs in json.load(f)["moods"].items()}
+    else:
+        scaler_path, kmeans_path, moods = SCALER_PATH, KMEANS_PATH, None
+    sources = {p: _stamp(p) for p in (csv_path, os.path.join(catalog_dir, "meta.json"),
+                                      os.path.join(models_dir, "CURRENT"),
+                                      scaler_path, kmeans_path)}
+    model_version = version or _digest(scaler_path, kmeans_path)
+    ivf_dir = ivf_path(model_version, models_dir)
+    sources[os.path.join(ivf_dir, "meta.json")] = _stamp(os.path.join(ivf_dir, "meta.json"))
+    scaler  = joblib.load(scaler_path)
+    kmeans  = joblib.load(kmeans_path)
+    ranker  = RankingIndex.from_frame(catalog, scaler)
+    ivf     = IVFIndex.open(ivf_dir, index_key(catalog.fingerprint, model_version))
+    if ivf is not None and len(ranker) >= IVF_MIN_ROWS:
+        ranker.ivf = ivf
+    text    = TextIndex.load_or_build(text_path, catalog.fingerprint,
+                                      catalog["artists"], catalog["name"])
+    filters = FilterEngine(catalog, text=text)
+    if SHARD_WORKERS and len(catalog) >= SHARD_MIN_ROWS:
+        attach_shards(ranker, filters, SHARD_WORKERS)
+    return Artifacts(catalog, scaler, kmeans, ranker, text, filters,
+                     TrackJSON.load_or_build(track_json_path, catalog), _artist_codes(catalog),
+                     model_version, sources, moods, ivf)
+
+# ─── registry ────────────────────────────────────────────────────────────────
+class _Proxy:
+    """Forwards to one field of the request's bundle, so `catalog[...]` etc. keep working."""
+    __slots__ = ("_reg","_field")
+    def __init__(self, reg:"ArtifactRegistry", field:str):
+        self._reg, self._field = reg, field
+    def _obj(self):              return getattr(self._reg.current(), self._field)
+    def __getattr__(self, name): return getattr(self._obj(), name)
+    def __getitem__(self, key):  return self._obj()[key]
+    def __contains__(self, key): return key in self._obj()
+    def __len__(self):           return len(self._obj())
+    def __iter__(self):          return iter(self._obj())
+    def __repr__(self):          return f"<current {self._field}: {self._obj()!r}>"
+
+class ArtifactRegistry:
+    def __init__(self, loader=load_artifacts, keep:int=4):
+        self.loader, self.keep = loader, keep
+        self._live: Artifacts|None = None
+        self._pinned: ContextVar[Artifacts|None] = ContextVar("artifacts", default=None)
+        self._in_flight: dict[str,int] = {}
+        self._history: list[dict] = []           # newest last
+        self._lock = threading.Lock()
+        self._loader_thread: threading.Thread|None = None
+        self.last_error: str|None = None
+
+    # ─── read side ───────────────────────────────────────────────────────────
+    def current(self) -> Artifacts:
+        art = self._pinned.get()
+        if art is not None: return art
+        if self._live is None: self.load_now()
+        return self._live
+
+    def proxy(self, field:str) -> _Proxy:
+        return _Proxy(self, field)
+
+    @contextmanager
+    def pin(self):
+        """Use one bundle for the whole block, even if a reload swaps meanwhile."""
+        art = self.current()
+        with self._lock:
+            self._in_flight[art.version] = self._in_flight.get(art.version, 0) + 1
+        tok = self._pinned.set(art)
+        try:
+            yield art
+        finally:
+            self._pinned.reset(tok)
+            with self._lock:
+                n = self._in_flight[art.version] - 1
+                if n: self._in_flight[art.version] = n
+                else: del self._in_flight[art.version]
+
+    # ─── write side ──────────────────────────────────────────────────────────
+    def _swap(self, art:Artifacts):
+        with self._lock:
+            old, self._live = self._live, art
+            self._history.append({"version":art.version, "loaded_at":art.loaded_at})
+            del self._history[:-self.keep]
+        if old is None or old.version != art.version:
+            print(f"🔁 artifacts {old.version if old else '∅'} → {art.version}")
+
+    def load_now(self) -> Artifacts:
+        """Blocking load + swap (startup, CLI)."""
+        art = self.loader()
+        self._swap(art)
+        return art
+
+    def _run(self, force:bool):
+        try:
+            if force or self._live is None or self._live.changed():
+                self._swap(self.loader())
+            self.last_error = None
+        except Exception as e:                       # keep serving the old bundle
+            self.last_error = f"{type(e).__name__}: {e}"
+            print("⚠️ artifact reload failed:", self.last_error)
+
+    def reload(self, force:bool=False) -> bool:
+        """Start a background reload; False if one is already running."""
+        with self._lock:
+            if self._loader_thread is not None and self._loader_thread.is_alive():
+                return False
+            self._loader_thread = threading.Thread(target=self._run, args=(force,),
+                                                   name="artifact-reload", daemon=True)
+            self._loader_thread.start()
+        return True
+
+    def watch(self, interval:float=WATCH_SECS):
+        """Poll source stamps every `interval` s and reload on change."""
+        if interval <= 0: return
+        def loop():
+            while True:
+                time.sleep(interval)
+                if self._live is not None and self._live.changed():
+                    self.reload()
+        threading.Thread(target=loop, name="artifact-watch", daemon=True).start()
+
+    def status(self) -> dict:
+        live = self._live
+        with self._lock:
+            loading = self._loader_thread is not None and self._loader_thread.is_alive()
+            return {"version":live.version if live else None,
+                    "model_version":live.model_version if live else None,
+                    "moods":live.moods if live else None,
+                    "rows":len(live.catalog) if live else 0,
+                    "ivf":({"lists":live.ivf.nlist, "pq":live.ivf.pq,
+                            "active":live.ranker.ivf is not None}
+                           if live and live.ivf is not None else None),
+                    "shards":({"workers":live.ranker.shards.workers,
+                               "bytes":live.ranker.shards.nbytes()}
+                              if live and live.ranker.shards is not None else None),
+                    "loaded_at":live.loaded_at if live else None,
+                    "stale":bool(live and live.changed()), "loading":loading,
+                    "in_flight":dict(self._in_flight), "history":list(self._history),
+                    "last_error":self.last_error}
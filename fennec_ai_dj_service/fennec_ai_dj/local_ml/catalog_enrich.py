@@ -0,0 +1,264 @@
+# fennec_ai_dj/local_ml/catalog_enrich.py
+"""
+Offline enrichment of the catalog with album name / image URL / popularity,
+so request-path _enrich has (almost) nothing left to ask Spotify for.
+
+   python -m fennec_ai_dj.local_ml.catalog_enrich run   [--concurrency 4]
+   python -m fennec_ai_dj.local_ml.catalog_enrich apply
+   python -m fennec_ai_dj.local_ml.catalog_enrich status
+
+run    walks every catalog id that is not in the checkpoint yet, fetches
+       /v1/tracks in 50-id batches (bounded concurrency, honours 429
+       Retry-After, retries 5xx), appends each batch to the JSONL
+       checkpoint, then applies it.  Interrupt and re-run to resume.
+apply  writes the checkpoint into the catalog store (album, image_url,
+       popularity columns) as a new copy-on-write version.
+
+Point --api-base / --accounts-url at a local stand-in server, or hand
+StandInSpotify().transport() to SpotifyClient, to test without touching
+Spotify (tests/test_catalog_enrich.py).  Auth: --token, $SPOTIFY_ACCESS_TOKEN, or the
+client-credentials flow with SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET.
+"""
+from __future__ import annotations
+import os, sys, json, time, base64, asyncio, argparse
+import numpy as np
+import httpx
+
+from fennec_ai_dj.spotify_client import SpotifyClient, API_BASE
+from fennec_ai_dj.local_ml.catalog_store import (
+    Catalog, open_catalog, update_columns, read_enrichment,
+    CATALOG_DIR, DATA_PATH, ENRICH_PATH,
+)
+
+ACCOUNTS_URL = "https://accounts.spotify.com/api/token"
+BATCH        = 50
+MAX_RETRIES  = 5
+
+# ─── auth ────────────────────────────────────────────────────────────────────
+class _Token:
+    """Static token, or client-credentials token refreshed on expiry / 401."""
+    def __init__(self, static:str|None, accounts_url:str):
+        self.value, self.static, self.accounts_url = static, bool(static), accounts_url
+        self.expires = float("inf") if static else 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, http:httpx.AsyncClient, force:bool=False) -> str:
+        if self.static:
+            return self.value
+        async with self._lock:
+            if force or time.time() >= self.expires:
+                cid, secret = os.getenv("SPOTIFY_CLIENT_ID"), os.getenv("SPOTIFY_CLIENT_SECRET")
+                if not (cid and secret):
+                    raise SystemExit("no --token and no SPOTIFY_CLIENT_ID/SECRET for client credentials")
+                auth = base64.b64encode(f"{cid}:{secret}".encode()).decode()
+                r = await http.post(self.accounts_url, data={"grant_type":"client_credentials"},
+                                    headers={"Authorization":f"Basic {auth}"})
+                r.raise_for_status()
+                js = r.json()
+                self.value   = js["access_token"]
+                self.expires = time.time() + js.get("expires_in", 3600) - 60
+        return self.value
+
+# ─── fetch ───────────────────────────────────────────────────────────────────
+class Enricher:
+    def __init__(self, client:SpotifyClient, token:_Token, checkpoint:str,
+                 concurrency:int=4):
+        self.client, self.token, self.checkpoint = client, token, checkpoint
+        self.sem = asyncio.Semaphore(concurrency)
+        self.resume_at = 0.0            # shared back-off after a 429
+        self.stats = {"batches":0, "tracks":0, "missing":0, "rate_limited":0, "failed":0}
+
+    async def _wait_rate_limit(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, ids:list[str]) -> dict|None:
+        force = False
+        for attempt in range(MAX_RETRIES):
+            await self._wait_rate_limit()
+            try:
+                tok = await self.token.get(self.client.aio, force)
+                r = await self.client.aget("/tracks", tok, {"ids":",".join(ids)})
+            except httpx.TransportError:
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            if r.status_code == 200:
+                return r.json()
+            if r.status_code == 429:
+                self.stats["rate_limited"] += 1
+                wait = float(r.headers.get("Retry-After", 2 ** attempt))
+                self.resume_at = max(self.resume_at, time.monotonic() + wait)
+            elif r.status_code == 401 and not force:
+                force = True
+            elif r.status_code >= 500:
+                await asyncio.sleep(min(2 ** attempt, 30))
+            else:
+                break
+        self.stats["failed"] += 1
+        return None
+
+    async def _batch(self, ids:list[str], out):
+        async with self.sem:
+            js = await self._fetch(ids)
+        if js is None:
+            return                              # not checkpointed → retried next run
+        found = {}
+        for obj in js.get("tracks", []):
+            if not obj: continue
+            album  = obj.get("album", {})
+            images = album.get("images", [])
+            found[obj["id"]] = {"id":obj["id"], "album_name":album.get("name","Unknown"),
+                                "image_url":images[0]["url"] if images else "",
+                                "popularity":obj.get("popularity")}
+        lines = [json.dumps(found.get(t) or {"id":t, "missing":True}, ensure_ascii=False)
+                 for t in ids]
+        out.write("\n".join(lines) + "\n")
+        out.flush()
+        self.stats["batches"] += 1
+        self.stats["tracks"]  += len(found)
+        self.stats["missing"] += len(ids) - len(found)
+
+    async def run(self, ids:list[str], batch:int=BATCH):
+        with open(self.checkpoint, "a", encoding="utf-8") as out:
+            await asyncio.gather(*(self._batch(ids[i:i+batch], out)
+                                   for i in range(0, len(ids), batch)))
+            os.fsync(out.fileno())
+
+def _done_ids(checkpoint:str) -> set[str]:
+    """Every id already answered (found or null) in the checkpoint."""
+    done = set()
+    if os.path.exists(checkpoint):
+        with open(checkpoint, encoding="utf-8") as f:
+            for line in f:
+                try: done.add(json.loads(line)["id"])
+                except (ValueError, KeyError, TypeError): continue
+    return done
+
+# ─── stand-in ────────────────────────────────────────────────────────────────
+class StandInSpotify:
+    """
+    In-process fake of /api/token + /v1/tracks for tests.
+
+       stub   = StandInSpotify(rate_limit=1, token_ttl=2, reject={"<id>"})
+       client = SpotifyClient(base_url="https://stand-in/v1", transport=stub.transport())
+
+    • client-credentials tokens stop working after `token_ttl` track calls → 401
+    • the first `rate_limit` track calls get 429 + Retry-After: `retry_after`
+    • a batch holding an id from `reject` gets 400 (not retried, not checkpointed)
+    • ids in `unknown` come back null, like deleted tracks
+    """
+    def __init__(self, rate_limit:int=0, retry_after:float=1.0, token_ttl:int|None=None,
+                 reject=(), unknown=()):
+        self.rate_limit, self.retry_after, self.token_ttl = rate_limit, retry_after, token_ttl
+        self.reject, self.unknown = set(reject), set(unknown)
+        self.token, self.uses = None, 0
+        self.log = {"token":0, "tracks":0, "429":0, "401":0, "400":0, "served":[]}
+
+    @staticmethod
+    def track(tid:str) -> dict:
+        return {"id":tid, "popularity":sum(map(ord, tid)) % 100,
+                "album":{"name":f"Album {tid[:6]}", "images":[{"url":f"https://img/{tid}"}]}}
+
+    def handler(self, req:httpx.Request) -> httpx.Response:
+        if req.url.path.endswith("/api/token"):
+            self.log["token"] += 1
+            self.token, self.uses = f"stand-in-{self.log['token']}", 0
+            return httpx.Response(200, json={"access_token":self.token, "expires_in":3600})
+        if not req.url.path.endswith("/tracks"):
+            return httpx.Response(404)
+        self.log["tracks"] += 1
+        stale = self.token_ttl is not None and self.uses >= self.token_ttl
+        if req.headers.get("Authorization") != f"Bearer {self.token}" or stale:
+            self.log["401"] += 1
+            return httpx.Response(401, json={"error":{"status":401, "message":"The access token expired"}})
+        self.uses += 1
+        if self.rate_limit > 0:
+            self.rate_limit -= 1; self.log["429"] += 1
+            return httpx.Response(429, headers={"Retry-After":str(self.retry_after)})
+        ids = req.url.params["ids"].split(",")
+        if self.reject & set(ids):
+            self.log["400"] += 1
+            return httpx.Response(400, json={"error":{"status":400, "message":"invalid id"}})
+        self.log["served"] += ids
+        return httpx.Response(200, json={"tracks":[None if t in self.unknown else self.track(t)
+                                                   for t in ids]})
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+# ─── apply ───────────────────────────────────────────────────────────────────
+def apply_enrichment(catalog_dir:str=CATALOG_DIR, checkpoint:str=ENRICH_PATH) -> int:
+    """Write checkpoint records into the catalog store; returns rows updated."""
+    cat  = Catalog(catalog_dir)
+    recs = read_enrichment(checkpoint)
+    ids  = [b.decode("ascii") for b in cat.ids_b]
+    old_album = cat["album"].tolist() if "album" in cat else ["Unknown"]*len(ids)
+    old_image = cat["image_url"].tolist() if "image_url" in cat else [""]*len(ids)
+    pop = (np.array(cat["popularity"], dtype=np.float64) if "popularity" in cat
+           else np.full(len(ids), np.nan))              # no column yet: NaN where unknown
+    album, image, hit = [], [], 0
+    for i, tid in enumerate(ids):
+        r = recs.get(tid)
+        if r:
+            hit += 1
+            album.append(r.get("album_name") or old_album[i])
+            image.append(r.get("image_url") or old_image[i])
+            if r.get("popularity") is not None:
+                pop[i] = r["popularity"]
+        else:
+            album.append(old_album[i]); image.append(old_image[i])
+    update_columns(catalog_dir, {"album":album, "image_url":image, "popularity":pop})
+    return hit
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+async def _run(args) -> dict:
+    cat   = open_catalog(args.csv, args.catalog)
+    done  = _done_ids(args.checkpoint)
+    todo  = [t for t in (b.decode("ascii") for b in cat.ids_b) if t not in done]
+    if args.limit: todo = todo[:args.limit]
+    print(f"🎯 {len(todo)} tracks to enrich ({len(done)} already in checkpoint)")
+    client = SpotifyClient(base_url=args.api_base, max_connections=args.concurrency*2)
+    try:
+        enr = Enricher(client, _Token(args.token, args.accounts_url),
+                       args.checkpoint, args.concurrency)
+        await enr.run(todo, min(args.batch, BATCH))
+    finally:
+        await client.aclose()
+    return enr.stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="catalog_enrich", description=__doc__.split("\n")[1])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("run","apply","status"):
+        p = sub.add_parser(name)
+        p.add_argument("--catalog",    default=CATALOG_DIR)
+        p.add_argument("--csv",        default=DATA_PATH)
+        p.add_argument("--checkpoint", default=ENRICH_PATH)
+        if name == "run":
+            p.add_argument("--token",        default=os.getenv("SPOTIFY_ACCESS_TOKEN"))
+            p.add_argument("--api-base",     default=os.getenv("SPOTIFY_API_BASE", API_BASE))
+            p.add_argument("--accounts-url", default=os.getenv("SPOTIFY_ACCOUNTS_URL", ACCOUNTS_URL))
+            p.add_argument("--concurrency",  type=int, default=4)
+            p.add_argument("--batch",        type=int, default=BATCH)
+            p.add_argument("--limit",        type=int, default=0)
+            p.add_argument("--no-apply",     action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "status":
+        cat = Catalog(args.catalog) if os.path.exists(args.catalog) else open_catalog(args.csv, args.catalog)
+        done = _done_ids(args.checkpoint)
+        print(f"{len(done)}/{len(cat)} tracks in checkpoint, "
+              f"{len(read_enrichment(args.checkpoint))} with metadata")
+        return 0
+    if args.cmd == "run":
+        stats = asyncio.run(_run(args))
+        print("📦", stats)
+        if args.no_apply:
+            return 0
+    n = apply_enrichment(args.catalog, args.checkpoint)
+    print(f"✅ catalog updated: {n} tracks enriched")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+# fennec_ai_dj/local_ml/catalog_store.py
+"""
+Columnar, memory-mappable catalog built once from cleaned_tracks.csv.
+
+   python -m fennec_ai_dj.local_ml.catalog_store build [--csv PATH] [--out DIR]
+
+Layout of the catalog directory:
+   meta.json                 row count, columns, source stamp, fingerprint
+   <num>.npy                 one fixed-dtype array per numeric column
+   id.npy                    fixed-width ASCII ids (S22)
+   id.sorted.npy/id.order.npy   sorted ids + their rows → vectorised id lookup
+   <num>.order.npy/.sorted.npy  sort index for the range-indexed columns
+   <str>.utf8 + <str>.offsets.npy   string table (names, artists, album, …)
+
+album / image_url / popularity are merged in from the enrichment
+checkpoint written by catalog_enrich, and mood_cluster is re-predicted with
+the model models/CURRENT names (train_clusters), so a rebuild keeps them.
+
+The catalog path itself is a symlink to the current version directory
+(catalog.v-<stamp>); a build or column update writes a new version and
+switches the link with one rename, so a reader opening the catalog (any
+worker, no lock) always finds a complete one.
+
+Everything is opened with mmap_mode="r", so uvicorn workers share the page
+cache instead of each parsing the CSV and holding a private copy.  A pandas
+frame is only materialised on demand (Catalog.frame) for legacy callers.
+
+Track ids are interned as int32 catalog rows: catalog.encode(ids) at the API
+edge, int arrays everywhere inside (sets = sorted unique arrays, features =
+direct gathers), catalog.decode(codes) on the way out.  Codes are only valid
+for one catalog build, so anything persisted keeps the Spotify id strings.
+"""
+from __future__ import annotations
+import os, sys, json, time, glob, fcntl, shutil, hashlib, argparse, tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+BASE_DIR     = os.path.dirname(__file__)
+DATA_PATH    = os.path.join(BASE_DIR, "cleaned_tracks.csv")
+CATALOG_DIR  = os.path.join(BASE_DIR, "catalog")
+ENRICH_PATH  = os.path.join(BASE_DIR, "catalog_enrichment.jsonl")
+MODELS_DIR   = os.path.join(BASE_DIR, "models")
+FORMAT       = 1
+
+STRING_COLS  = ("name","artists","album","image_url")
+INT_COLS     = {"mood_cluster"}
+SORTED_COLS  = ("tempo","popularity","energy")
+
+# ─── string table ────────────────────────────────────────────────────────────
+class StringTable:
+    """utf-8 blob + offsets; decodes only the rows that are asked for."""
+    def __init__(self, blob:np.ndarray, offsets:np.ndarray):
+        self.blob, self.offsets = blob, offsets
+
+    def __len__(self): return len(self.offsets) - 1
+
+    def __getitem__(self, i:int) -> str:
+        o = self.offsets
+        return self.blob[o[i]:o[i+1]].tobytes().decode("utf-8")
+
+    def take(self, rows) -> list[str]:
+        return [self[int(i)] for i in rows]
+
+    def __iter__(self):
+        for i in range(len(self)): yield self[i]
+
+    def tolist(self) -> list[str]: return list(self)
+
+    @staticmethod
+    def write(values, path:str):
+        enc  = [("" if v is None or (isinstance(v,float) and v != v) else str(v)).encode("utf-8")
+                for v in values]
+        offs = np.zeros(len(enc)+1, dtype=np.int64)
+        np.cumsum([len(e) for e in enc], out=offs[1:])
+        with open(path + ".utf8", "wb") as f:
+            f.write(b"".join(enc))
+        np.save(path + ".offsets.npy", offs)
+
+    @classmethod
+    def open(cls, path:str) -> "StringTable":
+        offs = np.load(path + ".offsets.npy", mmap_mode="r")
+        blob = (np.memmap(path + ".utf8", dtype=np.uint8, mode="r")
+                if offs[-1] else np.empty(0, dtype=np.uint8))
+        return cls(blob, offs)
+
+# ─── build ───────────────────────────────────────────────────────────────────
+def _source_stamp(csv_path:str) -> dict:
+    st = os.stat(csv_path)
+    return {"size":st.st_size, "mtime_ns":st.st_mtime_ns}
+
+def read_enrichment(path:str=ENRICH_PATH) -> dict[str,dict]:
+    """
+    id → {"album_name","image_url","popularity"} from the enrichment
+    checkpoint (JSONL, last record per id wins, torn lines skipped).
+    """
+    out = {}
+    if not path or not os.path.exists(path):
+        return out
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and rec.get("id") and not rec.get("missing"):
+                out[rec["id"]] = rec
+    return out
+
+def _merge_enrichment(frame:pd.DataFrame, records:dict[str,dict]) -> pd.DataFrame:
+    if not records:
+        return frame
+    ids = frame["id"].astype(str)
+    for col, key in (("album","album_name"), ("image_url","image_url")):
+        new = ids.map(lambda t: (records.get(t) or {}).get(key))
+        frame[col] = new.where(new.notna(), frame[col]) if col in frame else new
+    pop = pd.to_numeric(ids.map(lambda t: (records.get(t) or {}).get("popularity")),
+                        errors="coerce")
+    frame["popularity"] = pop.where(pop.notna(), frame["popularity"]) if "popularity" in frame else pop
+    return frame
+
+def _merge_model_labels(frame:pd.DataFrame, models_dir:str|None) -> pd.DataFrame:
+    """
+    mood_cluster from the published model: publish only rewrote it in the
+    store, so the CSV's column is stale once models/CURRENT is set.
+    """
+    from fennec_ai_dj.local_ml.train_clusters import current_version, load_model, predict_clusters
+    version = current_version(models_dir) if models_dir else None
+    if version:
+        frame["mood_cluster"] = predict_clusters(frame, *load_model(version, models_dir))
+    return frame
+
+def _write_column(p, c:str, values:pd.Series) -> str:
+    """Write one non-id column; returns "strings" or "numeric"."""
+    if c in STRING_COLS or values.dtype == object or pd.api.types.is_string_dtype(values):
+        StringTable.write(values.tolist(), p(c))
+        return "strings"
+    dtype = np.int32 if c in INT_COLS else np.float64
+    arr = np.ascontiguousarray(
+        values.to_numpy(dtype=dtype, na_value=-1 if c in INT_COLS else np.nan))
+    np.save(p(f"{c}.npy"), arr)
+    if c in SORTED_COLS:
+        o = np.argsort(arr, kind="stable").astype(np.int32)
+        np.save(p(f"{c}.order.npy"), o)
+        np.save(p(f"{c}.sorted.npy"), arr[o])
+    return "numeric"
+
+def publish_dir(tmp:str, out_dir:str):
+    """
+    Publish the finished directory tmp as out_dir: rename it to a version
+    directory (<out_dir>.v-<stamp>), then point the out_dir symlink at it
+    atomically (rename over the link).  The version it replaces is kept – a
+    reader may have just resolved the link – older ones are removed.
+    Publishers serialise on <out_dir>.publish.lock; readers take no lock
+    (see open_pinned).
+    """
+    parent, base = os.path.split(os.path.abspath(out_dir))
+    version = f"{base}.v-{time.time_ns():x}"
+    os.replace(tmp, os.path.join(parent, version))
+    with open(out_dir + ".publish.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        prev = os.readlink(out_dir) if os.path.islink(out_dir) else None
+        if prev is None and os.path.isdir(out_dir):    # pre-symlink layout: moved once
+            prev = f"{base}.v-0"
+            shutil.rmtree(os.path.join(parent, prev), ignore_errors=True)
+            os.replace(out_dir, os.path.join(parent, prev))
+        link = os.path.join(parent, f".{base}.link-{os.getpid()}")
+        if os.path.lexists(link): os.remove(link)
+        os.symlink(version, link)
+        os.replace(link, out_dir)
+        keep = {version, prev and os.path.basename(prev)}
+        for old in glob.glob(os.path.join(parent, f"{base}.v-*")):
+            if os.path.basename(old) not in keep:
+                shutil.rmtree(old, ignore_errors=True)
+
+def open_pinned(path:str, opener, retries:int=3):
+    """
+    opener(version_dir) on the directory a publish_dir link points to, so
+    every file comes from one version.  A version is removed two publishes
+    later; losing it mid-open means a newer one is there – resolve again.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return opener(os.path.realpath(path))
+        except FileNotFoundError:
+            if attempt == retries: raise
+
+def build_catalog(csv_path:str=DATA_PATH, out_dir:str=CATALOG_DIR,
+                  enrichment:str|None=ENRICH_PATH, models_dir:str|None=MODELS_DIR) -> str:
+    """
+    CSV (+ enrichment checkpoint and CURRENT model labels, if any) → catalog directory.
+    Written to a temp dir, then published as a new version (see publish_dir).
+    """
+    frame  = _merge_enrichment(pd.read_csv(csv_path), read_enrichment(enrichment))
+    frame  = _merge_model_labels(frame, models_dir)
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    tmp    = tempfile.mkdtemp(prefix=".catalog-", dir=parent)
+    try:
+        p = lambda name: os.path.join(tmp, name)
+        digest = hashlib.blake2b(digest_size=16)
+
+        ids = frame["id"].astype(str).to_numpy()
+        ids_b = np.array([s.encode("ascii") for s in ids], dtype=f"S{max(map(len,ids), default=1)}")
+        order = np.argsort(ids_b, kind="stable").astype(np.int32)
+        np.save(p("id.npy"), ids_b)
+        np.save(p("id.sorted.npy"), ids_b[order])
+        np.save(p("id.order.npy"), order)
+        digest.update(ids_b.tobytes())
+
+        kinds = {"numeric":[], "strings":[]}
+        for c in frame.columns:
+            if c == "id": continue
+            kinds[_write_column(p, c, frame[c])].append(c)
+            if c in ("name","artists"):
+                with open(p(c) + ".utf8", "rb") as f:
+                    digest.update(f.read())
+
+        meta = {"format":FORMAT, "rows":len(frame), "columns":list(frame.columns),
+                "numeric":kinds["numeric"], "strings":kinds["strings"],
+                "sorted":[c for c in SORTED_COLS if c in kinds["numeric"]],
+                "source":_source_stamp(csv_path), "fingerprint":digest.hexdigest()}
+        with open(p("meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        publish_dir(tmp, out_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return out_dir
+
+def update_columns(out_dir:str, columns:dict[str,list|np.ndarray]) -> str:
+    """
+    Copy-on-write replacement of some non-id columns (same row order).
+    Unchanged files are hard-linked into the new version, so this is cheap;
+    processes that still map the old version keep reading it untouched.
+    """
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        meta = json.load(f)
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    tmp    = tempfile.mkdtemp(prefix=".catalog-", dir=parent)
+    try:
+        p = lambda name: os.path.join(tmp, name)
+        for name in os.listdir(out_dir):
+            if name == "meta.json": continue
+            try:    os.link(os.path.join(out_dir, name), p(name))
+            except OSError: shutil.copy2(os.path.join(out_dir, name), p(name))
+        for c, values in columns.items():
+            if c == "id" or c in ("name","artists"):
+                raise ValueError(f"{c} is part of the catalog identity; rebuild instead")
+            if len(values) != meta["rows"]:
+                raise ValueError(f"{c}: {len(values)} values for {meta['rows']} rows")
+            for suffix in (".npy",".order.npy",".sorted.npy",".utf8",".offsets.npy"):
+                if os.path.exists(p(c + suffix)): os.remove(p(c + suffix))
+            kind = _write_column(p, c, pd.Series(values))
+            for k in ("numeric","strings"):
+                if c in meta[k]: meta[k].remove(c)
+            meta[kind].append(c)
+            if c not in meta["columns"]: meta["columns"].append(c)
+        meta["sorted"] = [c for c in SORTED_COLS if c in meta["numeric"]]
+        with open(p("meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        publish_dir(tmp, out_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return out_dir
+
+# ─── load ────────────────────────────────────────────────────────────────────
+class Catalog:
+    """
+    Read-only columnar catalog.  catalog["tempo"] → ndarray (mmap),
+    catalog.strings("name") → StringTable, catalog.rows_for_ids([...]).
+    """
+    def __init__(self, path:str):
+        open_pinned(path, self._open)               # one version, never read through the link
+        self._frame: pd.DataFrame|None = None
+
+    def _open(self, path:str):
+        self.path = path
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.fingerprint = self.meta["fingerprint"]
+        self._n = self.meta["rows"]
+        m = lambda name: np.load(os.path.join(self.path, name), mmap_mode="r")
+        self.ids_b      = m("id.npy")
+        self._ids_sorted = m("id.sorted.npy")
+        self._ids_order  = m("id.order.npy")
+        self._cols   = {c: m(f"{c}.npy") for c in self.meta["numeric"]}
+        self._str    = {c: StringTable.open(os.path.join(self.path, c)) for c in self.meta["strings"]}
+        self._sorted = {c: (m(f"{c}.order.npy"), m(f"{c}.sorted.npy")) for c in self.meta["sorted"]}
+
+    def __len__(self): return self._n
+
+    def __contains__(self, col:str): return col == "id" or col in self._cols or col in self._str
+
+    def __getitem__(self, col:str) -> np.ndarray|StringTable:
+        if col in self._cols: return self._cols[col]
+        if col in self._str:  return self._str[col]
+        if col == "id": return self.ids_b
+        raise KeyError(col)
+
+    @property
+    def columns(self) -> list[str]: return list(self.meta["columns"])
+
+    def strings(self, col:str) -> StringTable|None:
+        return self._str.get(col)
+
+    def sorted_column(self, col:str) -> tuple[np.ndarray,np.ndarray]|None:
+        """(row order, sorted values) persisted at build time, if any."""
+        return self._sorted.get(col)
+
+    # ─── ids ─────────────────────────────────────────────────────────────────
+    def id_at(self, row:int) -> str:
+        return self.ids_b[row].decode("ascii")
+
+    def ids_at(self, rows) -> list[str]:
+        return [b.decode("ascii") for b in self.ids_b[np.asarray(rows, dtype=np.intp)]]
+
+    def id_positions(self, ids) -> np.ndarray:
+        """Row of each id, aligned with the input; -1 where the id is unknown."""
+        width = self._ids_sorted.dtype.itemsize
+        q = [s.encode("ascii", "ignore") if isinstance(s,str) else b"" for s in ids]
+        q = np.array([s if len(s) <= width else b"" for s in q], dtype=self._ids_sorted.dtype)
+        out = np.full(len(q), -1, dtype=np.intp)
+        if not len(q) or not self._n:
+            return out
+        pos = np.searchsorted(self._ids_sorted, q)
+        pos[pos >= self._n] = 0
+        hit = (self._ids_sorted[pos] == q) & (q != b"")
+        out[hit] = self._ids_order[pos[hit]]
+        return out
+
+    def encode(self, ids) -> np.ndarray:
+        """Interned int32 code (= catalog row) per id; -1 where not in the catalog."""
+        return self.id_positions(ids).astype(np.int32)
+
+    def decode(self, codes) -> list[str]:
+        """Spotify ids for codes from encode(); -1 must be filtered out first."""
+        return self.ids_at(codes)
+
+    def rows_for_ids(self, ids) -> np.ndarray:
+        """Catalog rows of the given Spotify ids (unknown ids are skipped)."""
+        pos = self.id_positions(ids)
+        return pos[pos >= 0]
+
+    # ─── pandas views (legacy callers) ───────────────────────────────────────
+    def take(self, rows, cols:list[str]) -> pd.DataFrame:
+        """Small DataFrame of the given rows/columns (copies only those rows)."""
+        rows = np.asarray(rows, dtype=np.intp)
+        data = {}
+        for c in cols:
+            if c == "id":        data[c] = self.ids_at(rows)
+            elif c in self._str: data[c] = self._str[c].take(rows)
+            else:                data[c] = np.asarray(self._cols[c][rows])
+        return pd.DataFrame(data, columns=cols)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Full DataFrame, materialised once; numeric columns stay mmap views."""
+        if self._frame is None:
+            data = {"id": [b.decode("ascii") for b in self.ids_b]}
+            data |= {c: t.tolist() for c, t in self._str.items()}
+            data |= self._cols
+            self._frame = pd.DataFrame(data, columns=self.columns, copy=False)
+        return self._frame
+
+def is_stale(csv_path:str=DATA_PATH, out_dir:str=CATALOG_DIR) -> bool:
+    try:
+        with open(os.path.join(out_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if meta.get("format") != FORMAT:
+        return True
+    return os.path.exists(csv_path) and meta.get("source") != _source_stamp(csv_path)
+
+@contextmanager
+def _build_lock(out_dir:str):
+    """Cross-process lock so concurrent workers build the store only once."""
+    with open(out_dir + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(f, fcntl.LOCK_UN)
+
+def open_catalog(csv_path:str=DATA_PATH, out_dir:str=CATALOG_DIR,
+                 models_dir:str|None=MODELS_DIR) -> Catalog:
+    """Map the catalog, building it first if missing or older than the CSV."""
+    if is_stale(csv_path, out_dir):
+        with _build_lock(out_dir):
+            if is_stale(csv_path, out_dir):
+                print("🛠  building catalog store from", csv_path)
+                build_catalog(csv_path, out_dir, models_dir=models_dir)
+    return Catalog(out_dir)
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="catalog_store", description=__doc__.split("\n")[1])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="convert cleaned_tracks.csv into the catalog store")
+    b.add_argument("--csv", default=DATA_PATH)
+    b.add_argument("--out", default=CATALOG_DIR)
+    args = ap.parse_args(argv)
+    if args.cmd == "build":
+        path = build_catalog(args.csv, args.out)
+        cat  = Catalog(path)
+        print(f"✅ {len(cat)} tracks → {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
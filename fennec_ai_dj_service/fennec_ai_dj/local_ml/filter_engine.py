@@ -0,0 +1,214 @@
+# fennec_ai_dj/local_ml/filter_engine.py
+"""
+Compiled columnar evaluator for the FILTER DSL used by recommend_by_filters.
+
+   rules → compile_rules() → CompiledFilter → FilterEngine.select()
+
+• every numeric column lives in one contiguous float64 array
+• tempo / popularity / energy keep a sorted index, so range predicates on
+  them are two searchsorted calls; the most selective one drives the scan
+  and the remaining predicates are checked on that candidate set only
+• the ±25/50/75 % relaxation is evaluated for all steps in one pass over
+  the columns: an (n, steps) pass matrix yields the minimum step per row
+• genre / keyword terms are posting-list lookups in the TextIndex,
+  intersected with the numeric candidate rows
+• the two full-column passes (unindexed predicates, relaxation) are plain
+  functions over a row range, so a ShardedScorer (engine.shards) can run
+  them per shard in worker processes
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+from fennec_ai_dj.local_ml.text_index import TextIndex
+
+STANDARD_FEATURES = {
+    "tempo","danceability","energy","valence","acousticness",
+    "instrumentalness","speechiness","liveness","loudness",
+    "popularity","duration_ms"
+}
+_SCALE_1K     = {"danceability","energy","valence","acousticness",
+                 "speechiness","liveness"}
+INDEXED       = ("tempo","popularity","energy")
+RELAX_STEPS   = (0.25, 0.50, 0.75)
+
+_OPS = {">":np.greater, ">=":np.greater_equal, "<":np.less,
+        "<=":np.less_equal, "==":np.equal}
+
+# ─── compile ────────────────────────────────────────────────────────────────
+class CompiledFilter:
+    """Normalised rules: numeric (feature, op, value) triples + text terms."""
+    __slots__ = ("numeric","terms")
+
+    def __init__(self, numeric:list[tuple[str,str,float]], terms:list[str]):
+        self.numeric = numeric
+        self.terms   = terms
+
+    def __bool__(self): return bool(self.numeric or self.terms)
+
+    def __repr__(self): return f"CompiledFilter(numeric={self.numeric}, terms={self.terms})"
+
+def compile_rules(rules:list[dict]) -> CompiledFilter:
+    """
+    Validate + normalise GPT rules once. Unknown features / ops are dropped,
+    the 0-1 features are rescaled to the catalog's 1e-3 units.
+    """
+    numeric, terms = [], []
+    for rule in rules or []:
+        feature, op, value = rule.get("feature"), rule.get("op"), rule.get("value")
+        if feature == "genre" and op == "match" and isinstance(value,str):
+            if value.strip():
+                terms.append(value.lower().strip())
+            continue
+        if feature not in STANDARD_FEATURES or op not in _OPS:
+            continue
+        try:
+            val = float(value)
+        except (TypeError, ValueError):
+            continue
+        if feature in _SCALE_1K and val > 0.01:
+            val *= 0.001
+        numeric.append((feature, op, val))
+    return CompiledFilter(numeric, terms)
+
+def _column(frame, c:str) -> np.ndarray:
+    col = frame[c]
+    if isinstance(col, pd.Series):
+        col = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.ascontiguousarray(col, dtype=np.float64)
+
+# ─── full-column passes (also run per shard, see sharded.py) ────────────────
+def numeric_mask(cols:dict[str,np.ndarray], preds, lo:int=0, hi:int|None=None) -> np.ndarray:
+    """Bool mask over rows lo:hi passing every (col, op, val) predicate."""
+    n = (hi if hi is not None else len(next(iter(cols.values())))) - lo
+    mask = np.ones(n, dtype=bool)
+    tmp  = np.empty(n, dtype=bool)
+    for col, op, val in preds:
+        mask &= _OPS[op](cols[col][lo:lo+n], val, out=tmp)
+    return mask
+
+def relax_levels(cols:dict[str,np.ndarray], preds, steps=RELAX_STEPS,
+                 lo:int=0, hi:int|None=None) -> np.ndarray:
+    """
+    Per row of lo:hi: index of the smallest relaxation step at which every
+    inequality predicate passes (len(steps) if none).
+    """
+    n  = (hi if hi is not None else len(next(iter(cols.values())))) - lo
+    s  = np.asarray(steps, dtype=np.float64)
+    ok = np.ones((n, len(s)), dtype=bool)
+    for col, op, val in preds:
+        thr = val * ((1 - s) if op in (">",">=") else (1 + s))
+        ok &= _OPS[op](cols[col][lo:lo+n, None], thr[None, :])
+    return np.where(ok.any(axis=1), ok.argmax(axis=1), len(s))
+
+# ─── engine ─────────────────────────────────────────────────────────────────
+class FilterEngine:
+    """Column arrays + sorted indexes built once from the catalog frame."""
+
+    def __init__(self, frame, indexed=INDEXED, text:TextIndex|None=None):
+        """
+        frame: DataFrame or Catalog. A Catalog's persisted sort indexes and
+        mmap'd float64 columns are used as-is (no per-worker copy).
+        """
+        self.n = len(frame)
+        self.cols: dict[str,np.ndarray] = {
+            c: _column(frame, c) for c in STANDARD_FEATURES if c in frame
+        }
+        # col → (row order, sorted values, number of non-NaN values)
+        self.sorted: dict[str,tuple[np.ndarray,np.ndarray,int]] = {}
+        persisted = getattr(frame, "sorted_column", lambda c: None)
+        for c in indexed:
+            if c not in self.cols: continue
+            pre = persisted(c)
+            if pre is not None:
+                order, vals = pre
+            else:
+                order = np.argsort(self.cols[c], kind="stable")
+                vals  = self.cols[c][order]
+            self.sorted[c] = (order, vals, int(np.count_nonzero(~np.isnan(vals))))
+        self.text = text if text is not None else TextIndex.build(frame["artists"], frame["name"])
+        self.shards = None                # ShardedScorer over self.cols, if attached
+
+    # ─── primitives ─────────────────────────────────────────────────────────
+    def _bounds(self, col:str, op:str, val:float) -> tuple[int,int]:
+        _, vals, valid = self.sorted[col]
+        if op == ">":  return int(np.searchsorted(vals[:valid], val, "right")), valid
+        if op == ">=": return int(np.searchsorted(vals[:valid], val, "left")),  valid
+        if op == "<":  return 0, int(np.searchsorted(vals[:valid], val, "left"))
+        if op == "<=": return 0, int(np.searchsorted(vals[:valid], val, "right"))
+        return (int(np.searchsorted(vals[:valid], val, "left")),
+                int(np.searchsorted(vals[:valid], val, "right")))
+
+    def range(self, col:str, lo:float|None=None, hi:float|None=None,
+              lo_op:str=">=", hi_op:str="<=") -> np.ndarray:
+        """Sorted row positions with lo (op) col (op) hi via the sorted index."""
+        preds = ([(col, lo_op, lo)] if lo is not None else []) + \
+                ([(col, hi_op, hi)] if hi is not None else [])
+        return self.select(CompiledFilter(preds, []))
+
+    def text_rows(self, term:str) -> np.ndarray:
+        """Sorted row positions whose artists or name contain term."""
+        return self.text.lookup(term)
+
+    # ─── strict evaluation ──────────────────────────────────────────────────
+    def select(self, cf:CompiledFilter) -> np.ndarray:
+        """Row positions (ascending) satisfying every predicate of cf."""
+        # tighten one [lo,hi) window per indexed column
+        windows: dict[str,list[int]] = {}
+        rest = []
+        for col, op, val in cf.numeric:
+            if col not in self.cols:
+                return np.empty(0, dtype=np.intp)
+            if col in self.sorted:
+                lo, hi = self._bounds(col, op, val)
+                w = windows.setdefault(col, [0, self.n])
+                w[0], w[1] = max(w[0], lo), min(w[1], hi)
+            else:
+                rest.append((col, op, val))
+
+        if windows:
+            driver = min(windows, key=lambda c: windows[c][1] - windows[c][0])
+            lo, hi = windows.pop(driver)
+            if hi <= lo:
+                return np.empty(0, dtype=np.intp)
+            rows = np.sort(self.sorted[driver][0][lo:hi])
+            # the other indexed windows are re-checked by value on the candidates
+            for col, (wlo, whi) in windows.items():
+                _, vals, _ = self.sorted[col]
+                if whi <= wlo:
+                    return np.empty(0, dtype=np.intp)
+                v = self.cols[col][rows]
+                rows = rows[(v >= vals[wlo]) & (v <= vals[whi-1])]
+            for col, op, val in rest:
+                rows = rows[_OPS[op](self.cols[col][rows], val)]
+        elif rest:
+            rows = (self.shards.mask(rest) if self.shards is not None
+                    else np.flatnonzero(numeric_mask(self.cols, rest, 0, self.n)))
+        else:
+            rows = None
+
+        for term in cf.terms:
+            hits = self.text.lookup(term)
+            rows = hits if rows is None else np.intersect1d(rows, hits, assume_unique=True)
+            if not len(rows): break
+        return np.arange(self.n) if rows is None else rows
+
+    # ─── relaxed evaluation ─────────────────────────────────────────────────
+    def _relaxable(self, cf:CompiledFilter) -> list[tuple[str,str,float]]:
+        # '==' and text predicates are not part of relaxation
+        return [(c, op, v) for c, op, v in cf.numeric if op != "==" and c in self.cols]
+
+    def relax_levels(self, cf:CompiledFilter, steps=RELAX_STEPS) -> np.ndarray:
+        """Per row: smallest relaxation step passing every inequality (len(steps) if none)."""
+        return relax_levels(self.cols, self._relaxable(cf), steps, 0, self.n)
+
+    def select_relaxed(self, cf:CompiledFilter,
+                       steps=RELAX_STEPS) -> tuple[float|None,np.ndarray]:
+        """(step used, row positions) for the first step with any hit."""
+        if self.shards is not None:
+            return self.shards.select_relaxed(self._relaxable(cf), steps)
+        level = self.relax_levels(cf, steps)
+        best  = int(level.min()) if self.n else len(steps)
+        if best >= len(steps):
+            return None, np.empty(0, dtype=np.intp)
+        return steps[best], np.flatnonzero(level == best)
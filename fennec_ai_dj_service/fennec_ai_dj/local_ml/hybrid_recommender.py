@@ -1,18 +1,16 @@
 # fennec_ai_dj/local_ml/hybrid_recommender.py
 
-import pandas as pd
 from fennec_ai_dj.spotify_api import (
     get_user_saved_track_ids,
     get_user_recent_track_ids
 )
 from fennec_ai_dj.local_ml.local_song_recommender import (
     recommend_by_user_profile,
-    get_recommendations_from_local_model
+    get_recommendations_from_local_model,
+    catalog
 )
 
-# Load the cleaned CSV once
-CSV_PATH = "fennec_ai_dj/local_ml/cleaned_tracks.csv"
-df = pd.read_csv(CSV_PATH).set_index("id")
+PROFILE_COLS = ["danceability","energy","valence","acousticness","tempo"]
 
 def hybrid_recommendations(access_token: str, feedback_likes: list[dict]):
     # 1) Pull Spotify seeds
@@ -25,19 +23,13 @@ def hybrid_recommendations(access_token: str, feedback_likes: list[dict]):
     # 3) Consolidate & dedupe
     all_ids = list(dict.fromkeys(saved_ids + recent_ids + feedback_ids))
     
-    # 4) Lookup local features
-    seeds = []
-    for tid in all_ids:
-        if tid in df.index:
-            row = df.loc[tid]
-            seeds.append({
-                k: row[k]
-                for k in ["danceability","energy","valence","acousticness","tempo"]
-            })
+    # 4) Lookup local features (shared catalog store, no second CSV parse)
+    rows = catalog.rows_for_ids(all_ids)
+
     # 5) Build profile & recommend
-    if seeds:
+    if len(rows):
         # average features into one profile
-        profile = {k: sum(d[k] for d in seeds)/len(seeds) for k in seeds[0]}
+        profile = {k: float(catalog[k][rows].mean()) for k in PROFILE_COLS}
         return recommend_by_user_profile(profile)
     
     # 6) Fallback
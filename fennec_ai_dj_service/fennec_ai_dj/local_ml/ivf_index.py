@@ -0,0 +1,358 @@
+# fennec_ai_dj/local_ml/ivf_index.py
+"""
+Inverted-file (IVF) approximate nearest-neighbour index over the ranking
+matrix, for catalogs where one exact distance pass per query is too slow.
+
+• coarse quantizer seeded from the KMeans mood centroids: every mood
+  cluster is split into sub-lists (∝ its size, nlist in total) by a small
+  k-means over that cluster's rows, so lists never straddle two moods
+• rows are stored list by list (contiguous float32, or PQ codes), so a
+  query reads nprobe slices instead of the whole matrix
+• pq=M: residuals to the list centroid are product-quantised into M
+  uint8 codes per row (5 → M bytes instead of 20); candidates are scored
+  by table lookup (ADC) and the best refine·k are re-ranked exactly
+• nprobe is the recall/latency knob (IVF_NPROBE; `bench` prints the curve)
+
+Built offline next to the model (models/<version>/ivf, or local_ml/ivf
+for the legacy pkl pair), opened memory-mapped, ignored when its key
+(catalog fingerprint + model version) doesn't match the loaded bundle.
+
+   python -m fennec_ai_dj.local_ml.ivf_index build [--nlist N] [--pq M]
+   python -m fennec_ai_dj.local_ml.ivf_index bench [--k 20] [--nprobe 1,2,4,8,16]
+
+   ivf  = IVFIndex.build(ranker.matrix, kmeans.cluster_centers_, nlist=1024)
+   ivf  = IVFIndex.build_to(path, chunks, n, sample, centers)   # out of core (train)
+   rows = ivf.search(q, k=20, nprobe=8)          # (m,k) row positions
+"""
+from __future__ import annotations
+import os, sys, json, time, shutil, argparse, tempfile
+import numpy as np
+
+from fennec_ai_dj.local_ml.ranking import _ordered_top_k
+
+FORMAT  = 1
+NPROBE  = int(os.getenv("IVF_NPROBE", "16"))
+REFINE  = 4           # PQ: re-rank refine·k candidates with exact vectors
+SAMPLE  = 100_000     # rows used to train sub-lists / PQ codebooks
+
+def index_key(fingerprint:str, model_version:str) -> str:
+    """What an index was built from; a bundle only uses an index with its own key."""
+    return f"{fingerprint}-{model_version}"
+
+def default_nlist(n:int) -> int:
+    return max(1, int(4 * np.sqrt(n)))
+
+def _kmeans(X:np.ndarray, k:int, seed:int) -> np.ndarray:
+    """k centres of X (float32); MiniBatch on at most SAMPLE rows."""
+    if k >= len(X): return X.astype(np.float32)
+    from sklearn.cluster import MiniBatchKMeans
+    rng = np.random.default_rng(seed)
+    if len(X) > SAMPLE: X = X[rng.choice(len(X), SAMPLE, replace=False)]
+    km = MiniBatchKMeans(n_clusters=k, batch_size=4096, n_init=1, random_state=seed)
+    return km.fit(X).cluster_centers_.astype(np.float32)
+
+def _nearest(X:np.ndarray, C:np.ndarray) -> np.ndarray:
+    """Index of the nearest row of C for every row of X (chunked: ≤ 2^20 distances at once)."""
+    out = np.empty(len(X), dtype=np.int32)
+    cn = np.einsum("ij,ij->i", C, C)
+    chunk = max(1024, (1 << 20) // max(1, len(C)))
+    for a in range(0, len(X), chunk):
+        out[a:a+chunk] = (cn[None, :] - 2.0 * (X[a:a+chunk] @ C.T)).argmin(axis=1)
+    return out
+
+def sample_size(nlist:int) -> int:
+    """Rows to fit nlist lists on: SAMPLE, or ~64 per list for large nlist."""
+    return max(SAMPLE, 64 * nlist)
+
+def _fit_lists(S:np.ndarray, centers:np.ndarray, nlist:int, seed:int) -> tuple[np.ndarray,np.ndarray]:
+    """(list centroids, parent KMeans cluster per list): each mood cluster's share
+    of the sample S is split into ∝ nlist sub-lists."""
+    top = _nearest(S, np.asarray(centers, np.float32))
+    cents, parent = [], []
+    for c in range(len(centers)):
+        members = S[top == c]
+        if not len(members): continue
+        sub = max(1, round(nlist * len(members) / len(S)))
+        cents.append(_kmeans(members, sub, seed + c))
+        parent += [c] * len(cents[-1])
+    return np.concatenate(cents), np.asarray(parent, dtype=np.int32)
+
+def _fit_codebooks(resid:np.ndarray, pq:int, seed:int) -> np.ndarray:
+    """(pq, 256, width) PQ codebooks over residual sub-vectors (zero-padded)."""
+    split = np.array_split(np.arange(resid.shape[1]), pq)
+    books = np.zeros((pq, 256, max(len(s) for s in split)), dtype=np.float32)
+    for m, dims in enumerate(split):
+        cb = _kmeans(resid[:, dims], 256, seed + 1000 + m)
+        books[m, :len(cb), :len(dims)] = cb
+    return books
+
+def _encode(resid:np.ndarray, books:np.ndarray) -> np.ndarray:
+    split = np.array_split(np.arange(resid.shape[1]), len(books))
+    codes = np.empty((len(resid), len(books)), dtype=np.uint8)
+    for m, dims in enumerate(split):
+        codes[:, m] = _nearest(resid[:, dims], books[m, :, :len(dims)])
+    return codes
+
+def _write(path:str, key:str, fill):
+    """fill(tmp) → (arrays, meta) writes an index into a temp dir, then swaps it in."""
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".ivf-", dir=parent_dir)
+    try:
+        arrays, meta = fill(tmp)
+        for name, a in arrays.items():
+            if a is not None: np.save(os.path.join(tmp, name + ".npy"), a)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"format":FORMAT, "key":key, **meta}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+# ─── index ───────────────────────────────────────────────────────────────────
+class IVFIndex:
+    def __init__(self, centroids:np.ndarray, parent:np.ndarray, offsets:np.ndarray,
+                 rows:np.ndarray, vectors:np.ndarray|None=None, codes:np.ndarray|None=None,
+                 codebooks:np.ndarray|None=None, key:str=""):
+        self.centroids = np.asarray(centroids, dtype=np.float32)   # (nlist, d)
+        self.parent    = parent        # list → KMeans cluster it was split from
+        self.offsets   = offsets       # (nlist+1,) into rows / vectors / codes
+        self.rows      = rows          # int32 catalog rows, list by list
+        self.vectors   = vectors       # (n, d) float32 in list order, or None with PQ
+        self.codes     = codes         # (n, M) uint8 residual codes, or None
+        self.codebooks = codebooks     # (M, 256, d/M) – sub-vectors zero-padded
+        self.key       = key
+        self._cnorm    = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._vnorm    = (None if vectors is None else
+                          np.einsum("ij,ij->i", np.asarray(vectors), np.asarray(vectors)))
+        if codes is not None:
+            d, M = self.centroids.shape[1], codes.shape[1]
+            self._split = np.array_split(np.arange(d), M)
+
+    def __len__(self): return len(self.rows)
+
+    @property
+    def nlist(self) -> int: return len(self.centroids)
+
+    @property
+    def pq(self) -> int: return 0 if self.codes is None else self.codes.shape[1]
+
+    def nbytes(self) -> int:
+        parts = [self.rows, self.offsets, self.centroids, self.vectors, self.codes, self.codebooks]
+        return int(sum(p.nbytes for p in parts if p is not None))
+
+    # ─── build ───────────────────────────────────────────────────────────────
+    @classmethod
+    def build(cls, matrix:np.ndarray, centers:np.ndarray, nlist:int|None=None,
+              pq:int=0, seed:int=0, key:str="") -> "IVFIndex":
+        """matrix: scaler-normalised (n, d) rows in RAM; centers: KMeans centroids (same space)."""
+        X = np.ascontiguousarray(matrix, dtype=np.float32)
+        valid = np.flatnonzero(np.isfinite(X).all(axis=1))
+        nlist = nlist or default_nlist(len(valid))
+        rng = np.random.default_rng(seed)
+        S = X[np.sort(rng.choice(valid, min(len(valid), sample_size(nlist)), replace=False))]
+        cents, parent = _fit_lists(S, centers, nlist, seed)
+        lists = _nearest(X[valid], cents)
+        order = np.argsort(lists, kind="stable")
+        rows  = valid[order].astype(np.int32)
+        offsets = np.zeros(len(cents) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=len(cents)), out=offsets[1:])
+        if not pq:
+            return cls(cents, parent, offsets, rows, vectors=X[rows], key=key)
+        books = _fit_codebooks(S - cents[_nearest(S, cents)], pq, seed)
+        codes = _encode(X[rows] - cents[lists[order]], books)
+        return cls(cents, parent, offsets, rows, codes=codes, codebooks=books, key=key)
+
+    @classmethod
+    def build_to(cls, path:str, chunks, n_rows:int, sample:np.ndarray, centers:np.ndarray,
+                 nlist:int|None=None, pq:int=0, seed:int=0, key:str="") -> "IVFIndex":
+        """
+        Out-of-core build straight into `path`, for catalogs that don't fit
+        in RAM.  chunks() → iterator of (first row, normalised float rows),
+        called twice; sample: finite normalised rows the lists (and PQ
+        codebooks) are fitted on, sample_size(nlist) of them.  Pass 1 assigns every row to its list
+        (one int32 per row), pass 2 scatters rows into list order in
+        memory-mapped output files.  Returns the index opened from `path`.
+        """
+        S = np.ascontiguousarray(sample, dtype=np.float32)
+        cents, parent = _fit_lists(S, centers, nlist or default_nlist(n_rows), seed)
+        lists = []
+        for a, X in chunks():                                     # pass 1: list per row
+            X = np.asarray(X, dtype=np.float32)
+            ok = np.isfinite(X).all(axis=1)
+            l = np.full(len(X), -1, dtype=np.int32)
+            if ok.any(): l[ok] = _nearest(X[ok], cents)
+            lists.append(l)
+        lists = np.concatenate(lists)
+        counts = np.bincount(lists[lists >= 0], minlength=len(cents))
+        offsets = np.zeros(len(cents) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        n, d = int(offsets[-1]), S.shape[1]
+        books = _fit_codebooks(S - cents[_nearest(S, cents)], pq, seed) if pq else None
+
+        def publish(tmp):
+            out = lambda name, shape, dtype: np.lib.format.open_memmap(
+                os.path.join(tmp, name + ".npy"), mode="w+", dtype=dtype, shape=shape)
+            rows = out("rows", (n,), np.int32)
+            data = out("codes", (n, pq), np.uint8) if pq else out("vectors", (n, d), np.float32)
+            cursor = offsets[:-1].copy()
+            for a, X in chunks():                                 # pass 2: scatter
+                l = lists[a:a+len(X)]
+                keep = np.flatnonzero(l >= 0)
+                order = keep[np.argsort(l[keep], kind="stable")]
+                ls = l[order]
+                pos = cursor[ls] + np.arange(len(ls)) - np.searchsorted(ls, ls)
+                cursor += np.bincount(ls, minlength=len(cents))
+                rows[pos] = a + order
+                V = np.asarray(X, dtype=np.float32)[order]
+                data[pos] = _encode(V - cents[ls], books) if pq else V
+            rows.flush(); data.flush()
+            del rows, data
+            return {"centroids":cents, "parent":parent, "offsets":offsets,
+                    "codebooks":books}, {"nlist":len(cents), "pq":pq, "rows":n}
+
+        _write(path, key, publish)
+        return cls.load(path)
+
+    # ─── persistence ─────────────────────────────────────────────────────────
+    def save(self, path:str):
+        arrays = {"centroids":self.centroids, "parent":self.parent, "offsets":self.offsets,
+                  "rows":self.rows, "vectors":self.vectors, "codes":self.codes,
+                  "codebooks":self.codebooks}
+        _write(path, self.key, lambda tmp: (arrays, {"nlist":self.nlist, "pq":self.pq,
+                                                     "rows":len(self)}))
+
+    @classmethod
+    def load(cls, path:str) -> "IVFIndex":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"ivf format {meta.get('format')} != {FORMAT}")
+        def arr(name, mmap=True):
+            p = os.path.join(path, name + ".npy")
+            return np.load(p, mmap_mode="r" if mmap else None) if os.path.exists(p) else None
+        return cls(arr("centroids", False), arr("parent", False), arr("offsets", False),
+                   arr("rows"), arr("vectors"), arr("codes"), arr("codebooks", False), meta["key"])
+
+    @classmethod
+    def open(cls, path:str, key:str) -> "IVFIndex|None":
+        """The index at path if it was built for `key`, else None (exact search)."""
+        if not os.path.exists(os.path.join(path, "meta.json")): return None
+        try:
+            ivf = cls.load(path)
+        except Exception as e:
+            print("⚠️ ivf index unreadable, using exact search:", e)
+            return None
+        if ivf.key != key:
+            print(f"⚠️ ivf index built for {ivf.key}, not {key}: using exact search")
+            return None
+        return ivf
+
+    # ─── search ──────────────────────────────────────────────────────────────
+    def probe(self, q:np.ndarray, nprobe:int) -> np.ndarray:
+        """The nprobe lists nearest to one normalised query, nearest first."""
+        d = self._cnorm - 2.0 * (self.centroids @ q)
+        return _ordered_top_k(d, min(nprobe, self.nlist))
+
+    def _scan(self, q:np.ndarray, lists:np.ndarray) -> tuple[np.ndarray,np.ndarray]:
+        """(positions into rows, distances) of every row in `lists`."""
+        o = self.offsets
+        pos = np.concatenate([np.arange(o[l], o[l+1]) for l in lists.tolist()])
+        if self.codes is None:
+            V = self.vectors[pos]
+            return pos, self._vnorm[pos] - 2.0 * (V @ q)
+        sizes = o[lists + 1] - o[lists]
+        which = np.repeat(np.arange(len(lists)), sizes)      # probed list of each position
+        R = q[None, :] - self.centroids[lists]                # residual query per list
+        codes = np.asarray(self.codes[pos])
+        d = np.zeros(len(pos), dtype=np.float32)
+        for m, dims in enumerate(self._split):                # ADC: (lists, 256) table per sub-space
+            table = ((self.codebooks[m, None, :, :len(dims)] - R[:, None, dims])**2).sum(axis=2)
+            d += table[which, codes[:, m]]
+        return pos, d
+
+    def search_one(self, q:np.ndarray, k:int, nprobe:int|None=None, exclude=None,
+                   exact:np.ndarray|None=None) -> np.ndarray:
+        """
+        k rows nearest to one normalised query.  Probes more lists while the
+        probed ones hold fewer than k usable rows.  exact: the full float
+        matrix, used to re-rank PQ candidates.
+        """
+        q = np.asarray(q, dtype=np.float32)
+        nprobe = max(1, nprobe or NPROBE)
+        while True:
+            pos, d = self._scan(q, self.probe(q, nprobe))
+            rows = np.asarray(self.rows[pos])
+            if exclude is not None and len(exclude):
+                d = np.where(np.isin(rows, exclude), np.inf, d)
+            usable = int(np.isfinite(d).sum())
+            if usable >= k or nprobe >= self.nlist: break
+            nprobe *= 2
+        k = min(k, usable)
+        if self.codes is not None and exact is not None:
+            cand = _ordered_top_k(d, min(len(d), REFINE * k))
+            cand = cand[np.isfinite(d[cand])]
+            X = exact[rows[cand]]
+            top = _ordered_top_k(np.einsum("ij,ij->i", X, X) - 2.0 * (X @ q), k)
+            return rows[cand[top]].astype(np.intp)
+        return rows[_ordered_top_k(d, k)].astype(np.intp)
+
+    def search(self, q:np.ndarray, k:int, nprobe:int|None=None, exclude=None,
+               exact:np.ndarray|None=None) -> np.ndarray:
+        """(m,k) rows for m normalised queries (rows beyond the usable count are cut)."""
+        out = [self.search_one(x, k, nprobe, exclude, exact) for x in np.atleast_2d(q)]
+        k = min(len(r) for r in out)
+        return np.stack([r[:k] for r in out])
+
+# ─── offline build / benchmark ───────────────────────────────────────────────
+def _bench(ranker, ivf:IVFIndex, k:int, nprobes:list[int], n_queries:int, seed:int=0):
+    rng = np.random.default_rng(seed)
+    X = ranker.matrix
+    # profiles are averages of seeds: mean of 10 random rows + a little noise
+    q = np.stack([X[rng.choice(len(X), 10)].mean(axis=0) for _ in range(n_queries)])
+    q = (q + rng.normal(0, 0.1, q.shape)).astype(np.float32)
+    t0 = time.perf_counter()
+    truth = [set(ranker.top_k_scaled(x[None], k)[0].tolist()) for x in q]
+    exact_us = (time.perf_counter() - t0) / n_queries * 1e6
+    print(f"   exact        {exact_us:9.0f} µs/query   recall@{k} 1.000")
+    for p in nprobes:
+        t0 = time.perf_counter()
+        got = [ivf.search_one(x, k, p, exact=X) for x in q]
+        us = (time.perf_counter() - t0) / n_queries * 1e6
+        rec = np.mean([len(t & set(g.tolist())) / k for t, g in zip(truth, got)])
+        print(f"   nprobe {p:>4}  {us:9.0f} µs/query   recall@{k} {rec:.3f}   ×{exact_us/us:.1f}")
+
+def main(argv=None):
+    from fennec_ai_dj.local_ml.artifacts import load_artifacts, ivf_path
+    ap = argparse.ArgumentParser(prog="ivf_index", description=__doc__.split("\n")[1])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--nlist", type=int, default=0, help="default 4·√rows")
+    b.add_argument("--pq",    type=int, default=0, help="PQ sub-quantizers (0 = flat)")
+    b.add_argument("--seed",  type=int, default=0)
+    t = sub.add_parser("bench")
+    t.add_argument("--k",       type=int, default=20)
+    t.add_argument("--nprobe",  default="1,2,4,8,16,32")
+    t.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args(argv)
+
+    art = load_artifacts()
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        ivf = IVFIndex.build(art.ranker.matrix, art.kmeans.cluster_centers_,
+                             args.nlist or None, args.pq, args.seed,
+                             index_key(art.catalog.fingerprint, art.model_version))
+        ivf.save(ivf_path(art.model_version))
+        print(f"✅ ivf {ivf.nlist} lists, pq={ivf.pq}, {len(ivf)} rows, "
+              f"{ivf.nbytes()/1e6:.1f} MB in {time.perf_counter()-t0:.1f}s → {ivf_path(art.model_version)}")
+        return 0
+    ivf = art.ivf
+    if ivf is None:
+        print("no ivf index for this bundle – run `build` first"); return 1
+    print(f"📊 {len(art.ranker)} rows, {ivf.nlist} lists, pq={ivf.pq}, {ivf.nbytes()/1e6:.1f} MB")
+    _bench(art.ranker, ivf, args.k, [int(p) for p in args.nprobe.split(",")], args.queries)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,128 +7,123 @@ Key change: recommend_by_filters(rules) understands:
    {"feature":"genre","op":"match","value":"hip hop"}
 """
 from __future__ import annotations
-import os, random, re, copy
-import pandas as pd, joblib, math
-
-BASE_DIR    = os.path.dirname(__file__)
-DATA_PATH   = os.path.join(BASE_DIR, "cleaned_tracks.csv")
-SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
-KMEANS_PATH = os.path.join(BASE_DIR, "kmeans_model.pkl")
-
-df     = pd.read_csv(DATA_PATH)
-scaler = joblib.load(SCALER_PATH)
-kmeans = joblib.load(KMEANS_PATH)
-
-STANDARD_FEATURES = {
-    "tempo","danceability","energy","valence","acousticness",
-    "instrumentalness","speechiness","liveness","loudness",
-    "popularity","duration_ms"
-}
-_SCALE_1K = {"danceability","energy","valence","acousticness",
-             "speechiness","liveness"}
+import random
+import numpy as np
+
+from fennec_ai_dj.local_ml.artifacts import ArtifactRegistry, load_artifacts
+from fennec_ai_dj.local_ml.track_json import Tracks
+from fennec_ai_dj.local_ml.filter_engine import (
+    compile_rules, STANDARD_FEATURES, _SCALE_1K,
+)
+
+# catalog (mmap'd columns) + scaler + kmeans + derived indexes, hot-reloadable;
+# the names below resolve to the bundle pinned by the current request
+registry = ArtifactRegistry(load_artifacts)
+registry.load_now()
+catalog  = registry.proxy("catalog")
+scaler   = registry.proxy("scaler")
+kmeans   = registry.proxy("kmeans")
+ranker   = registry.proxy("ranker")     # float32 scaled feature matrix
+text     = registry.proxy("text")
+filters  = registry.proxy("filters")    # column arrays + sorted indexes
+track_json = registry.proxy("track_json")   # pre-serialised response object per row
+
+_rng    = np.random.default_rng()
+
+def __getattr__(name):
+    # `df` used to be a module-level read_csv; materialise it only if asked for
+    if name == "df":
+        return catalog.frame
+    raise AttributeError(name)
 
 # ─── formatter ───────────────────────────────────────────────────────────────
-def _fmt(sub: pd.DataFrame, limit:int) -> list[dict]:
-    sample = sub.sample(min(limit,len(sub)))
-    return [{
-      "id":r["id"],
-      "name":r["name"],
-      "artists":[{"name":r["artists"]}],
-      "album":{"name":r.get("album","Unknown"),
-               "images":[{"url":r.get("image_url","")}]},
-      "uri":f"spotify:track:{r['id']}"
-    } for _,r in sample.iterrows()]
+def _fmt_rows(rows, limit:int, skip_rows=None) -> Tracks:
+    """Random sample of up to `limit` of the given row positions."""
+    if skip_rows is not None and len(skip_rows):
+        fresh = rows[~np.isin(rows, skip_rows)]
+        if len(fresh) >= limit: rows = fresh            # else allow repeats
+    pick = _rng.choice(rows, min(limit,len(rows)), replace=False)
+    return _fmt_ordered(pick)
+
+def _fmt_ordered(rows) -> Tracks:
+    """Catalog rows in the order given, as pre-serialised fragments (iterates as dicts)."""
+    return track_json.tracks(rows)
 
 # ─── generic filter recommender ───────────────────────────────────────────────
-def recommend_by_filters(rules:list[dict], limit:int=20) -> list[dict]:
+def recommend_by_filters(rules:list[dict], limit:int=20) -> Tracks:
     """
     rules: list of dicts with feature, op (>,>=,<,<=,==,match), value.
-    Supports progressive relaxation like before.
+    Rules are compiled once and evaluated over column arrays; progressive
+    relaxation (±25/50/75 %) is resolved in a single pass when nothing hits.
     """
-    if not rules: return []
-
-    working = df
-    for rule in rules:
-        feature = rule.get("feature")
-        op      = rule.get("op")
-        value   = rule.get("value")
-
-        # special "genre match" using regex on artist or track name
-        if feature == "genre" and op == "match" and isinstance(value,str):
-            pat = re.escape(value.lower())
-            working = working[
-               working["artists"].str.contains(pat, flags=re.I, na=False) |
-               working["name"].str.contains(pat, flags=re.I, na=False)
-            ]
-            continue
-
-        if feature not in STANDARD_FEATURES:
-            continue  # unknown feature ignored
-
-        val = float(value)
-        if feature in _SCALE_1K and val > 0.01:
-            val *= 0.001
-
-        if   op == ">":  working = working[working[feature] >  val]
-        elif op == ">=": working = working[working[feature] >= val]
-        elif op == "<":  working = working[working[feature] <  val]
-        elif op == "<=": working = working[working[feature] <= val]
-        elif op == "==": working = working[working[feature] == val]
-
-    if not working.empty:
-        return _fmt(working, limit)
-
-    # progressive relaxation: widen numeric thresholds ±25 % until hit
-    relax_rules = copy.deepcopy(rules)
-    for step in (0.25, 0.50, 0.75):
-        sub = df
-        for rule in relax_rules:
-            feature, op, value = rule.get("feature"), rule.get("op"), rule.get("value")
-            if feature == "genre": continue
-            val = float(value)
-            if feature in _SCALE_1K and val > 0.01:
-                val *= 0.001
-            if op in (">",">="):  val *= (1-step)   # lower threshold
-            elif op in ("<","<="): val *= (1+step)  # raise threshold
-            # apply
-            if   op == ">":  sub = sub[sub[feature] >  val]
-            elif op == ">=": sub = sub[sub[feature] >= val]
-            elif op == "<":  sub = sub[sub[feature] <  val]
-            elif op == "<=": sub = sub[sub[feature] <= val]
-        if not sub.empty:
-            return _fmt(sub, limit)
+    if not rules: return _fmt_ordered([])
+
+    cf   = compile_rules(rules)
+    rows = filters.select(cf)
+    if len(rows):
+        return _fmt_rows(rows, limit)
+
+    _, rows = filters.select_relaxed(cf)
+    if len(rows):
+        return _fmt_rows(rows, limit)
 
     # final fallback – random energetic mood
     moods = ["energetic","happy","calm","sad","dark"]
     return recommend_by_mood(random.choice(moods), limit)
 
 # ─── other specific recommenders (unchanged) ─────────────────────────────────
-def recommend_by_mood(mood:str,count:int=20):
-    mapping={"happy":0,"sad":1,"energetic":2,"calm":3,"dark":4}
-    sub=df[df["mood_cluster"]==mapping.get(mood.lower(),2)]
-    return _fmt(sub,count) if not sub.empty else []
+def recommend_by_mood(mood:str,count:int=20,skip_rows=None):
+    # mood → cluster ids ships with the model (or is derived from its centroids)
+    moods=registry.current().moods
+    clusters=moods.get(mood.lower()) or moods["energetic"]
+    rows=np.concatenate([ranker.cluster_rows(c) for c in clusters])
+    return _fmt_rows(rows,count,skip_rows)
 
 def recommend_by_tempo(speed:str,count:int=20):
     speed=speed.lower()
-    if speed=="fast":   sub=df[df["tempo"]>130]
-    elif speed=="slow": sub=df[df["tempo"]<90]
-    else:               sub=df[(df["tempo"]>=90)&(df["tempo"]<=130)]
-    return _fmt(sub,count) if not sub.empty else []
+    if speed=="fast":   rows=filters.range("tempo",lo=130,lo_op=">")
+    elif speed=="slow": rows=filters.range("tempo",hi=90,hi_op="<")
+    else:               rows=filters.range("tempo",lo=90,hi=130)
+    return _fmt_rows(rows,count)
 
 def recommend_by_genre(keyword:str,count:int=20):
     kw=keyword.lower().strip()
-    if kw=="instrumental": sub=df[df["instrumentalness"]>0.8]
+    if kw=="instrumental":
+        rows=filters.select(compile_rules(
+            [{"feature":"instrumentalness","op":">","value":0.8}]))
+    else: rows=filters.text_rows(kw)
+    return _fmt_rows(rows,count)
+
+def recommend_by_user_profile(profile:dict,count:int=20,
+                              metric:str="euclidean",cluster:int|None=None,
+                              exclude:list[str]|None=None,skip_rows=None,
+                              lam:float=1.0,max_per_artist:int=2):
+    """
+    Tracks ordered by closeness to the (weighted) profile.
+    cluster: restrict the search to one mood_cluster sub-index.
+    exclude: track ids to skip (disliked); skip_rows: catalog rows to skip
+             (recently served).
+    lam<1: MMR re-rank of the nearest candidates for feature/artist diversity.
+    """
+    skip=catalog.rows_for_ids(exclude) if exclude else np.empty(0,dtype=np.int64)
+    if skip_rows is not None and len(skip_rows):
+        skip=np.concatenate([skip,np.asarray(skip_rows,dtype=np.int64)])
+    skip=skip if len(skip) else None
+    if lam<1:
+        rows=ranker.top_k_diverse(profile,count,lam,metric=metric,cluster=cluster,
+                                  exclude=skip,groups=registry.current().artist_codes,
+                                  max_per_group=max_per_artist)
     else:
-        pat=re.escape(kw)
-        sub=df[df["artists"].str.contains(pat,flags=re.I,na=False)|
-               df["name"].str.contains(pat,flags=re.I,na=False)]
-    return _fmt(sub,count) if not sub.empty else []
-
-def recommend_by_user_profile(profile:dict,count:int=20):
-    vec=pd.DataFrame([profile])[["danceability","energy","valence","acousticness","tempo"]]
-    cl=kmeans.predict(scaler.transform(vec))[0]
-    sub=df[df["mood_cluster"]==cl]
-    return _fmt(sub,count) if not sub.empty else []
-
-def get_recommendations_from_local_model(count:int=20):
-    return recommend_by_mood(random.choice(["happy","sad","energetic","calm","dark"]),count)
+        rows=ranker.top_k(profile,count,metric=metric,cluster=cluster,exclude=skip)
+    return _fmt_ordered(rows)
+
+def recommend_by_ids(track_ids:list[str]) -> Tracks:
+    """Format precomputed track ids (e.g. a daily mix) in the given order."""
+    return recommend_by_rows(catalog.rows_for_ids(track_ids))
+
+def recommend_by_rows(rows) -> Tracks:
+    """Format interned track codes (catalog rows) in the given order."""
+    return _fmt_ordered(rows)
+
+def get_recommendations_from_local_model(count:int=20,skip_rows=None):
+    return recommend_by_mood(random.choice(["happy","sad","energetic","calm","dark"]),count,skip_rows)
@@ -0,0 +1,206 @@
+# fennec_ai_dj/local_ml/ranking.py
+"""
+Nearest-neighbour ranking engine for the local catalog.
+
+The catalog's profile features are normalised once with the fitted scaler
+(the same space KMeans was trained in) and kept as one contiguous float32
+matrix.  A query is a single NumPy distance pass + argpartition, so ranking
+a profile against the whole catalog is a matrix op instead of a pandas
+filter + random sample.
+
+   idx  = RankingIndex.from_frame(df, scaler)
+   rows = idx.top_k({"danceability":…, "energy":…, …}, k=20)   # row positions
+   rows = idx.top_k_diverse(profile, k=20, lam=0.7, groups=artist_codes)  # MMR
+
+With an IVF index attached (idx.ivf, see ivf_index) unrestricted euclidean
+queries probe idx.nprobe inverted lists instead of scanning every row;
+nprobe=0 switches back to exact search.  With idx.shards (see sharded) the
+exact scan is split across worker processes.
+"""
+from __future__ import annotations
+import numpy as np
+
+PROFILE_COLS = ["danceability","energy","valence","acousticness","tempo"]
+METRICS      = {"euclidean","cosine"}
+
+# ─── helpers ─────────────────────────────────────────────────────────────────
+def _ordered_top_k(dist:np.ndarray, k:int) -> np.ndarray:
+    """Positions of the k smallest values, closest first, ties by position."""
+    n = dist.shape[-1]
+    if k <= 0 or n == 0:
+        return np.empty(dist.shape[:-1]+(0,), dtype=np.intp)
+    k = min(k, n)
+    part = (np.argpartition(dist, k-1, axis=-1)[..., :k] if k < n
+            else np.broadcast_to(np.arange(n), dist.shape).copy())
+    vals = np.take_along_axis(dist, part, axis=-1)
+    # lexsort on (position, distance) → deterministic order for equal distances
+    order = np.lexsort((part, vals), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+def mmr_select(X:np.ndarray, rel:np.ndarray, k:int, lam:float=0.7,
+               groups:np.ndarray|None=None, max_per_group:int=0) -> np.ndarray:
+    """
+    Greedy maximal-marginal-relevance pick of k positions from candidates X.
+    score = lam·rel + (1-lam)·(distance to the closest already-picked item);
+    one vectorised distance update per pick → O(len(X)·k).  With groups
+    (e.g. artist codes) at most max_per_group picks share a group, unless
+    there are not enough candidates left to fill k.
+    """
+    C = len(X); k = min(k, C)
+    if k <= 0: return np.empty(0, dtype=np.intp)
+    X = np.asarray(X, dtype=np.float32)
+    min_d  = np.full(C, np.inf, dtype=np.float32)
+    alive  = np.ones(C, dtype=bool)
+    capped = np.zeros(C, dtype=bool)
+    counts: dict[int,int] = {}
+    picked: list[int] = []
+    for _ in range(k):
+        div   = np.where(np.isfinite(min_d), min_d, 0)      # first pick: relevance only
+        score = lam * rel + (1 - lam) * div
+        score[~alive | capped] = -np.inf
+        i = int(np.argmax(score))
+        if not np.isfinite(score[i]):
+            break
+        picked.append(i); alive[i] = False
+        np.minimum(min_d, np.sqrt(((X - X[i])**2).sum(axis=1)), out=min_d)
+        if groups is not None and max_per_group:
+            g = int(groups[i]); counts[g] = counts.get(g, 0) + 1
+            if counts[g] >= max_per_group:
+                capped |= groups == g
+    if len(picked) < k:                                   # groups ran dry → by relevance
+        rest = np.flatnonzero(alive)
+        picked += rest[np.argsort(-rel[rest], kind="stable")][:k-len(picked)].tolist()
+    return np.asarray(picked, dtype=np.intp)
+
+# ─── index ───────────────────────────────────────────────────────────────────
+class RankingIndex:
+    """
+    Scaler-normalised float32 feature matrix + optional per-cluster sub-indexes.
+    All results are row positions into the frame the index was built from.
+    """
+    def __init__(self, matrix:np.ndarray, mean:np.ndarray, scale:np.ndarray,
+                 clusters:np.ndarray|None=None):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.mean   = np.asarray(mean,  dtype=np.float64)
+        self.scale  = np.asarray(scale, dtype=np.float64)
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.ivf    = None                # IVFIndex over self.matrix, if attached
+        self.nprobe: int|None = None      # None → IVF_NPROBE, 0 → exact
+        self.shards = None                # ShardedScorer over self.matrix, if attached
+
+        # rows grouped by cluster (stable, so ascending within one) + each
+        # cluster's slice of it; sub-matrices are gathered per query, so the
+        # only full-size arrays are matrix and sq_norms
+        self.cluster_order = np.empty(0, dtype=np.int32)
+        self._clusters: dict[int, tuple[int,int]] = {}
+        if clusters is not None:
+            clusters = np.asarray(clusters)
+            self.cluster_order = np.argsort(clusters, kind="stable").astype(np.int32)
+            ids, starts = np.unique(clusters[self.cluster_order], return_index=True)
+            ends = np.append(starts[1:], len(clusters))
+            self._clusters = {int(c): (int(a), int(b)) for c, a, b in zip(ids, starts, ends)}
+
+    @classmethod
+    def from_frame(cls, frame, scaler, cluster_col:str|None="mood_cluster"):
+        """frame: DataFrame or Catalog (anything indexable by column name)."""
+        raw = np.column_stack([np.asarray(frame[c], dtype=np.float64) for c in PROFILE_COLS])
+        mean, scale = scaler.mean_, scaler.scale_
+        matrix = (raw - mean) / scale
+        clusters = (np.asarray(frame[cluster_col])
+                    if cluster_col and cluster_col in frame else None)
+        return cls(matrix, mean, scale, clusters)
+
+    def __len__(self): return self.matrix.shape[0]
+
+    @property
+    def clusters(self) -> list[int]: return sorted(self._clusters)
+
+    def cluster_rows(self, cluster:int) -> np.ndarray:
+        """Row positions of one mood_cluster (empty if unknown)."""
+        a, b = self._clusters.get(int(cluster), (0, 0))
+        return self.cluster_order[a:b].astype(np.intp)
+
+    # ─── query side ──────────────────────────────────────────────────────────
+    def transform(self, profiles) -> np.ndarray:
+        """dict | list[dict] | (m,5) array in raw catalog units → (m,5) float32."""
+        if isinstance(profiles, dict):
+            profiles = [profiles]
+        if isinstance(profiles, (list, tuple)) and profiles and isinstance(profiles[0], dict):
+            profiles = [[float(p[c]) for c in PROFILE_COLS] for p in profiles]
+        q = np.atleast_2d(np.asarray(profiles, dtype=np.float64))
+        return ((q - self.mean) / self.scale).astype(np.float32)
+
+    def distances(self, q:np.ndarray, metric:str="euclidean",
+                  cluster:int|None=None) -> tuple[np.ndarray,np.ndarray|None]:
+        """(m,n) distances from normalised queries; also returns the row map."""
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {sorted(METRICS)}")
+        rows = None
+        if cluster is not None:
+            rows = self.cluster_rows(cluster)
+            mat, sq = self.matrix[rows], self.sq_norms[rows]
+        else:
+            mat, sq = self.matrix, self.sq_norms
+
+        if metric == "cosine":
+            qn = np.linalg.norm(q, axis=1, keepdims=True)
+            norms = np.sqrt(sq)
+            return 1.0 - ((q / np.where(qn > 0, qn, 1)) @ mat.T) / np.where(norms > 0, norms, 1), rows
+        # squared euclidean is enough for ranking: ‖x‖² − 2x·q (+‖q‖² constant)
+        return sq[None, :] - 2.0 * (q @ mat.T), rows
+
+    def top_k(self, profile, k:int=20, metric:str="euclidean",
+              cluster:int|None=None, exclude=None) -> np.ndarray:
+        """Row positions of the k tracks closest to one profile, closest first."""
+        return self.top_k_batch(profile, k, metric, cluster, exclude)[0]
+
+    def top_k_diverse(self, profile, k:int=20, lam:float=0.7, pool:int|None=None,
+                      metric:str="euclidean", cluster:int|None=None, exclude=None,
+                      groups:np.ndarray|None=None, max_per_group:int=2) -> np.ndarray:
+        """
+        top_k over a pool of the `pool` nearest candidates, re-ranked by MMR so
+        one batch isn't k near-duplicates / one artist.  lam=1 → plain top_k.
+        """
+        if lam >= 1:
+            return self.top_k(profile, k, metric, cluster, exclude)
+        cand = self.top_k(profile, pool or max(10*k, 200), metric, cluster, exclude)
+        if len(cand) <= 1:
+            return cand
+        X = self.matrix[cand]
+        q = self.transform(profile)[0]
+        rel = -np.sqrt(((X - q)**2).sum(axis=1))
+        pick = mmr_select(X, rel, k, lam,
+                          None if groups is None else np.asarray(groups)[cand], max_per_group)
+        return cand[pick]
+
+    def top_k_scaled(self, q:np.ndarray, k:int=20, metric:str="euclidean",
+                     excludes:list|None=None) -> np.ndarray:
+        """
+        (m,k) rows for m already-normalised queries; excludes[i] holds the
+        rows to skip for query i (per-user dislikes in batch jobs).
+        """
+        dist, _ = self.distances(np.asarray(q, dtype=np.float32), metric)
+        if excludes:
+            ri = np.concatenate([np.full(len(e), i, np.intp) for i, e in enumerate(excludes)])
+            ci = np.concatenate([np.asarray(e, np.intp) for e in excludes])
+            dist[ri, ci] = np.inf
+        return _ordered_top_k(dist, k)
+
+    def top_k_batch(self, profiles, k:int=20, metric:str="euclidean",
+                    cluster:int|None=None, exclude=None) -> np.ndarray:
+        """(m,k) row positions for m profiles in one pass."""
+        q = self.transform(profiles)
+        if self.ivf is not None and self.nprobe != 0 and metric == "euclidean" and cluster is None:
+            excl = None if exclude is None else np.asarray(exclude, dtype=np.intp)
+            return self.ivf.search(q, k, self.nprobe, excl, exact=self.matrix)
+        if self.shards is not None and metric == "euclidean" and cluster is None:
+            return self.shards.top_k(q, k, exclude)
+        dist, rows = self.distances(q, metric, cluster)
+        if exclude is not None and len(exclude):
+            excl = np.asarray(exclude, dtype=np.intp)
+            if rows is not None:
+                excl = np.flatnonzero(np.isin(rows, excl))
+            dist[:, excl] = np.inf
+            k = min(k, dist.shape[1] - len(np.unique(excl)))
+        top = _ordered_top_k(dist, k)
+        return top if rows is None else rows[top]
@@ -0,0 +1,176 @@
+# fennec_ai_dj/local_ml/sharded.py
+"""
+Sharded catalog scoring on a pool of persistent worker processes.
+
+• the ranking matrix (+ squared norms, cluster row order) and the filter
+  engine's numeric columns are copied once per artifacts bundle into one
+  multiprocessing.shared_memory segment; ranker / filters are re-pointed at
+  it (they hold no other full-size copy: per-cluster sub-matrices and
+  cosine norms are derived per query), so a server process and its shard
+  workers share one copy.  Every uvicorn worker is its own server process
+  with its own segment and pool
+• SHARD_WORKERS processes (spawned once per server process) attach the
+  segment by name on first use and keep it mapped; shard i is the i-th
+  contiguous row range
+• a query ships only its small arguments (profile vectors, k, predicates);
+  every shard returns its own top-k / matching rows, merged here
+• used for exact profile top-k, unindexed filter masks and the relaxation
+  pass, from SHARD_MIN_ROWS catalog rows up (below, the IPC costs more
+  than it saves)
+
+   attach_shards(ranker, filters)      # load_artifacts does this
+   ranker.top_k(profile, 20)           # → ranker.shards.top_k(...)
+   filters.select_relaxed(cf)          # → filters.shards.select_relaxed(...)
+"""
+from __future__ import annotations
+import os, weakref, threading
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+from fennec_ai_dj.local_ml.ranking import _ordered_top_k
+from fennec_ai_dj.local_ml.filter_engine import numeric_mask, relax_levels, RELAX_STEPS
+
+SHARD_WORKERS  = int(os.getenv("SHARD_WORKERS", "0"))            # 0 = off
+SHARD_MIN_ROWS = int(os.getenv("SHARD_MIN_ROWS", "1000000"))
+
+class _Segment(SharedMemory):
+    """SharedMemory whose mapping may outlive it: numpy views keep it alive."""
+    def __del__(self):
+        try:
+            self.close()
+        except (OSError, BufferError):              # views still exported
+            pass
+
+def _views(seg:SharedMemory, layout:dict) -> dict[str,np.ndarray]:
+    out = {}
+    for key, (off, shape, dtype) in layout.items():
+        a = np.ndarray(shape, dtype=dtype, buffer=seg.buf, offset=off)
+        a.flags.writeable = False
+        out[key] = a
+    return out
+
+# ─── worker side ─────────────────────────────────────────────────────────────
+_ATTACHED: OrderedDict[str,tuple[_Segment,dict]] = OrderedDict()
+
+def _arrays(name:str, layout:dict) -> dict[str,np.ndarray]:
+    """Segment `name` mapped into this worker (once; the last two are kept)."""
+    hit = _ATTACHED.get(name)
+    if hit is None:
+        seg = _Segment(name=name)
+        hit = _ATTACHED[name] = (seg, _views(seg, layout))
+        while len(_ATTACHED) > 2:                   # older bundles: unmapped once unused
+            _ATTACHED.popitem(last=False)
+    return hit[1]
+
+def _cols(a:dict) -> dict[str,np.ndarray]:
+    return {k[4:]: v for k, v in a.items() if k.startswith("col:")}
+
+def _top_k(name, layout, lo, hi, q, k, exclude):
+    a = _arrays(name, layout)
+    d = a["sq_norms"][None, lo:hi] - 2.0 * (q @ a["matrix"][lo:hi].T)
+    if len(exclude):
+        d[:, exclude - lo] = np.inf
+    top = _ordered_top_k(d, min(k, hi - lo - len(exclude)))
+    return top + lo, np.take_along_axis(d, top, axis=1)
+
+def _mask(name, layout, lo, hi, preds):
+    return np.flatnonzero(numeric_mask(_cols(_arrays(name, layout)), preds, lo, hi)) + lo
+
+def _relaxed(name, layout, lo, hi, preds, steps):
+    level = relax_levels(_cols(_arrays(name, layout)), preds, steps, lo, hi)
+    best  = int(level.min()) if len(level) else len(steps)
+    return best, (np.flatnonzero(level == best) + lo if best < len(steps)
+                  else np.empty(0, dtype=np.intp))
+
+# ─── pool ────────────────────────────────────────────────────────────────────
+_pool: ProcessPoolExecutor|None = None
+_pool_lock = threading.Lock()
+
+def _executor(workers:int, reset:bool=False) -> ProcessPoolExecutor:
+    """One pool per server process; spawn, so workers don't inherit the app's threads."""
+    global _pool
+    with _pool_lock:
+        if reset and _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+        return _pool
+
+# ─── parent side ─────────────────────────────────────────────────────────────
+class ShardedScorer:
+    def __init__(self, arrays:dict[str,np.ndarray], workers:int=SHARD_WORKERS):
+        self.layout, off = {}, 0
+        for key, a in arrays.items():
+            off = -(-off // 64) * 64                   # cache-line aligned
+            self.layout[key] = (off, a.shape, a.dtype.str)
+            off += a.nbytes
+        self.seg = _Segment(create=True, size=max(off, 1))
+        for key, v in _views(self.seg, self.layout).items():
+            v.flags.writeable = True
+            v[...] = arrays[key]
+            v.flags.writeable = False
+        self.views   = _views(self.seg, self.layout)
+        self.name    = self.seg.name
+        self.n       = len(next(iter(arrays.values())))
+        self.workers = max(1, workers)
+        self.bounds  = np.linspace(0, self.n, self.workers + 1).astype(np.int64)
+        weakref.finalize(self, self.seg.unlink)         # name goes with the bundle
+
+    def __len__(self): return self.n
+
+    def nbytes(self) -> int: return self.seg.size
+
+    def _map(self, fn, per_shard) -> list:
+        """fn(name, layout, lo, hi, *per_shard(lo, hi)) on every shard; results in shard order."""
+        shards = list(zip(self.bounds[:-1].tolist(), self.bounds[1:].tolist()))
+        for attempt in (0, 1):
+            pool = _executor(self.workers, reset=attempt == 1)
+            try:
+                futs = [pool.submit(fn, self.name, self.layout, lo, hi, *per_shard(lo, hi))
+                        for lo, hi in shards]
+                return [f.result() for f in futs]
+            except BrokenProcessPool:
+                if attempt: raise
+                print("⚠️ shard pool broken, restarting")
+
+    # ─── ranking ─────────────────────────────────────────────────────────────
+    def top_k(self, q:np.ndarray, k:int, exclude=None) -> np.ndarray:
+        """(m,k) rows nearest to m normalised queries (squared euclidean), exact."""
+        q = np.ascontiguousarray(q, dtype=np.float32)
+        excl = (np.unique(np.asarray(exclude, dtype=np.int64)) if exclude is not None
+                else np.empty(0, dtype=np.int64))
+        parts = self._map(_top_k, lambda lo, hi: (
+            q, k, excl[(excl >= lo) & (excl < hi)]))
+        rows = np.concatenate([r for r, _ in parts], axis=1)
+        dist = np.concatenate([d for _, d in parts], axis=1)
+        order = np.lexsort((rows, dist), axis=-1)[:, :k]  # ties by row, as exact search
+        return np.take_along_axis(rows, order, axis=1).astype(np.intp)
+
+    # ─── filters ─────────────────────────────────────────────────────────────
+    def mask(self, preds) -> np.ndarray:
+        """Ascending rows passing every (col, op, val) predicate."""
+        return np.concatenate(self._map(_mask, lambda lo, hi: (preds,)))
+
+    def select_relaxed(self, preds, steps=RELAX_STEPS) -> tuple[float|None,np.ndarray]:
+        parts = self._map(_relaxed, lambda lo, hi: (preds, steps))
+        best = min(b for b, _ in parts)
+        if best >= len(steps):
+            return None, np.empty(0, dtype=np.intp)
+        return steps[best], np.concatenate([r for b, r in parts if b == best])
+
+def attach_shards(ranker, filters, workers:int=SHARD_WORKERS) -> ShardedScorer:
+    """Move ranker / filter arrays into one shared segment and route their scans to it."""
+    arrays = {"matrix":ranker.matrix, "sq_norms":ranker.sq_norms,
+              "cluster_order":ranker.cluster_order}
+    arrays |= {"col:" + c: a for c, a in filters.cols.items()}
+    sc = ShardedScorer(arrays, workers)
+    ranker.matrix, ranker.sq_norms = sc.views["matrix"], sc.views["sq_norms"]
+    ranker.cluster_order = sc.views["cluster_order"]
+    filters.cols = {c: sc.views["col:" + c] for c in filters.cols}
+    ranker.shards = filters.shards = sc
+    return sc
@@ -0,0 +1,143 @@
+# fennec_ai_dj/local_ml/text_index.py
+"""
+Inverted index over artist + track names for genre / keyword matching.
+
+Each row's artist and name are normalised (NFKD, accents stripped,
+lower-cased, whitespace collapsed) and split into character trigrams.
+Posting lists are stored CSR-style (sorted keys → offsets into one int32
+array).
+
+   lookup("hip hop")
+      → intersect posting lists of "hip","ip ","p h"," ho","hop"
+      → verify the substring on the (few) surviving rows
+      → sorted row positions
+
+Matching semantics equal the old `str.contains(re.escape(term), re.I)` on
+artists | name, except that accents are folded ("beyonce" hits "Beyoncé").
+The index is persisted as a directory of .npy files next to
+kmeans_model.pkl, published like the catalog (versioned directory behind
+an atomic symlink, catalog_store.publish_dir), opened memory-mapped, and
+rebuilt when the catalog fingerprint changes.
+"""
+from __future__ import annotations
+import os, re, json, shutil, tempfile, unicodedata
+import numpy as np
+
+from fennec_ai_dj.local_ml.catalog_store import StringTable, publish_dir, open_pinned
+
+N      = 3
+FORMAT = 1
+_WS    = re.compile(r"[\s\x00]+")
+
+def normalize(text) -> str:
+    if not isinstance(text, str): return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WS.sub(" ", text.lower()).strip()
+
+def _grams(text:str) -> set[str]:
+    return {text[i:i+N] for i in range(len(text)-N+1)}
+
+# ─── index ───────────────────────────────────────────────────────────────────
+class TextIndex:
+    def __init__(self, docs, keys:np.ndarray, offsets:np.ndarray,
+                 postings:np.ndarray, fp:str=""):
+        self.docs     = docs             # per row: "artists\x00name" normalised
+        self.keys     = keys             # sorted trigram keys (U3)
+        self.offsets  = offsets          # len(keys)+1
+        self.postings = postings         # int32 row positions, sorted per key
+        self.fingerprint = fp
+
+    def __len__(self): return len(self.docs)
+
+    @classmethod
+    def build(cls, artists, names, fp:str="") -> "TextIndex":
+        docs = [normalize(a) + "\x00" + normalize(n) for a, n in zip(artists, names)]
+        post: dict[str,list[int]] = {}
+        for row, doc in enumerate(docs):
+            a, n = doc.split("\x00")
+            for g in _grams(a) | _grams(n):
+                post.setdefault(g, []).append(row)
+        keys    = sorted(post)
+        lens    = np.fromiter((len(post[k]) for k in keys), dtype=np.int64, count=len(keys))
+        offsets = np.zeros(len(keys)+1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        postings = np.fromiter((r for k in keys for r in post[k]),
+                               dtype=np.int32, count=int(offsets[-1]))
+        return cls(docs, np.array(keys, dtype=f"U{N}"), offsets, postings, fp)
+
+    # ─── persistence ─────────────────────────────────────────────────────────
+    def save(self, path:str):
+        parent = os.path.dirname(os.path.abspath(path))
+        tmp = tempfile.mkdtemp(prefix=".text-index-", dir=parent)
+        try:
+            np.save(os.path.join(tmp, "keys.npy"), self.keys)
+            np.save(os.path.join(tmp, "offsets.npy"), self.offsets)
+            np.save(os.path.join(tmp, "postings.npy"), self.postings)
+            StringTable.write(self.docs, os.path.join(tmp, "docs"))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"format":FORMAT, "fingerprint":self.fingerprint,
+                           "rows":len(self.docs)}, f)
+            publish_dir(tmp, path)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path:str) -> "TextIndex":
+        return open_pinned(path, cls._load)
+
+    @classmethod
+    def _load(cls, path:str) -> "TextIndex":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"text index format {meta.get('format')} != {FORMAT}")
+        m = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        return cls(StringTable.open(os.path.join(path, "docs")),
+                   m("keys.npy"), m("offsets.npy"), m("postings.npy"), meta["fingerprint"])
+
+    @classmethod
+    def load_or_build(cls, path:str, fp:str, artists, names) -> "TextIndex":
+        """
+        Reuse the persisted index when it matches the catalog fingerprint,
+        else rebuild from artists/names (only iterated on rebuild).
+        """
+        if os.path.exists(path):
+            try:
+                idx = cls.load(path)
+                if idx.fingerprint == fp:
+                    return idx
+            except Exception as e:
+                print("⚠️ text index unreadable, rebuilding:", e)
+        idx = cls.build(artists, names, fp)
+        try:
+            idx.save(path)
+        except OSError as e:
+            print("⚠️ could not persist text index:", e)
+        return idx
+
+    # ─── lookup ──────────────────────────────────────────────────────────────
+    def posting(self, gram:str) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, gram))
+        if i >= len(self.keys) or self.keys[i] != gram:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i+1]]
+
+    def _verify(self, rows, term:str) -> np.ndarray:
+        docs = self.docs
+        return np.fromiter((r for r in rows if term in docs[int(r)]), dtype=np.int32)
+
+    def lookup(self, term:str) -> np.ndarray:
+        """Sorted row positions whose artists or name contain `term`."""
+        term = normalize(term)
+        if not term:
+            return np.arange(len(self.docs), dtype=np.int32)
+        if len(term) < N:                      # too short for a trigram
+            return self._verify(range(len(self.docs)), term)
+        lists = sorted((self.posting(g) for g in _grams(term)), key=len)
+        rows = lists[0]
+        for p in lists[1:]:
+            if not len(rows): break
+            rows = np.intersect1d(rows, p, assume_unique=True)
+        return rows if len(term) == N else self._verify(rows, term)
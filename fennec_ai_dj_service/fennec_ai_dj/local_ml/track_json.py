@@ -0,0 +1,188 @@
+# fennec_ai_dj/local_ml/track_json.py
+"""
+Pre-serialised response JSON, one fragment per catalog track.
+
+Every row's response object
+
+   {"id":…,"name":…,"artists":[{"name":…}],
+    "album":{"name":…,"images":[{"url":…}]},"uri":"spotify:track:…"}
+
+is rendered once per catalog build into a utf-8 blob + offsets (persisted
+next to the catalog, opened memory-mapped, so workers share it).  A
+response body is then b"[" + b",".join(fragments of the chosen rows) + b"]";
+only tracks that _enrich patched are re-rendered.  needs_meta (album
+"Unknown" or no image) is precomputed per row as well.
+
+   tj   = TrackJSON.load_or_build(path, catalog)
+   recs = tj.tracks(rows)            # Tracks: .json() → bytes, iterates as dicts
+"""
+from __future__ import annotations
+import os, json, shutil, tempfile
+import numpy as np
+
+from fennec_ai_dj.local_ml.catalog_store import StringTable
+
+try:
+    import orjson
+    dumps, loads = orjson.dumps, orjson.loads
+except ImportError:                                   # plain json, same bytes out
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",",":")).encode("utf-8")
+    loads = json.loads
+
+FORMAT = 1
+
+def track_obj(tid:str, name:str, artist:str, album:str|None, image:str|None) -> dict:
+    """The one response shape for a track (catalog rows and Spotify search hits)."""
+    return {"id":tid, "name":name, "artists":[{"name":artist}],
+            "album":{"name":album or "Unknown", "images":[{"url":image or ""}]},
+            "uri":f"spotify:track:{tid}"}
+
+def _patched(obj:dict, meta:dict) -> dict:
+    if meta.get("album_name"): obj["album"]["name"] = meta["album_name"]
+    if meta.get("image_url"):  obj["album"]["images"][0]["url"] = meta["image_url"]
+    return obj
+
+def _key(catalog) -> str:
+    """Catalog identity + the enrichable columns' files (rewritten by update_columns)."""
+    parts = [catalog.fingerprint]
+    for c in ("album","image_url"):
+        try:
+            st = os.stat(os.path.join(catalog.path, c + ".utf8"))
+            parts.append(f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append("-")
+    return "/".join(parts)
+
+# ─── fragments ───────────────────────────────────────────────────────────────
+class TrackJSON:
+    def __init__(self, catalog, table:StringTable, needs_meta:np.ndarray, key:str=""):
+        self.catalog    = catalog
+        self.table      = table            # row → serialised track object
+        self.needs_meta = needs_meta       # bool per row
+        self.key        = key
+
+    def __len__(self): return len(self.table)
+
+    @classmethod
+    def build(cls, catalog, path:str) -> "TrackJSON":
+        n = len(catalog)
+        albums = catalog["album"] if "album" in catalog else [""]*n
+        images = catalog["image_url"] if "image_url" in catalog else [""]*n
+        frags, need = [], np.zeros(n, dtype=bool)
+        for row, (tid, name, artist, album, image) in enumerate(zip(
+                catalog.ids_at(np.arange(n)), catalog["name"], catalog["artists"], albums, images)):
+            frags.append(dumps(track_obj(tid, name, artist, album, image)).decode("utf-8"))
+            need[row] = not album or album == "Unknown" or not image
+        parent = os.path.dirname(os.path.abspath(path))
+        tmp = tempfile.mkdtemp(prefix=".track-json-", dir=parent)
+        try:
+            StringTable.write(frags, os.path.join(tmp, "tracks"))
+            np.save(os.path.join(tmp, "needs_meta.npy"), need)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"format":FORMAT, "key":_key(catalog), "rows":n}, f)
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp, path)
+            except OSError as e:                    # another worker published at the same time
+                print("⚠️ could not publish track json, using the copy that won:", e)
+                return cls._winner(path, tmp, catalog)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return cls.load(path, catalog)
+
+    @classmethod
+    def _winner(cls, path:str, tmp:str, catalog) -> "TrackJSON":
+        """The published copy if it matches, else our own (mapped before tmp is removed)."""
+        try:
+            tj = cls.load(path, catalog)
+            if tj.key == _key(catalog):
+                return tj
+        except Exception:
+            pass
+        return cls.load(tmp, catalog)
+
+    @classmethod
+    def load(cls, path:str, catalog) -> "TrackJSON":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"track json format {meta.get('format')} != {FORMAT}")
+        return cls(catalog, StringTable.open(os.path.join(path, "tracks")),
+                   np.load(os.path.join(path, "needs_meta.npy"), mmap_mode="r"), meta["key"])
+
+    @classmethod
+    def load_or_build(cls, path:str, catalog) -> "TrackJSON":
+        if os.path.exists(path):
+            try:
+                tj = cls.load(path, catalog)
+                if tj.key == _key(catalog):
+                    return tj
+            except Exception as e:
+                print("⚠️ track json unreadable, rebuilding:", e)
+        return cls.build(catalog, path)
+
+    # ─── render ──────────────────────────────────────────────────────────────
+    def fragment(self, row:int, meta:dict|None=None) -> bytes:
+        o = self.table.offsets
+        raw = self.table.blob[o[row]:o[row+1]].tobytes()
+        return raw if meta is None else dumps(_patched(loads(raw), meta))
+
+    def render(self, rows, patches:dict[int,dict]|None=None) -> bytes:
+        """JSON array of the given rows, in order; patches: row → album/image meta."""
+        patches = patches or {}
+        return b"[" + b",".join(self.fragment(r, patches.get(r)) for r in rows) + b"]"
+
+    def tracks(self, rows) -> "Tracks":
+        return Tracks(self, np.asarray(rows, dtype=np.intp))
+
+# ─── result ──────────────────────────────────────────────────────────────────
+class Tracks:
+    """
+    Ranked rows on their way out.  .json() splices fragments; iterating
+    yields dicts (decoded once, on demand) for code that wants objects.
+    """
+    __slots__ = ("tj","rows","patches","_dicts")
+
+    def __init__(self, tj:TrackJSON, rows:np.ndarray, patches:dict[int,dict]|None=None):
+        self.tj, self.rows = tj, rows
+        self.patches = patches if patches is not None else {}
+        self._dicts: list[dict]|None = None
+
+    def __len__(self): return len(self.rows)
+
+    def _objs(self) -> list[dict]:
+        if self._dicts is None:
+            self._dicts = loads(self.json())
+        return self._dicts
+
+    def __iter__(self):        return iter(self._objs())
+    def __getitem__(self, i):  return self._objs()[i]
+
+    @property
+    def ids(self) -> list[str]:
+        return self.tj.catalog.ids_at(self.rows)
+
+    def json(self) -> bytes:
+        return self.tj.render(self.rows.tolist(), self.patches)
+
+    def fragments(self):
+        for r in self.rows.tolist():
+            yield self.tj.fragment(r, self.patches.get(r))
+
+    def needs_meta(self) -> list[str]:
+        """Ids whose album/image still need Spotify (patched ones excluded)."""
+        rows = self.rows[np.asarray(self.tj.needs_meta)[self.rows]]
+        return self.tj.catalog.ids_at([r for r in rows.tolist() if r not in self.patches])
+
+    def patch(self, meta_by_id:dict[str,dict]):
+        if not meta_by_id: return self
+        for r, tid in zip(self.rows.tolist(), self.ids):
+            meta = meta_by_id.get(tid)
+            if meta: self.patches[r] = meta
+        self._dicts = None
+        return self
+
+    def without(self, rows) -> "Tracks":
+        keep = ~np.isin(self.rows, rows)
+        return self if keep.all() else Tracks(self.tj, self.rows[keep], self.patches)
@@ -0,0 +1,230 @@
+# fennec_ai_dj/local_ml/train_clusters.py
+"""
+Offline retraining of the mood clusters (scaler + KMeans + mood_cluster).
+
+   python -m fennec_ai_dj.local_ml.train_clusters train [--k 5] [--epochs 5] [--publish]
+   python -m fennec_ai_dj.local_ml.train_clusters publish VERSION
+   python -m fennec_ai_dj.local_ml.train_clusters list
+
+train    streams the catalog store in --chunk-rows slices (mmap, so RSS stays
+         at one chunk whatever the catalog size):
+           1. StandardScaler.partial_fit over every chunk (exact mean/std)
+           2. MiniBatchKMeans: k-means++ on a random row sample, then
+              partial_fit over shuffled --batch-row minibatches for up to
+              --epochs passes, stopping early once the centres settle
+           3. clusters are named from their centroids' valence/energy
+           4. an IVF index seeded from the new centroids, built in two
+              chunked passes as well (IVFIndex.build_to; --no-ivf skips it,
+              --ivf-pq M product-quantises it)
+         → models/<version>/{scaler.pkl, kmeans_model.pkl, moods.json, meta.json, ivf/}
+publish  predicts mood_cluster for every row (chunked), writes it into the
+         catalog store (copy-on-write) and then points models/CURRENT at the
+         version.  A later catalog rebuild re-predicts with CURRENT
+         (catalog_store._merge_model_labels), so the CSV's labels never return.  Running servers pick it up via /admin/artifacts/reload or
+         ARTIFACT_WATCH_SECS.
+
+KMeans / predict use OpenMP threads; set OMP_NUM_THREADS to cap them.
+"""
+from __future__ import annotations
+import os, sys, json, time, hashlib, argparse
+import numpy as np, joblib
+
+from fennec_ai_dj.local_ml.catalog_store import (open_catalog, update_columns,
+                                                 CATALOG_DIR, DATA_PATH, MODELS_DIR)
+from fennec_ai_dj.local_ml.ranking import PROFILE_COLS
+from fennec_ai_dj.local_ml.ivf_index import IVFIndex, index_key, default_nlist, sample_size
+
+CHUNK_ROWS = 1_000_000
+BATCH_ROWS = 8192
+SAMPLE     = 200_000
+
+# (valence, energy) in scaler units; each cluster is named after the closest
+MOOD_PROTOTYPES = {
+    "happy":     ( 1.0,  0.5),
+    "energetic": ( 0.2,  1.2),
+    "dark":      (-1.0,  0.5),
+    "sad":       (-1.0, -1.0),
+    "calm":      ( 0.3, -0.8),
+}
+
+# ─── naming ──────────────────────────────────────────────────────────────────
+def name_clusters(centers:np.ndarray, cols:list[str]=PROFILE_COLS) -> dict[str,list[int]]:
+    """
+    mood → cluster ids, from centroids in scaler units.  Moods and clusters
+    are matched one-to-one first (min total distance); spare clusters join
+    their nearest mood, spare moods borrow their nearest cluster.
+    """
+    from scipy.optimize import linear_sum_assignment
+    moods = list(MOOD_PROTOTYPES)
+    proto = np.array([MOOD_PROTOTYPES[m] for m in moods])
+    cent  = np.asarray(centers)[:, [cols.index("valence"), cols.index("energy")]]
+    cost  = np.linalg.norm(proto[:, None, :] - cent[None, :, :], axis=2)   # (moods, k)
+    out   = {m: [] for m in moods}
+    mi, ci = linear_sum_assignment(cost)
+    for m, c in zip(mi, ci):
+        out[moods[m]].append(int(c))
+    for c in set(range(len(cent))) - set(ci.tolist()):
+        out[moods[int(cost[:, c].argmin())]].append(c)
+    for m in set(range(len(moods))) - set(mi.tolist()):
+        out[moods[m]].append(int(cost[m].argmin()))
+    return {m: sorted(v) for m, v in out.items()}
+
+# ─── streaming ───────────────────────────────────────────────────────────────
+def _slice(catalog, a:int, b:int) -> np.ndarray:
+    """Raw (b-a, 5) float64 features of rows a:b, read from the mmap'd columns."""
+    return np.column_stack([np.asarray(catalog[c][a:b], dtype=np.float64) for c in PROFILE_COLS])
+
+def _chunks(catalog, chunk_rows:int):
+    for a in range(0, len(catalog), chunk_rows):
+        yield a, _slice(catalog, a, min(a + chunk_rows, len(catalog)))
+
+def _finite(X:np.ndarray) -> np.ndarray:
+    return X[np.isfinite(X).all(axis=1)]
+
+def fit_scaler(catalog, chunk_rows:int=CHUNK_ROWS):
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler()
+    for _, X in _chunks(catalog, chunk_rows):
+        X = _finite(X)
+        if len(X): scaler.partial_fit(X)
+    return scaler
+
+def _sample(catalog, scaler, n:int, rng) -> np.ndarray:
+    rows = np.sort(rng.choice(len(catalog), min(n, len(catalog)), replace=False))
+    X = np.column_stack([np.asarray(catalog[c])[rows] for c in PROFILE_COLS]).astype(np.float64)
+    return scaler.transform(_finite(X))
+
+def fit_kmeans(catalog, scaler, k:int=5, epochs:int=5, chunk_rows:int=CHUNK_ROWS,
+               batch_rows:int=BATCH_ROWS, seed:int=0, tol:float=1e-3):
+    from sklearn.cluster import MiniBatchKMeans
+    rng = np.random.default_rng(seed)
+    km  = MiniBatchKMeans(n_clusters=k, batch_size=batch_rows, n_init=3,
+                          random_state=seed, init="k-means++")
+    km.partial_fit(_sample(catalog, scaler, SAMPLE, rng))       # k-means++ on a spread sample
+    starts = np.arange(0, len(catalog), chunk_rows)
+    epoch = 0
+    for epoch in range(1, epochs + 1):
+        before = km.cluster_centers_.copy()
+        for a in rng.permutation(starts):
+            X = scaler.transform(_finite(_slice(catalog, a, min(a + chunk_rows, len(catalog)))))
+            X = X[rng.permutation(len(X))]
+            for i in range(0, len(X), batch_rows):
+                km.partial_fit(X[i:i+batch_rows])
+        shift = float(np.abs(km.cluster_centers_ - before).max())
+        print(f"   epoch {epoch}: max centre shift {shift:.5f}")
+        if shift < tol: break
+    return km, epoch
+
+def predict_clusters(catalog, scaler, kmeans, chunk_rows:int=CHUNK_ROWS) -> np.ndarray:
+    """mood_cluster per row (int32, -1 where a feature is missing); catalog or DataFrame."""
+    out = np.full(len(catalog), -1, dtype=np.int32)
+    for a, X in _chunks(catalog, chunk_rows):
+        ok = np.isfinite(X).all(axis=1)
+        if ok.any():
+            out[a:a+len(X)][ok] = kmeans.predict(scaler.transform(X[ok]))
+    return out
+
+# ─── versions ────────────────────────────────────────────────────────────────
+def current_version(models_dir:str=MODELS_DIR) -> str|None:
+    try:
+        with open(os.path.join(models_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def load_model(version:str, models_dir:str=MODELS_DIR) -> tuple:
+    """(scaler, kmeans) of models/<version>."""
+    d = os.path.join(models_dir, version)
+    return (joblib.load(os.path.join(d, "scaler.pkl")),
+            joblib.load(os.path.join(d, "kmeans_model.pkl")))
+
+def train(k:int=5, epochs:int=5, chunk_rows:int=CHUNK_ROWS, batch_rows:int=BATCH_ROWS,
+          seed:int=0, csv_path:str=DATA_PATH, catalog_dir:str=CATALOG_DIR,
+          models_dir:str=MODELS_DIR, ivf:bool=True, ivf_pq:int=0) -> str:
+    """Fit scaler + MiniBatchKMeans, write models/<version>/; returns the version."""
+    catalog = open_catalog(csv_path, catalog_dir, models_dir)
+    t0 = time.perf_counter()
+    scaler = fit_scaler(catalog, chunk_rows)
+    km, ran = fit_kmeans(catalog, scaler, k, epochs, chunk_rows, batch_rows, seed)
+    moods  = name_clusters(km.cluster_centers_)
+
+    digest  = hashlib.blake2b(km.cluster_centers_.tobytes() + scaler.mean_.tobytes(),
+                              digest_size=4).hexdigest()
+    version = time.strftime("%Y%m%d-%H%M%S") + "-" + digest
+    out = os.path.join(models_dir, version)
+    tmp = out + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    joblib.dump(scaler, os.path.join(tmp, "scaler.pkl"))
+    joblib.dump(km,     os.path.join(tmp, "kmeans_model.pkl"))
+    centroids = scaler.inverse_transform(km.cluster_centers_)
+    with open(os.path.join(tmp, "moods.json"), "w") as f:
+        json.dump({"moods":moods,
+                   "centroids":{str(i): dict(zip(PROFILE_COLS, map(float, c)))
+                                for i, c in enumerate(centroids)}}, f, indent=2)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"version":version, "k":k, "epochs":ran, "rows":len(catalog),
+                   "catalog_fingerprint":catalog.fingerprint, "features":PROFILE_COLS,
+                   "seconds":round(time.perf_counter() - t0, 1),
+                   "created_at":time.time()}, f, indent=2)
+    if ivf:                                       # streamed too: two chunked passes
+        nlist  = default_nlist(len(catalog))
+        sample = _sample(catalog, scaler, sample_size(nlist), np.random.default_rng(seed))
+        chunks = lambda: ((a, scaler.transform(X).astype(np.float32))
+                          for a, X in _chunks(catalog, chunk_rows))
+        IVFIndex.build_to(os.path.join(tmp, "ivf"), chunks, len(catalog), sample,
+                          km.cluster_centers_, nlist, pq=ivf_pq, seed=seed,
+                          key=index_key(catalog.fingerprint, version))
+    os.replace(tmp, out)
+    return version
+
+def publish(version:str, csv_path:str=DATA_PATH, catalog_dir:str=CATALOG_DIR,
+            models_dir:str=MODELS_DIR):
+    """mood_cluster → catalog store, then CURRENT → version (in that order)."""
+    scaler, km = load_model(version, models_dir)
+    catalog = open_catalog(csv_path, catalog_dir, models_dir)
+    update_columns(catalog_dir, {"mood_cluster": predict_clusters(catalog, scaler, km)})
+    tmp = os.path.join(models_dir, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(models_dir, "CURRENT"))
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="train_clusters", description=__doc__.split("\n")[1])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train")
+    t.add_argument("--k",          type=int, default=5)
+    t.add_argument("--epochs",     type=int, default=5)
+    t.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    t.add_argument("--batch",      type=int, default=BATCH_ROWS)
+    t.add_argument("--seed",       type=int, default=0)
+    t.add_argument("--publish",    action="store_true")
+    t.add_argument("--no-ivf",     action="store_true")
+    t.add_argument("--ivf-pq",     type=int, default=0)
+    p = sub.add_parser("publish")
+    p.add_argument("version")
+    sub.add_parser("list")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        cur = current_version()
+        for v in sorted(os.listdir(MODELS_DIR)) if os.path.isdir(MODELS_DIR) else []:
+            meta = os.path.join(MODELS_DIR, v, "meta.json")
+            if os.path.exists(meta):
+                with open(meta) as f: m = json.load(f)
+                print(f"{'*' if v == cur else ' '} {v}  k={m['k']}  rows={m['rows']}")
+        return 0
+    if args.cmd == "train":
+        version = train(args.k, args.epochs, args.chunk_rows, args.batch, args.seed,
+                        ivf=not args.no_ivf, ivf_pq=args.ivf_pq)
+        with open(os.path.join(MODELS_DIR, version, "moods.json")) as f:
+            print(f"✅ trained {version}: {json.load(f)['moods']}")
+        if not args.publish: return 0
+    else:
+        version = args.version
+    publish(version)
+    print(f"✅ published {version} (mood_cluster rewritten, CURRENT updated)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,31 +3,58 @@
 Fennec AI DJ back‑end
 2025‑04‑22 • integrate top‑track seeds (weight +2) without deleting anything
 """
-from fastapi.responses import RedirectResponse
-from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import RedirectResponse, StreamingResponse, Response
+from fastapi import FastAPI, HTTPException, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Optional 
-import logging
+import asyncio, json, logging, os, secrets
+import numpy as np
 
 from fennec_ai_dj.spotify_api import (
     get_spotify_auth_url, get_access_token, get_current_spotify_user_id,
-    get_user_saved_track_ids, get_user_recent_track_ids,
-    get_user_top_track_ids,                     # NEW
-    get_tracks_metadata 
+    get_user_saved_track_ids_async, get_user_recent_track_ids_async,
+    get_user_top_track_ids_async,               # NEW
+    get_tracks_metadata_async, iter_tracks_metadata_async, meta_cache, feature_store
 )
+from fennec_ai_dj.spotify_client import spotify
+from fennec_ai_dj.feature_store import catalog_units
+from fennec_ai_dj.user_cache import seed_cache
+from fennec_ai_dj.profile_store import ProfileStore, ProfileState
 from fennec_ai_dj.local_ml.local_song_recommender import (
     get_recommendations_from_local_model, recommend_by_user_profile,
-    recommend_by_filters, df as local_df,
+    recommend_by_filters, recommend_by_rows, catalog, registry,
 )
 from fennec_ai_dj.user_feedback_store import (
     store_feedback, get_liked_songs, get_disliked_songs
 )
-from fennec_ai_dj.gpt_command_interpreter import interpret_command
+from fennec_ai_dj.gpt_command_interpreter import interpret_command_async, interpreter_stats
+from fennec_ai_dj.session_queue import SessionQueues
+from fennec_ai_dj.daily_mix import DailyMixStore
+from fennec_ai_dj.local_ml.track_json import Tracks
+from fennec_ai_dj.recently_served import RecentlyServed
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    registry.watch()                # ARTIFACT_WATCH_SECS > 0 → reload on file change
+    yield
+    await spotify.aclose()          # drain pooled Spotify connections
+
+app = FastAPI(lifespan=lifespan)
 logger = logging.getLogger("uvicorn.error")
 
+class PinArtifacts:
+    """Each request (incl. a streamed body) sees one catalog/model version."""
+    def __init__(self, app): self.app=app
+    async def __call__(self, scope, receive, send):
+        if scope["type"]!="http":
+            return await self.app(scope, receive, send)
+        with registry.pin():
+            await self.app(scope, receive, send)
+
+app.add_middleware(PinArtifacts)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
@@ -50,37 +77,102 @@ WEIGHTS = {
 }
 
 # ─── Helpers ────────────────────────────────────────────────────────────────
-def _weighted_profile(df):
-    if df.empty or df["w"].sum()==0: return None
-    return {c:(df[c]*df["w"]).sum()/df["w"].sum() for c in AUDIO_COLS}
+# track ids are interned to int32 catalog codes at the edge (catalog.encode);
+# profiles, seeds and exclusion sets work on codes, strings only go out in recs.
+# Seeds the catalog doesn't have stay Spotify id strings in the profile.
+profiles=ProfileStore(dim=len(AUDIO_COLS), codec=catalog)   # running sums, time-decayed
+FEATURE_WAIT=float(os.getenv("FEATURE_WAIT_SECS","0.8"))   # cold start: wait this long for backfill
+
+def _codes(ids) -> np.ndarray:
+    """Spotify ids → int32 codes, unknown ids dropped."""
+    c=catalog.encode(ids)
+    return c[c>=0]
+
+def _split(ids) -> tuple[np.ndarray,list[str]]:
+    """Spotify ids → (int32 codes, ids outside the catalog)."""
+    c=catalog.encode(ids)
+    return c[c>=0], [t for t,k in zip(ids,c.tolist()) if k<0]
+
+def _keys(ids) -> list[int|str]:
+    """Profile keys: the catalog code, or the Spotify id itself if not in the catalog."""
+    return [k if k>=0 else t for k,t in zip(catalog.encode(ids).tolist(), ids)]
+
+def _features(keys:list[int|str]) -> dict:
+    """key → AUDIO_COLS vector in catalog units: row gather for codes, feature_store for ids."""
+    codes=[k for k in keys if not isinstance(k,str)]
+    rows=np.asarray(codes,dtype=np.intp)
+    X=np.column_stack([np.asarray(catalog[c])[rows] for c in AUDIO_COLS]).astype(np.float64)
+    out=dict(zip(codes, X))
+    found=feature_store.get_many([k for k in keys if isinstance(k,str)])[0]
+    out.update((t,catalog_units(x)) for t,x in found.items())   # raw 0-1 → catalog 1e-3
+    return out
+
+async def _backfill(user_id:str, items:list, state:ProfileState|None, access_token:str|None):
+    """
+    Fetch features for seeds outside the catalog (once ever, see feature_store).
+    With no catalog seed to build a profile from, wait up to FEATURE_WAIT for
+    them; otherwise fetch in the background and let the next observe() fold
+    them in.
+    """
+    ids=[k for k,_,_ in items if isinstance(k,str)]
+    if state: ids+=[k for k in state.unmatched() if isinstance(k,str)]
+    if not ids or not access_token: return
+    if (state and state.matched) or any(not isinstance(k,str) for k,_,_ in items):
+        feature_store.prefetch(ids, access_token)
+        return
+    try:
+        await asyncio.wait_for(feature_store.backfill(ids, access_token), FEATURE_WAIT)
+    except asyncio.TimeoutError:
+        logger.info("feature backfill for %s still running after %.1fs", user_id, FEATURE_WAIT)
 
+def _profile_dict(state:ProfileState|None):
+    vec=state.vector() if state else None
+    return None if vec is None else dict(zip(AUDIO_COLS, map(float,vec)))
 
-def _drop_bad(lst,bad): return [t for t in lst if t["id"] not in bad]
-def _strip_disliked(recs, bad_ids):
-    return [t for t in recs if t["id"] not in bad_ids]
 
+def _strip_disliked(recs:Tracks, bad_rows) -> Tracks:
+    return recs.without(bad_rows)
 
-# ★ helper to patch missing album/image
-def _enrich(recs:list[dict], access_token:str|None):
+# ★ patch missing album/image: only the patched fragments get re-rendered
+async def _enrich(recs:Tracks, access_token:str|None) -> Tracks:
     if not access_token: 
         return recs
+    # needs_meta is precomputed per catalog row
+    return recs.patch(await get_tracks_metadata_async(recs.needs_meta(), access_token))  # 50-id batches, concurrent
 
-    # gather IDs that need enrichment
-    need=[t["id"] for t in recs
-          if t["album"]["name"]=="Unknown" or not t["album"]["images"][0]["url"]]
-    meta_map=get_tracks_metadata(need[:50], access_token)   # one call
-
-    for t in recs:
-        meta=meta_map.get(t["id"])
-        if not meta: 
-            continue
-        if meta.get("album_name"):
-            t["album"]["name"]=meta["album_name"]
-        if meta.get("image_url"):
-            t["album"]["images"][0]["url"]=meta["image_url"]
-    return recs
+def _json(key:str, recs:Tracks) -> Response:
+    """{"<key>": [...]} spliced from per-track fragments, no re-serialisation."""
+    return Response(b'{"'+key.encode()+b'":'+recs.json()+b"}", media_type="application/json")
+
+# ─── streaming: ranked tracks first, album/image patches as they resolve ───
+def _event(fmt:str, event:str, data:dict) -> str:
+    body=json.dumps(data, ensure_ascii=False)
+    if fmt=="sse":
+        return f"event: {event}\ndata: {body}\n\n"
+    return json.dumps({"event":event, **data}, ensure_ascii=False)+"\n"
+
+def _track_event(fmt:str, rank:int, frag:bytes) -> bytes:
+    body=b'{"rank":%d,"track":%s}' % (rank, frag)
+    if fmt=="sse":
+        return b"event: track\ndata: "+body+b"\n\n"
+    return b'{"event":"track",'+body[1:]+b"\n"
 
+async def _stream_events(recs:Tracks, access_token:str|None, fmt:str):
+    for rank,frag in enumerate(recs.fragments()):
+        yield _track_event(fmt,rank,frag)
+    need=recs.needs_meta() if access_token else []
+    if need:
+        async for metas in iter_tracks_metadata_async(need, access_token):
+            for tid,meta in metas.items():
+                yield _event(fmt,"patch",{"id":tid,
+                                          "album_name":meta.get("album_name"),
+                                          "image_url":meta.get("image_url")})
+    yield _event(fmt,"done",{"count":len(recs)})
 
+def _stream(recs:Tracks, access_token:str|None, fmt:str) -> StreamingResponse:
+    media="text/event-stream" if fmt=="sse" else "application/x-ndjson"
+    return StreamingResponse(_stream_events(recs, access_token, fmt), media_type=media,
+                             headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"})
 
 # ─── Auth endpoints (unchanged) ─────────────────────────────────────────────
 @app.get("/login")
@@ -100,55 +192,175 @@ def feedback(fb:Feedback):
     if fb.feedback not in {"like","dislike"}:
         raise HTTPException(400,"feedback must be like|dislike")
     store_feedback(fb.user_id, fb.track_id, fb.feedback)
+    profiles.observe(fb.user_id, [(_keys([fb.track_id])[0], WEIGHTS[fb.feedback], fb.feedback)],
+                     _features, create=False, force=True)
+    if fb.feedback=="dislike":
+        queues.drop(fb.user_id, fb.track_id)
     return {"msg":"ok"}
 
 # ─── recommendation endpoint (adds enrich) ──────────────────────────────────
+_SEED_SOURCES={
+    "saved":  (get_user_saved_track_ids_async,  25),
+    "recent": (get_user_recent_track_ids_async, 25),
+    "top":    (get_user_top_track_ids_async,    20),
+}
+
+async def _seed_ids(user_id:str, access_token:str) -> tuple[list,list]:
+    """
+    saved + recent and top profile keys (codes, then ids outside the catalog).
+    Fresh sources come from seed_cache; the expired ones are fetched
+    concurrently. Failures → empty (not cached).
+    """
+    tag=catalog.fingerprint
+    ids={src:seed_cache.get_seeds(user_id,src,tag) for src in _SEED_SOURCES}
+    stale=[src for src,v in ids.items() if v is None]
+    res=await asyncio.gather(
+        *(fn(access_token,n) for fn,n in (_SEED_SOURCES[s] for s in stale)),
+        return_exceptions=True)
+    for src,r in zip(stale,res):
+        if isinstance(r,Exception):
+            logger.warning("%s: %s",src,r); ids[src]=(_codes([]),())
+        else:
+            codes,extra=ids[src]=_split(r); seed_cache.put_seeds(user_id,src,codes,tag,extra)
+    def keys(*srcs):
+        return list(dict.fromkeys(k for s in srcs for k in ids[s][0].tolist()+list(ids[s][1])))
+    return keys("saved","recent"), keys("top")
+
+daily_mixes=DailyMixStore()
+served=RecentlyServed()                       # per-user ring of recently served rows
+MMR_LAMBDA=float(os.getenv("MMR_LAMBDA","0.7"))   # 1 → pure closeness
+
+def _served(user_id:str, recs:Tracks) -> Tracks:
+    served.add(user_id, recs.rows, catalog.fingerprint)
+    return recs
+
+async def _recommend(user_id:str, access_token:str|None, count:int=20,
+                     exclude:list[str]|None=None, enrich:bool=True,
+                     use_mix:bool=False) -> Tracks:
+    """
+    Precomputed daily mix if asked for and fresh (feedback only, see
+    daily_mix), else seeds → stored profile (new ids only) →
+    ranked tracks → enrich, minus dislikes.
+    """
+    bad=_codes(get_disliked_songs(user_id))
+    skip=np.unique(np.concatenate([bad, _codes(exclude or []), served.rows(user_id, catalog.fingerprint)]))
+
+    mix=daily_mixes.get(user_id) if use_mix else None
+    if mix:
+        rows=_codes(mix["track_ids"])
+        rows=rows[~np.isin(rows,skip)][:count]
+        if len(rows)==count:
+            recs=_served(user_id, recommend_by_rows(rows))
+            return await _enrich(recs, access_token) if enrich else recs
+
+    saved_recent,top=(await _seed_ids(user_id, access_token) if access_token
+                      else ([],[]))
+
+    # only seed keys the stored profile hasn't seen yet cost anything
+    items=([(t,WEIGHTS["spotify"],"spotify") for t in saved_recent]+
+           [(t,WEIGHTS["top"],"top") for t in top])
+    state=await asyncio.to_thread(profiles.get, user_id)     # SQLite: off the event loop
+    if state is None:                             # first time: fold in past feedback
+        items+=([(t,WEIGHTS["like"],"like") for t in _keys(get_liked_songs(user_id))]+
+                [(t,WEIGHTS["dislike"],"dislike") for t in _keys(get_disliked_songs(user_id))])
+    await _backfill(user_id, items, state, access_token)
+    if items or state:
+        state=await asyncio.to_thread(profiles.observe, user_id, items, _features)
+    if state is None or not state.ids:
+        recs=_served(user_id, get_recommendations_from_local_model(count,skip))
+        if enrich: recs=await _enrich(recs,access_token)
+        return _strip_disliked(recs,bad)
+
+    prof=_profile_dict(state)
+    recs=(recommend_by_user_profile(prof,count,skip_rows=skip,lam=MMR_LAMBDA)
+          if prof else get_recommendations_from_local_model(count,skip))
+    _served(user_id, recs)
+    if enrich: recs=await _enrich(recs, access_token)
+    return _strip_disliked(recs,bad)
+
 @app.get("/recommendations")
-def recommendations(access_token:str=Query(...),user_id:str=Query(...)):
-    dislikes=set(get_disliked_songs(user_id))
-    likes=set(get_liked_songs(user_id))
+async def recommendations(access_token:str=Query(...),user_id:str=Query(...),
+                          mix:bool=False):
+    return _json("recommendations", await _recommend(user_id, access_token, use_mix=mix))
 
-    saved_recent=[]; top=[]
-    try:
-        saved_recent=list(dict.fromkeys(
-            get_user_saved_track_ids(access_token,25)+
-            get_user_recent_track_ids(access_token,25)
-        ))
-    except Exception as e: logger.warning("saved/recent: %s",e)
-    try:
-        top=get_user_top_track_ids(access_token,20)
-    except Exception as e: logger.warning("top-tracks: %s",e)
-
-    id2w=({tid:WEIGHTS["spotify"] for tid in saved_recent}|
-          {tid:WEIGHTS["top"]     for tid in top}|
-          {tid:WEIGHTS["like"]    for tid in likes}|
-          {tid:WEIGHTS["dislike"] for tid in dislikes})
-    if not id2w:
-        recs=_enrich(get_recommendations_from_local_model(),access_token)
-        return {"recommendations":_strip_disliked(recs,dislikes)}
-
-    subset=local_df[local_df["id"].isin(id2w)].copy()
-    subset["w"]=subset["id"].map(id2w).fillna(0)
-    prof=_weighted_profile(subset)
-    recs=(recommend_by_user_profile(prof) if prof
-          else get_recommendations_from_local_model())
-    recs=_enrich(recs, access_token)
-    return {"recommendations":_strip_disliked(recs,dislikes)}
+@app.get("/recommendations/stream")
+async def recommendations_stream(access_token:str=Query(...),user_id:str=Query(...),
+                                 format:str=Query("ndjson",pattern="^(ndjson|sse)$")):
+    """Same ranking, streamed: track events now, patch events per metadata batch."""
+    recs=await _recommend(user_id, access_token, enrich=False)
+    return _stream(recs, access_token, format)
+
+# ─── session queue: one ranked batch, served track by track ─────────────────
+queues=SessionQueues(_recommend)
+
+@app.get("/queue/next")
+async def queue_next(access_token:str=Query(...),user_id:str=Query(...),
+                     session_id:str="default"):
+    track=await queues.next(user_id, access_token, session_id)
+    return {"track":track}
+
+@app.get("/queue/peek")
+async def queue_peek(access_token:str=Query(...),user_id:str=Query(...),
+                     n:int=Query(5,ge=1,le=50),session_id:str="default"):
+    return {"tracks":await queues.peek(user_id, access_token, n, session_id)}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"seed_cache":seed_cache.stats(), "meta_cache":meta_cache.stats(),
+            "profiles":profiles.stats(), "served":served.stats(),
+            "audio_features":feature_store.stats(),
+            "queues":queues.stats(), "interpreter":interpreter_stats()}
+
+# ─── admin: catalog / model artifacts ───────────────────────────────────────
+# ADMIN_TOKEN=<secret>  → /admin/* need the header  X-Admin-Token: <secret>
+# unset                 → /admin/* only answer loopback clients (127.0.0.1 / ::1);
+#                         behind a local reverse proxy every client looks like
+#                         loopback, so set ADMIN_TOKEN there
+ADMIN_TOKEN=os.getenv("ADMIN_TOKEN")
+_LOOPBACK={"127.0.0.1","::1","localhost"}
+
+def _admin(request:Request, token:str|None):
+    if ADMIN_TOKEN:
+        if not secrets.compare_digest(token or "", ADMIN_TOKEN):
+            raise HTTPException(403,"admin token required")
+    elif not request.client or request.client.host not in _LOOPBACK:
+        raise HTTPException(403,"admin endpoints are loopback-only without ADMIN_TOKEN")
+
+@app.get("/admin/artifacts")
+def artifacts_status(request:Request, x_admin_token:str|None=Header(None)):
+    _admin(request, x_admin_token)
+    return registry.status()
+
+@app.post("/admin/artifacts/reload")
+def artifacts_reload(request:Request, force:bool=False, x_admin_token:str|None=Header(None)):
+    """Rebuild off the request path; the swap happens when the new version is ready."""
+    _admin(request, x_admin_token)
+    return {"started":registry.reload(force), **registry.status()}
 
 # fennec_ai_dj/main.py   (only /command endpoint changed)
 
 # … all imports & earlier code unchanged …
 
-@app.post("/command")
-def command(cmd:Command):
-    obj=interpret_command(cmd.message)
+async def _command_recs(cmd:Command, enrich:bool) -> dict:
+    obj=await interpret_command_async(cmd.message)
     logger.info("🧠 interpreted: %s", obj)          # log to server
     if obj.get("intent")=="control":
         return obj
     if obj.get("intent")=="recommend":
-        bad=set(get_disliked_songs(cmd.user_id))
+        bad=_codes(get_disliked_songs(cmd.user_id))
         recs=recommend_by_filters(obj.get("filters",[]), obj.get("limit",20))
-        recs=_enrich(recs, cmd.access_token)
+        if enrich: recs=await _enrich(recs, cmd.access_token)
         return {"recommendations":_strip_disliked(recs,bad)}
     raise HTTPException(400,"unknown intent")
 
+@app.post("/command")
+async def command(cmd:Command):
+    res=await _command_recs(cmd, enrich=True)
+    return _json("recommendations", res["recommendations"]) if "recommendations" in res else res
+
+@app.post("/command/stream")
+async def command_stream(cmd:Command, format:str=Query("ndjson",pattern="^(ndjson|sse)$")):
+    res=await _command_recs(cmd, enrich=False)
+    if "recommendations" not in res:
+        return res                                 # control intents are tiny
+    return _stream(res["recommendations"], cmd.access_token, format)
@@ -0,0 +1,130 @@
+# fennec_ai_dj/metadata_cache.py
+"""
+Track-metadata cache used by spotify_api.get_tracks_metadata / _enrich.
+
+   memory  : bounded LRU (size + age eviction)
+   disk    : optional SQLite table (WAL) – survives restarts, shared by workers
+   negative: ids Spotify answered `null` for are remembered (shorter TTL)
+             so they are not re-requested on every response
+
+   hits, missing = meta_cache.get_many(ids)       # hits: id → meta
+   meta_cache.put_many({id: meta, ...}, missing=[ids Spotify returned null])
+"""
+from __future__ import annotations
+import os, time, sqlite3
+from collections import OrderedDict
+from threading import Lock
+
+DEFAULT_DB   = os.path.join(os.path.dirname(__file__), "track_meta.db")
+DB_PATH      = os.getenv("SPOTIFY_META_DB", DEFAULT_DB)     # "" → memory only
+MAX_ITEMS    = int(os.getenv("SPOTIFY_META_MAX_ITEMS", "50000"))
+MAX_AGE      = float(os.getenv("SPOTIFY_META_MAX_AGE", str(7*24*3600)))
+NEGATIVE_TTL = float(os.getenv("SPOTIFY_META_NEGATIVE_TTL", str(6*3600)))
+
+_MISSING = object()   # marker for negative entries
+
+class MetadataCache:
+    def __init__(self, db_path:str|None=DB_PATH, max_items:int=MAX_ITEMS,
+                 max_age:float=MAX_AGE, negative_ttl:float=NEGATIVE_TTL,
+                 clock=time.time):
+        self.max_items, self.max_age = max_items, max_age
+        self.negative_ttl, self.clock = negative_ttl, clock
+        self._mem: OrderedDict[str,tuple[object,float]] = OrderedDict()
+        self._lock = Lock()
+        self._db: sqlite3.Connection|None = None
+        self.counters = {"memory_hits":0, "disk_hits":0, "negative_hits":0, "misses":0}
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute("""CREATE TABLE IF NOT EXISTS track_meta(
+                    id TEXT PRIMARY KEY, album_name TEXT, image_url TEXT,
+                    missing INTEGER NOT NULL DEFAULT 0, fetched_at REAL NOT NULL)""")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print("⚠️ metadata cache: disk store disabled:", e)
+                self._db = None
+
+    def _fresh(self, value, ts:float, now:float) -> bool:
+        ttl = self.negative_ttl if value is _MISSING else self.max_age
+        return now - ts < ttl
+
+    def _remember(self, tid:str, value, ts:float):
+        self._mem[tid] = (value, ts)
+        self._mem.move_to_end(tid)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    # ─── read ────────────────────────────────────────────────────────────────
+    def get_many(self, ids:list[str]) -> tuple[dict[str,dict], list[str]]:
+        """
+        (id → meta for cached ids, ids that still need a Spotify call).
+        Negatively cached ids appear in neither.
+        """
+        now, out, cold = self.clock(), {}, []
+        with self._lock:
+            for tid in dict.fromkeys(ids):
+                hit = self._mem.get(tid)
+                if hit and self._fresh(hit[0], hit[1], now):
+                    self._mem.move_to_end(tid)
+                    if hit[0] is _MISSING: self.counters["negative_hits"] += 1
+                    else:
+                        out[tid] = hit[0]; self.counters["memory_hits"] += 1
+                else:
+                    cold.append(tid)
+            if cold and self._db is not None:
+                cold = self._load(cold, now, out)
+            self.counters["misses"] += len(cold)
+        return out, cold
+
+    def _load(self, ids:list[str], now:float, out:dict) -> list[str]:
+        found = {}
+        for i in range(0, len(ids), 500):          # SQLite variable limit
+            chunk = ids[i:i+500]
+            q = ("SELECT id, album_name, image_url, missing, fetched_at FROM track_meta "
+                 f"WHERE id IN ({','.join('?'*len(chunk))})")
+            try:
+                for tid, album, image, missing, ts in self._db.execute(q, chunk):
+                    found[tid] = (_MISSING if missing else
+                                  {"album_name":album, "image_url":image}, ts)
+            except sqlite3.Error as e:
+                print("⚠️ metadata cache read failed:", e)
+                break
+        cold = []
+        for tid in ids:
+            hit = found.get(tid)
+            if hit and self._fresh(hit[0], hit[1], now):
+                self._remember(tid, *hit)
+                if hit[0] is _MISSING: self.counters["negative_hits"] += 1
+                else:
+                    out[tid] = hit[0]; self.counters["disk_hits"] += 1
+            else:
+                cold.append(tid)
+        return cold
+
+    # ─── write ───────────────────────────────────────────────────────────────
+    def put_many(self, metas:dict[str,dict], missing=()):
+        now = self.clock()
+        rows = [(tid, m.get("album_name"), m.get("image_url"), 0, now) for tid, m in metas.items()]
+        rows += [(tid, None, None, 1, now) for tid in missing if tid not in metas]
+        with self._lock:
+            for tid, m in metas.items():
+                self._remember(tid, m, now)
+            for tid in missing:
+                if tid not in metas:
+                    self._remember(tid, _MISSING, now)
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO track_meta VALUES (?,?,?,?,?)", rows)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print("⚠️ metadata cache write failed:", e)
+
+    def __len__(self): return len(self._mem)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, memory_items=len(self._mem),
+                        disk=self._db is not None)
@@ -0,0 +1,244 @@
+# fennec_ai_dj/profile_store.py
+"""
+Persistent, incrementally updated taste profile per user.
+
+• state = running sums Σw·x and Σw over AUDIO_COLS, plus id → (weight,
+  time, source rank) so a like can replace the "recently played" weight
+  the same track had before
+• exponential time decay (PROFILE_HALF_LIFE_DAYS, 0 = off): both sums are
+  scaled by 2^(-Δt/half-life) before every update, so newer seeds and
+  feedback dominate; the ratio Σw·x/Σw is the profile vector
+• each update touches one id → O(1); a request only pays for seed ids it
+  has not seen before
+• memory LRU in front of SQLite (WAL): one aggregate row per user plus one
+  row per contributing id, so a write is two upserts, not a rewrite
+• with codec=catalog, ids in memory are int32 catalog codes; the Spotify id
+  strings only appear in the SQLite rows.  Codes don't survive a rebuild, so
+  a cached state whose codec fingerprint differs is reloaded from disk
+• ids outside the catalog stay plain strings.  One seen before its
+  features were known is kept unmatched and folded in (with the decay it
+  would have had) by the first observe() that finds them
+
+   state = profiles.observe(uid, [(code, weight, "top"), …], features)
+   vec   = state.vector()        # (5,) in raw catalog units, or None
+
+get/observe hit SQLite: from async code run them in a thread
+(asyncio.to_thread), the store's lock makes that safe.
+"""
+from __future__ import annotations
+import os, time, sqlite3
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+DEFAULT_DB = os.path.join(os.path.dirname(__file__), "user_profiles.db")
+DB_PATH    = os.getenv("PROFILE_DB", DEFAULT_DB)            # "" → memory only
+HALF_LIFE  = float(os.getenv("PROFILE_HALF_LIFE_DAYS", "30")) * 86400
+MAX_USERS  = int(os.getenv("PROFILE_CACHE_MAX_USERS", "10000"))
+
+# later sources override earlier ones for the same id (like the old id2w union)
+RANKS = {"spotify":0, "top":1, "like":2, "dislike":2}
+
+# ─── state ───────────────────────────────────────────────────────────────────
+class ProfileState:
+    __slots__ = ("num","den","t_ref","ids","matched","tag")
+
+    def __init__(self, dim:int, t_ref:float, tag:str|None=None):
+        self.num     = np.zeros(dim, dtype=np.float64)
+        self.den     = 0.0
+        self.t_ref   = t_ref
+        self.ids: dict[int|str,tuple[float,float,int,np.ndarray|None]] = {}
+        self.matched = 0                      # ids that had features
+        self.tag     = tag                    # codec fingerprint the keys belong to
+
+    def _decay_to(self, t:float, half_life:float):
+        if half_life and t > self.t_ref:
+            f = 0.5 ** ((t - self.t_ref) / half_life)
+            self.num *= f; self.den *= f
+        self.t_ref = max(self.t_ref, t)
+
+    def set(self, track_id:int|str, weight:float, x:np.ndarray|None, rank:int,
+            t:float, half_life:float, force:bool=False) -> bool:
+        """Apply one id; False if a higher-ranked source already set it."""
+        old = self.ids.get(track_id)
+        if old is not None and not force and old[2] >= rank:
+            return False
+        self._decay_to(t, half_life)
+        if old is not None and old[3] is not None:        # take back what it added
+            ow, ot, _, ox = old
+            f = 0.5 ** ((self.t_ref - ot) / half_life) if half_life else 1.0
+            self.num -= ow * f * ox; self.den -= ow * f
+            self.matched -= 1
+        if x is not None:
+            self.num += weight * x; self.den += weight
+            self.matched += 1
+        self.ids[track_id] = (weight, self.t_ref, rank, x)
+        return True
+
+    def fill(self, track_id:int|str, x:np.ndarray, half_life:float) -> bool:
+        """Features arrived for an id stored without them: add its decayed share."""
+        w, t, rank, old = self.ids[track_id]
+        if old is not None: return False
+        f = 0.5 ** ((self.t_ref - t) / half_life) if half_life else 1.0
+        self.num += w * f * x; self.den += w * f
+        self.matched += 1
+        self.ids[track_id] = (w, t, rank, x)
+        return True
+
+    def unmatched(self) -> list[int|str]:
+        return [tid for tid, v in self.ids.items() if v[3] is None]
+
+    def vector(self) -> np.ndarray|None:
+        """Σw·x/Σw; None unless positive weight dominates (else it points at the dislikes)."""
+        if not self.matched or self.den < 1e-9: return None
+        return self.num / self.den
+
+# ─── store ───────────────────────────────────────────────────────────────────
+class ProfileStore:
+    def __init__(self, db_path:str|None=DB_PATH, dim:int=5, half_life:float=HALF_LIFE,
+                 max_users:int=MAX_USERS, clock=time.time, codec=None):
+        self.dim, self.half_life = dim, half_life
+        self.max_users, self.clock = max_users, clock
+        self.codec = codec                    # .encode(ids) → codes, .decode(codes) → ids
+        self._mem: OrderedDict[str,ProfileState] = OrderedDict()
+        self._lock = Lock()
+        self._db: sqlite3.Connection|None = None
+        self.counters = {"memory_hits":0, "disk_loads":0, "created":0,
+                         "updates":0, "skipped":0, "filled":0}
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.executescript("""
+                    CREATE TABLE IF NOT EXISTS user_profile(
+                        user_id TEXT PRIMARY KEY, t_ref REAL NOT NULL,
+                        den REAL NOT NULL, num BLOB NOT NULL, matched INTEGER NOT NULL);
+                    CREATE TABLE IF NOT EXISTS profile_ids(
+                        user_id TEXT NOT NULL, track_id TEXT NOT NULL,
+                        weight REAL NOT NULL, t REAL NOT NULL, rank INTEGER NOT NULL,
+                        x BLOB, PRIMARY KEY (user_id, track_id));
+                """)
+                self._db.commit()
+            except sqlite3.Error as e:
+                print("⚠️ profile store: disk store disabled:", e)
+                self._db = None
+
+    # ─── persistence ─────────────────────────────────────────────────────────
+    def _load(self, user_id:str) -> ProfileState|None:
+        if self._db is None: return None
+        row = self._db.execute("SELECT t_ref, den, num, matched FROM user_profile "
+                               "WHERE user_id=?", (user_id,)).fetchone()
+        if row is None: return None
+        st = ProfileState(self.dim, row[0], self._tag())
+        st.den, st.num, st.matched = row[1], np.frombuffer(row[2], np.float64).copy(), row[3]
+        rows = self._db.execute("SELECT track_id, weight, t, rank, x FROM profile_ids "
+                                "WHERE user_id=?", (user_id,)).fetchall()
+        keys = ([r[0] for r in rows] if self.codec is None
+                else self.codec.encode([r[0] for r in rows]).tolist())
+        for key, (tid, w, t, rank, x) in zip(keys, rows):
+            st.ids[tid if key == -1 else key] = (w, t, rank,
+                                                 None if x is None else np.frombuffer(x, np.float64))
+        self.counters["disk_loads"] += 1
+        return st
+
+    def _save(self, user_id:str, st:ProfileState, changed:list[str]):
+        if self._db is None or not changed: return
+        names = self._names(changed)
+        try:
+            self._db.execute("INSERT OR REPLACE INTO user_profile VALUES (?,?,?,?,?)",
+                             (user_id, st.t_ref, st.den, st.num.tobytes(), st.matched))
+            self._db.executemany("INSERT OR REPLACE INTO profile_ids VALUES (?,?,?,?,?,?)",
+                [(user_id, name, *st.ids[tid][:3],
+                  None if st.ids[tid][3] is None else st.ids[tid][3].tobytes())
+                 for tid, name in zip(changed, names)])
+            self._db.commit()
+        except sqlite3.Error as e:
+            print("⚠️ profile store write failed:", e)
+
+    def _names(self, keys:list[int|str]) -> list[str]:
+        """Keys → Spotify ids (codes decoded, string keys as they are)."""
+        codes = [k for k in keys if not isinstance(k, str)]
+        if self.codec is None or not codes: return list(keys)
+        dec = iter(self.codec.decode(codes))
+        return [k if isinstance(k, str) else next(dec) for k in keys]
+
+    def _tag(self) -> str|None:
+        return None if self.codec is None else self.codec.fingerprint
+
+    def _remember(self, user_id:str, st:ProfileState):
+        self._mem[user_id] = st
+        self._mem.move_to_end(user_id)
+        while len(self._mem) > self.max_users:
+            self._mem.popitem(last=False)
+
+    # ─── API ─────────────────────────────────────────────────────────────────
+    def _get(self, user_id:str) -> ProfileState|None:
+        st = self._mem.get(user_id)
+        if st is not None and st.tag != self._tag():
+            st = None                                   # keys are codes of another catalog
+        if st is not None:
+            self._mem.move_to_end(user_id)
+            self.counters["memory_hits"] += 1
+            return st
+        st = self._load(user_id)
+        if st is not None:
+            self._remember(user_id, st)
+        return st
+
+    def get(self, user_id:str) -> ProfileState|None:
+        with self._lock:
+            return self._get(user_id)
+
+    def observe(self, user_id:str, items:list[tuple[int|str,float,str]], features,
+                create:bool=True, force:bool=False) -> ProfileState|None:
+        """
+        items: (code or track_id, weight, source).  features(ids) → {id: x | None}
+        is only called for ids that actually change the state, plus stored
+        ids that still have no features.
+        force=True lets feedback replace an earlier like/dislike.
+        """
+        now = self.clock()
+        with self._lock:
+            st = self._get(user_id)
+            if st is None:
+                if not create: return None
+                st = ProfileState(self.dim, now, self._tag())
+                self._remember(user_id, st)
+                self.counters["created"] += 1
+            todo = []
+            for tid, w, src in items:
+                old, rank = st.ids.get(tid), RANKS[src]
+                if old is not None and (old[2] > rank or
+                                        (old[2] == rank and (not force or old[0] == w))):
+                    continue
+                todo.append((tid, w, rank))
+            self.counters["skipped"] += len(items) - len(todo)
+            new   = [t for t, _, _ in todo]
+            seen  = set(new)
+            retry = [tid for tid in st.unmatched() if tid not in seen]
+            if not todo and not retry: return st
+        xs = features(list(dict.fromkeys(new + retry)))                   # outside the lock
+        with self._lock:
+            changed = [tid for tid in retry
+                       if xs.get(tid) is not None and st.fill(tid, xs[tid], self.half_life)]
+            self.counters["filled"] += len(changed)
+            updated = [tid for tid, w, rank in todo
+                       if st.set(tid, w, xs.get(tid), rank, now, self.half_life, force)]
+            self.counters["updates"] += len(updated)
+            changed += updated
+            self._save(user_id, st, changed)
+        return st
+
+    def invalidate(self, user_id:str):
+        with self._lock:
+            self._mem.pop(user_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM user_profile WHERE user_id=?", (user_id,))
+                self._db.execute("DELETE FROM profile_ids WHERE user_id=?", (user_id,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, memory_users=len(self._mem),
+                        disk=self._db is not None, half_life_days=self.half_life/86400)
@@ -0,0 +1,75 @@
+# fennec_ai_dj/recently_served.py
+"""
+Per-user "recently served" filter for repeat avoidance.
+
+Each user gets a fixed-size ring buffer of int32 catalog rows (4 bytes per
+remembered track, SERVED_CAPACITY per user), bounded by an LRU over users.
+rows(user) is handed to the ranker as its exclude set, so a track served
+in the last N picks is masked out of the distance pass.  Rows are only
+meaningful for one catalog build: pass its fingerprint as tag and a
+mismatching ring is treated as empty.
+
+   served.add(uid, rows, tag)     # np.ndarray of catalog row positions
+   skip = served.rows(uid, tag)   # int32 array, most recent last
+"""
+from __future__ import annotations
+import os
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+SERVED_CAPACITY = int(os.getenv("SERVED_CAPACITY", "300"))
+SERVED_MAX_USERS = int(os.getenv("SERVED_MAX_USERS", "20000"))
+
+class _Ring:
+    __slots__ = ("buf","pos","n","tag")
+    def __init__(self, capacity:int, tag:str|None=None):
+        self.buf = np.full(capacity, -1, dtype=np.int32)
+        self.pos = self.n = 0
+        self.tag = tag
+
+    def add(self, rows:np.ndarray):
+        cap  = len(self.buf)
+        rows = np.asarray(rows, dtype=np.int32)[-cap:]
+        idx  = (self.pos + np.arange(len(rows))) % cap
+        self.buf[idx] = rows
+        self.pos = (self.pos + len(rows)) % cap
+        self.n   = min(cap, self.n + len(rows))
+
+    def rows(self) -> np.ndarray:
+        if self.n < len(self.buf):
+            return self.buf[:self.n].copy()
+        return np.roll(self.buf, -self.pos)
+
+class RecentlyServed:
+    def __init__(self, capacity:int=SERVED_CAPACITY, max_users:int=SERVED_MAX_USERS):
+        self.capacity, self.max_users = capacity, max_users
+        self._users: OrderedDict[str,_Ring] = OrderedDict()
+        self._lock = Lock()
+
+    def add(self, user_id:str, rows, tag:str|None=None):
+        rows = np.asarray(rows)
+        rows = rows[rows >= 0]
+        if not len(rows): return
+        with self._lock:
+            r = self._users.get(user_id)
+            if r is None or r.tag != tag:
+                r = self._users[user_id] = _Ring(self.capacity, tag)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            r.add(rows)
+
+    def rows(self, user_id:str, tag:str|None=None) -> np.ndarray:
+        with self._lock:
+            r = self._users.get(user_id)
+            return r.rows() if r and r.tag == tag else np.empty(0, dtype=np.int32)
+
+    def clear(self, user_id:str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users":len(self._users), "capacity":self.capacity,
+                    "bytes":len(self._users)*self.capacity*4}
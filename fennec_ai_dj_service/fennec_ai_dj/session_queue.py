@@ -0,0 +1,129 @@
+# fennec_ai_dj/session_queue.py
+"""
+Per-session playback queue, so the player asks for one track at a time
+without re-running the whole recommendation pipeline per song.
+
+• a ranked batch (QUEUE_BATCH tracks) is computed once and served in order
+• when fewer than QUEUE_LOW_WATER tracks remain a refill runs in the
+  background; only one refill per session is ever in flight
+• already-served ids are passed to the refill so nothing repeats
+• drop(user, track) removes a disliked track from every session of that user
+
+   queues = SessionQueues(refill)          # refill(user, token, n, exclude) -> list[dict]
+   track  = await queues.next(user, token)
+   tracks = await queues.peek(user, token, n)
+"""
+from __future__ import annotations
+import os, time, asyncio, logging
+from collections import OrderedDict, deque
+from threading import Lock
+
+QUEUE_BATCH     = int(os.getenv("QUEUE_BATCH", "40"))
+QUEUE_LOW_WATER = int(os.getenv("QUEUE_LOW_WATER", "8"))
+QUEUE_TTL       = float(os.getenv("QUEUE_TTL", str(2*3600)))     # idle session expiry
+QUEUE_MAX       = int(os.getenv("QUEUE_MAX_SESSIONS", "5000"))
+SERVED_MAX      = 2000            # remembered ids per session
+
+logger = logging.getLogger("uvicorn.error")
+
+class _Session:
+    __slots__ = ("user_id","tracks","served","refill","touched","token")
+    def __init__(self, user_id:str):
+        self.user_id = user_id
+        self.tracks: deque[dict] = deque()
+        self.served: OrderedDict[str,None] = OrderedDict()
+        self.refill: asyncio.Task|None = None
+        self.touched = time.monotonic()
+        self.token: str|None = None
+
+class SessionQueues:
+    def __init__(self, refill, batch:int=QUEUE_BATCH, low_water:int=QUEUE_LOW_WATER,
+                 ttl:float=QUEUE_TTL, max_sessions:int=QUEUE_MAX):
+        self._refill_fn = refill
+        self.batch, self.low_water = batch, low_water
+        self.ttl, self.max_sessions = ttl, max_sessions
+        self._sessions: OrderedDict[tuple[str,str],_Session] = OrderedDict()
+        self._lock = Lock()             # /feedback drops from the threadpool
+        self.counters = {"served":0, "refills":0, "waits":0, "dropped":0}
+
+    def _session(self, user_id:str, session_id:str) -> _Session:
+        key, now = (user_id, session_id), time.monotonic()
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None or now - s.touched > self.ttl:
+                s = self._sessions[key] = _Session(user_id)
+            self._sessions.move_to_end(key)
+            s.touched = now
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return s
+
+    # ─── refill ──────────────────────────────────────────────────────────────
+    async def _do_refill(self, s:_Session):
+        try:
+            with self._lock:
+                exclude = list(s.served) + [t["id"] for t in s.tracks]
+            recs = await self._refill_fn(s.user_id, s.token, self.batch, exclude)
+            with self._lock:
+                have = set(exclude)
+                s.tracks.extend(t for t in recs if t["id"] not in have and t.get("uri"))
+            self.counters["refills"] += 1
+        except Exception as e:
+            logger.warning("queue refill failed for %s: %s", s.user_id, e)
+
+    def _ensure_refill(self, s:_Session) -> asyncio.Task|None:
+        if s.refill is None or s.refill.done():
+            if len(s.tracks) >= self.low_water:
+                return None
+            s.refill = asyncio.create_task(self._do_refill(s))
+        return s.refill
+
+    async def _ready(self, user_id:str, access_token:str|None, session_id:str,
+                     n:int) -> _Session:
+        s = self._session(user_id, session_id)
+        if access_token: s.token = access_token
+        task = self._ensure_refill(s)
+        if len(s.tracks) < n and task is not None:
+            self.counters["waits"] += 1
+            await task
+        return s
+
+    # ─── API ─────────────────────────────────────────────────────────────────
+    async def next(self, user_id:str, access_token:str|None,
+                   session_id:str="default") -> dict|None:
+        s = await self._ready(user_id, access_token, session_id, 1)
+        with self._lock:
+            if not s.tracks: return None
+            t = s.tracks.popleft()
+            s.served[t["id"]] = None
+            while len(s.served) > SERVED_MAX:
+                s.served.popitem(last=False)
+        self.counters["served"] += 1
+        self._ensure_refill(s)
+        return t
+
+    async def peek(self, user_id:str, access_token:str|None, n:int=5,
+                   session_id:str="default") -> list[dict]:
+        s = await self._ready(user_id, access_token, session_id, n)
+        with self._lock:
+            return list(s.tracks)[:n]
+
+    def drop(self, user_id:str, track_id:str):
+        """Remove a (disliked) track from all queued sessions of the user."""
+        with self._lock:
+            for (uid, _), s in self._sessions.items():
+                if uid != user_id: continue
+                before = len(s.tracks)
+                s.tracks = deque(t for t in s.tracks if t["id"] != track_id)
+                self.counters["dropped"] += before - len(s.tracks)
+
+    def reset(self, user_id:str):
+        """Forget the user's queued tracks (e.g. their taste profile changed a lot)."""
+        with self._lock:
+            for key in [k for k in self._sessions if k[0] == user_id]:
+                del self._sessions[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, sessions=len(self._sessions),
+                        queued=sum(len(s.tracks) for s in self._sessions.values()))
@@ -2,11 +2,17 @@
 """
 Spotify REST helpers
 2025‑04‑22 • + user‑top‑read scope & get_user_top_track_ids()
+• all calls go through the pooled client in spotify_client (keep-alive,
+  timeouts); the request-path helpers also have *_async twins
 """
-import os, base64, requests
+import os, base64, asyncio
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
+from fennec_ai_dj.spotify_client import spotify
+from fennec_ai_dj.metadata_cache import MetadataCache
+from fennec_ai_dj.feature_store import AudioFeatureStore
+
 # ─── ENV ─────────────────────────────────────────────────────────────────────
 load_dotenv()
 SPOTIFY_CLIENT_ID     = os.getenv("SPOTIFY_CLIENT_ID")
@@ -36,7 +42,7 @@ def get_spotify_auth_url() -> str:
 # ─── TOKEN EXCHANGE ──────────────────────────────────────────────────────────
 def get_access_token(code:str)->dict:
     auth = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-    r = requests.post(
+    r = spotify.post(
         "https://accounts.spotify.com/api/token",
         headers={
             "Authorization": f"Basic {auth}",
@@ -53,44 +59,54 @@ def get_access_token(code:str)->dict:
 # ─── BASIC HELPERS ───────────────────────────────────────────────────────────
 def _hdr(tok): return {"Authorization": f"Bearer {tok}"}
 
-def get_current_spotify_user_id(tok:str) -> str:
-    r = requests.get("https://api.spotify.com/v1/me", headers=_hdr(tok))
+def _json(r):
     if r.status_code!=200: raise HTTPException(r.status_code,r.text)
-    return r.json().get("id")
+    return r.json()
+
+def _get(path:str, tok:str, params:dict|None=None):
+    return _json(spotify.get(path, tok, params))
+
+async def _aget(path:str, tok:str, params:dict|None=None):
+    return _json(await spotify.aget(path, tok, params))
+
+def get_current_spotify_user_id(tok:str) -> str:
+    return _get("/me", tok).get("id")
 
 # ─── SEED COLLECTORS ─────────────────────────────────────────────────────────
+def _item_track_ids(js) -> list[str]:
+    return [i["track"]["id"] for i in js.get("items",[]) if i.get("track")]
+
+def _top_ids(js) -> list[str]:
+    return [t["id"] for t in js.get("items",[])]
+
 def get_user_saved_track_ids(tok:str, limit:int=20)->list[str]:
-    r = requests.get("https://api.spotify.com/v1/me/tracks",
-                     headers=_hdr(tok), params={"limit":limit})
-    if r.status_code!=200: raise HTTPException(r.status_code,r.text)
-    return [i["track"]["id"] for i in r.json().get("items",[]) if i.get("track")]
+    return _item_track_ids(_get("/me/tracks", tok, {"limit":limit}))
 
 def get_user_recent_track_ids(tok:str, limit:int=20)->list[str]:
-    r = requests.get("https://api.spotify.com/v1/me/player/recently-played",
-                     headers=_hdr(tok), params={"limit":limit})
-    if r.status_code!=200: raise HTTPException(r.status_code,r.text)
-    return [i["track"]["id"] for i in r.json().get("items",[]) if i.get("track")]
+    return _item_track_ids(_get("/me/player/recently-played", tok, {"limit":limit}))
 
 # ★ NEW – top tracks
 def get_user_top_track_ids(tok:str, limit:int=20, time_range:str="medium_term")->list[str]:
     """
-    time_range: short_term (4 weeks), medium_term (6 m, default), long_term (years)
+    time_range: short_term (4 weeks), medium_term (6 m, default), long_term (years)
     """
-    r = requests.get(
-        "https://api.spotify.com/v1/me/top/tracks",
-        headers=_hdr(tok),
-        params={"limit":limit, "time_range":time_range}
-    )
-    if r.status_code!=200: raise HTTPException(r.status_code,r.text)
-    return [t["id"] for t in r.json().get("items",[])]
+    return _top_ids(_get("/me/top/tracks", tok, {"limit":limit, "time_range":time_range}))
+
+async def get_user_saved_track_ids_async(tok:str, limit:int=20)->list[str]:
+    return _item_track_ids(await _aget("/me/tracks", tok, {"limit":limit}))
+
+async def get_user_recent_track_ids_async(tok:str, limit:int=20)->list[str]:
+    return _item_track_ids(await _aget("/me/player/recently-played", tok, {"limit":limit}))
+
+async def get_user_top_track_ids_async(tok:str, limit:int=20,
+                                       time_range:str="medium_term")->list[str]:
+    return _top_ids(await _aget("/me/top/tracks", tok, {"limit":limit, "time_range":time_range}))
 
 # ─── LEGACY / FEATURE LOOKUP (unchanged) ─────────────────────────────────────
 def get_recently_played_tracks(tok:str)->list[dict]:
-    url = "https://api.spotify.com/v1/me/player/recently-played"
-    r   = requests.get(url, headers=_hdr(tok), params={"limit":20})
-    if r.status_code!=200: raise HTTPException(r.status_code,r.text)
+    js = _get("/me/player/recently-played", tok, {"limit":20})
     tracks=[]
-    for item in r.json().get("items",[]):
+    for item in js.get("items",[]):
         track=item.get("track") or {}
         album=track.get("album",{})
         image=album.get("images",[{}])[0].get("url","")
@@ -106,11 +122,19 @@ def get_recently_played_tracks(tok:str)->list[dict]:
 
 def get_audio_features(ids:list[str], tok:str)->list[dict]:
     if not ids: return []
-    url="https://api.spotify.com/v1/audio-features"
-    r=requests.get(url, headers=_hdr(tok),
-                   params={"ids":",".join(list(dict.fromkeys(ids))[:100])})
+    r=spotify.get("/audio-features", tok,
+                  {"ids":",".join(list(dict.fromkeys(ids))[:100])})
     return r.json().get("audio_features",[]) if r.status_code==200 else []
 
+async def get_audio_features_async(ids:list[str], tok:str)->list[dict|None]:
+    """One /audio-features call (≤100 ids); raises on error so nothing gets cached."""
+    if not ids: return []
+    return (await _aget("/audio-features", tok,
+                        {"ids":",".join(ids[:100])})).get("audio_features",[])
+
+# features of seed tracks outside the catalog (fetched once, kept on disk)
+feature_store = AudioFeatureStore(fetch=get_audio_features_async)
+
 def get_recently_played_tracks_with_features(tok:str)->list[dict]:
     tracks=get_recently_played_tracks(tok)
     features=get_audio_features([t["id"] for t in tracks if t.get("id")], tok)
@@ -127,8 +151,7 @@ def get_track_metadata(track_id:str, access_token:str)->dict:
     Return {"album_name":str, "image_url":str} for a track id.
     If API fails, returns {}.
     """
-    url=f"https://api.spotify.com/v1/tracks/{track_id}"
-    r=requests.get(url, headers={"Authorization":f"Bearer {access_token}"})
+    r=spotify.get(f"/tracks/{track_id}", access_token)
     if r.status_code!=200:
         return {}
     data=r.json()
@@ -139,36 +162,66 @@ def get_track_metadata(track_id:str, access_token:str)->dict:
         "image_url" : images[0]["url"] if images else ""
     }
 
-_meta_cache: dict[str, dict] = {} 
+# ─── TRACK METADATA (album / image) ──────────────────────────────────────────
+META_BATCH = 50      # /v1/tracks accepts at most 50 ids per call
+meta_cache = MetadataCache()
 
-def get_tracks_metadata(ids:list[str], access_token:str) -> dict[str,dict]:
-    """
-    Batch‑fetch up to 50 track objects and return a mapping:
-       id → {"album_name": str, "image_url": str}
-    Uses an in‑process LRU cache so subsequent calls for the same IDs are free.
-    """
-    if not ids: return {}
-    # check cache first
-    out={tid:_meta_cache[tid] for tid in ids if tid in _meta_cache}
-    missing=[tid for tid in ids if tid not in _meta_cache]
-    if not missing:
-        return out
-
-    # Spotify batch endpoint (max 50)
-    url="https://api.spotify.com/v1/tracks"
-    r=requests.get(url, headers=_hdr(access_token),
-                   params={"ids":",".join(missing)})
-    if r.status_code!=200:
-        return out  # return whatever we already have
+def _chunks(ids:list[str], n:int=META_BATCH):
+    return [ids[i:i+n] for i in range(0, len(ids), n)]
 
+def _parse_tracks(r, asked:list[str]) -> tuple[dict[str,dict], list[str]]:
+    """(id → meta, ids Spotify answered null for). Errors → nothing cached."""
+    if r.status_code!=200:
+        return {}, []
+    metas={}
     for obj in r.json().get("tracks",[]):
         if not obj: continue
         album=obj.get("album",{})
         images=album.get("images",[])
-        meta={
+        metas[obj["id"]]={
             "album_name": album.get("name","Unknown"),
             "image_url":  images[0]["url"] if images else ""
         }
-        _meta_cache[obj["id"]]=meta
-        out[obj["id"]]=meta
+    return metas, [tid for tid in asked if tid not in metas]
+
+def get_tracks_metadata(ids:list[str], access_token:str) -> dict[str,dict]:
+    """
+    Batch‑fetch track objects and return a mapping:
+       id → {"album_name": str, "image_url": str}
+    Any number of ids: misses are split into 50-id /v1/tracks calls.
+    Backed by meta_cache (bounded LRU + on-disk store + negative entries).
+    """
+    if not ids: return {}
+    out, missing = meta_cache.get_many(ids)
+    for chunk in _chunks(missing):
+        metas, null = _parse_tracks(
+            spotify.get("/tracks", access_token, {"ids":",".join(chunk)}), chunk)
+        meta_cache.put_many(metas, null)
+        out |= metas
+    return out
+
+async def iter_tracks_metadata_async(ids:list[str], access_token:str):
+    """
+    Yield id → meta dicts as they resolve: cache hits first, then each
+    50-id /v1/tracks batch as soon as its response arrives.
+    """
+    if not ids: return
+    out, missing = meta_cache.get_many(ids)
+    if out: yield out
+    async def fetch(chunk):
+        return chunk, await spotify.aget("/tracks", access_token, {"ids":",".join(chunk)})
+    for fut in asyncio.as_completed([fetch(c) for c in _chunks(missing)]):
+        try:
+            chunk, r = await fut
+        except Exception:
+            continue                               # keep whatever we already have
+        metas, null = _parse_tracks(r, chunk)
+        meta_cache.put_many(metas, null)
+        if metas: yield metas
+
+async def get_tracks_metadata_async(ids:list[str], access_token:str) -> dict[str,dict]:
+    """Async twin of get_tracks_metadata; the 50-id batches run concurrently."""
+    out={}
+    async for metas in iter_tracks_metadata_async(ids, access_token):
+        out |= metas
     return out
@@ -0,0 +1,82 @@
+# fennec_ai_dj/spotify_client.py
+"""
+Shared HTTP transport for every Spotify call.
+
+• one pooled keep-alive connection set per process (sync + async flavour),
+  so repeated calls skip the TCP/TLS handshake
+• HTTP/2 when the optional `h2` package is installed
+• hard connect/read timeouts (env-configurable) – no call can hang a worker
+
+   from fennec_ai_dj.spotify_client import spotify
+   r = await spotify.aget("/me/tracks", tok, {"limit":25})
+"""
+from __future__ import annotations
+import os
+import httpx
+
+API_BASE     = "https://api.spotify.com/v1"
+CONNECT_TIMEOUT = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT    = float(os.getenv("SPOTIFY_READ_TIMEOUT",    "8"))
+MAX_CONNECTIONS = int(os.getenv("SPOTIFY_MAX_CONNECTIONS",   "50"))
+MAX_KEEPALIVE   = int(os.getenv("SPOTIFY_MAX_KEEPALIVE",     "20"))
+
+try:
+    import h2  # noqa: F401 – enables HTTP/2 in httpx
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+def _hdr(tok:str) -> dict: return {"Authorization": f"Bearer {tok}"}
+
+class SpotifyClient:
+    """Lazily created pooled clients; safe to share across requests."""
+
+    def __init__(self, base_url:str=API_BASE, connect_timeout:float=CONNECT_TIMEOUT,
+                 read_timeout:float=READ_TIMEOUT, max_connections:int=MAX_CONNECTIONS,
+                 max_keepalive:int=MAX_KEEPALIVE, http2:bool=HTTP2,
+                 transport:httpx.BaseTransport|None=None):
+        self.base_url = base_url
+        self.transport = transport            # e.g. an httpx.MockTransport stand-in
+        self.timeout  = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits   = httpx.Limits(max_connections=max_connections,
+                                     max_keepalive_connections=max_keepalive)
+        self.http2    = http2
+        self._sync:  httpx.Client|None = None
+        self._async: httpx.AsyncClient|None = None
+
+    @property
+    def sync(self) -> httpx.Client:
+        if self._sync is None:
+            self._sync = httpx.Client(base_url=self.base_url, timeout=self.timeout,
+                                      limits=self.limits, http2=self.http2,
+                                      transport=self.transport)
+        return self._sync
+
+    @property
+    def aio(self) -> httpx.AsyncClient:
+        if self._async is None:
+            self._async = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                            limits=self.limits, http2=self.http2,
+                                            transport=self.transport)
+        return self._async
+
+    # ─── verbs ───────────────────────────────────────────────────────────────
+    def get(self, path:str, tok:str, params:dict|None=None) -> httpx.Response:
+        return self.sync.get(path, headers=_hdr(tok), params=params)
+
+    async def aget(self, path:str, tok:str, params:dict|None=None) -> httpx.Response:
+        return await self.aio.get(path, headers=_hdr(tok), params=params)
+
+    def post(self, url:str, **kw) -> httpx.Response:
+        return self.sync.post(url, **kw)
+
+    # ─── lifecycle ───────────────────────────────────────────────────────────
+    async def aclose(self):
+        if self._async is not None:
+            await self._async.aclose()
+            self._async = None
+        if self._sync is not None:
+            self._sync.close()
+            self._sync = None
+
+spotify = SpotifyClient()
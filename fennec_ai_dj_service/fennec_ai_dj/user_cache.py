@@ -0,0 +1,87 @@
+# fennec_ai_dj/user_cache.py
+"""
+Per-user cache of Spotify seed ids (the taste profile lives in profile_store).
+
+• seeds are cached per source with their own TTL – top tracks barely move,
+  recently-played changes every song
+• bounded by LRU over users; hit/miss counters show the Spotify calls saved
+• ids are kept as int32 catalog codes (catalog.encode), 4 bytes per seed
+  instead of a 22-char str; entries are tagged with the catalog fingerprint
+  and read as a miss once a reload changes it
+• ids the catalog doesn't know are kept beside the codes as plain strings
+  (their features come from feature_store)
+
+   seed_cache.get_seeds(uid, "top", tag)        → (codes int32, extra ids) | None (miss/expired)
+   seed_cache.put_seeds(uid, "top", codes, tag, extra)
+"""
+from __future__ import annotations
+import os, time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+SOURCE_TTLS = {
+    "saved":  float(os.getenv("SEED_TTL_SAVED",  "600")),
+    "recent": float(os.getenv("SEED_TTL_RECENT", "60")),
+    "top":    float(os.getenv("SEED_TTL_TOP",    "3600")),
+}
+MAX_USERS = int(os.getenv("SEED_CACHE_MAX_USERS", "10000"))
+
+# ─── cache ───────────────────────────────────────────────────────────────────
+class _Entry:
+    __slots__ = ("seeds",)
+    def __init__(self):
+        self.seeds: dict[str,tuple[np.ndarray,float,str|None,tuple[str,...]]] = {}
+
+class UserSeedCache:
+    def __init__(self, ttls:dict[str,float]=SOURCE_TTLS, max_users:int=MAX_USERS,
+                 clock=time.monotonic):
+        self.ttls, self.max_users, self.clock = dict(ttls), max_users, clock
+        self._users: OrderedDict[str,_Entry] = OrderedDict()
+        self._lock = Lock()
+        self.counters = {"seed_hits":0, "seed_misses":0, "evictions":0}
+
+    def _entry(self, user_id:str, create:bool=True) -> _Entry|None:
+        e = self._users.get(user_id)
+        if e is not None:
+            self._users.move_to_end(user_id)
+        elif create:
+            e = self._users[user_id] = _Entry()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.counters["evictions"] += 1
+        return e
+
+    # ─── seeds ───────────────────────────────────────────────────────────────
+    def get_seeds(self, user_id:str, source:str,
+                  tag:str|None=None) -> tuple[np.ndarray,tuple[str,...]]|None:
+        with self._lock:
+            e = self._entry(user_id, create=False)
+            hit = e.seeds.get(source) if e else None
+            if hit and hit[2] == tag and self.clock() - hit[1] < self.ttls.get(source, 0):
+                self.counters["seed_hits"] += 1
+                return hit[0], hit[3]
+            self.counters["seed_misses"] += 1
+            return None
+
+    def put_seeds(self, user_id:str, source:str, codes, tag:str|None=None, extra=()):
+        codes = np.array(codes, dtype=np.int32)
+        codes.flags.writeable = False                      # shared with callers
+        with self._lock:
+            self._entry(user_id).seeds[source] = (codes, self.clock(), tag, tuple(extra))
+
+    def invalidate(self, user_id:str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["users"] = len(self._users)
+            c["bytes"] = sum(v[0].nbytes for e in self._users.values() for v in e.seeds.values())
+        looks = c["seed_hits"] + c["seed_misses"]
+        c["seed_hit_rate"] = round(c["seed_hits"]/looks, 3) if looks else 0.0
+        c["spotify_calls_saved"] = c["seed_hits"]
+        return c
+
+seed_cache = UserSeedCache()
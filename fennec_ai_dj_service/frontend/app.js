@@ -117,18 +117,19 @@ async function fetchSong(attempt = 0) {
   if (!deviceId) { songDisplay.innerText = '❌ Waiting for Spotify device…'; return; }
 
   try {
+    // server keeps a ranked queue per session and refills it in the background
     const res = await fetch(
-      `http://localhost:8000/recommendations?access_token=${accessToken}&user_id=${encodeURIComponent(userId)}`
+      `http://localhost:8000/queue/next?access_token=${accessToken}&user_id=${encodeURIComponent(userId)}`
     );
     if (res.status === 401) { relogin(); return; }
-    if (!res.ok) { console.error('recs error', await res.text()); songDisplay.innerText='❌ Recommendation error.'; return; }
+    if (!res.ok) { console.error('queue error', await res.text()); songDisplay.innerText='❌ Recommendation error.'; return; }
 
-    let recs = (await res.json()).recommendations || [];
-    recs = recs.filter(t => !dislikedSet.has(t.id));
-    if (!recs.length) { songDisplay.innerText = '🎶 No new tracks.'; return; }
-
-    const track = recs.find(t => t.uri);
-    if (!track) { if (attempt<3) return fetchSong(attempt+1); songDisplay.innerText='⚠️ No playable track.'; return; }
+    const track = (await res.json()).track;
+    if (!track) { songDisplay.innerText = '🎶 No new tracks.'; return; }
+    if (dislikedSet.has(track.id) || !track.uri) {
+      if (attempt<3) return fetchSong(attempt+1);
+      songDisplay.innerText='⚠️ No playable track.'; return;
+    }
 
     currentSong = track;
     skipGuard = true;                              // suppress the echo
@@ -208,6 +209,25 @@ async function sendFeedback(feedback){
   }
 }
 
+/////////////////////////////////////////////////////////////////////////////
+//  NDJSON stream reader
+/////////////////////////////////////////////////////////////////////////////
+async function* ndjson(res){
+  const reader=res.body.getReader(), dec=new TextDecoder();
+  let buf='';
+  for(;;){
+    const {value,done}=await reader.read();
+    if(done) break;
+    buf+=dec.decode(value,{stream:true});
+    let i;
+    while((i=buf.indexOf('\n'))>=0){
+      const line=buf.slice(0,i).trim(); buf=buf.slice(i+1);
+      if(line) yield JSON.parse(line);
+    }
+  }
+  if(buf.trim()) yield JSON.parse(buf);
+}
+
 /////////////////////////////////////////////////////////////////////////////
 //  CHAT COMMANDS
 /////////////////////////////////////////////////////////////////////////////
@@ -216,20 +236,33 @@ async function sendChatCommand(){
   chatResponse.innerText='🤖 Thinking…';
 
   try{
-    const res=await fetch('http://localhost:8000/command',{
+    // NDJSON stream: ranked tracks arrive first, album/image patches follow
+    const res=await fetch('http://localhost:8000/command/stream',{
       method:'POST',headers:{'Content-Type':'application/json'},
       body:JSON.stringify({user_id:userId,message:msg,access_token:accessToken})
     });
     if(res.status===401){relogin();return;}
-    const {recommendations}=await res.json();
-    if(recommendations?.length){
-      const t=recommendations[0];
-      skipGuard=true;
-      await playOnSpotify(t.uri);
-      displaySong(t);
-      djJump();
-      chatResponse.innerText='✅';
-    }else chatResponse.innerText='🤔 No match.';
+    if(!(res.headers.get('content-type')||'').includes('ndjson')){
+      await res.json();                            // control intent
+      chatResponse.innerText='🤔 No match.';
+    }else{
+      let playing=null;
+      for await (const ev of ndjson(res)){
+        if(ev.event==='track' && !playing && ev.track.uri && !dislikedSet.has(ev.track.id)){
+          playing=ev.track; currentSong=playing;
+          skipGuard=true;
+          await playOnSpotify(playing.uri);
+          displaySong(playing);
+          djJump();
+          chatResponse.innerText='✅';
+        }else if(ev.event==='patch' && playing && ev.id===playing.id){
+          if(ev.album_name) playing.album.name=ev.album_name;
+          if(ev.image_url)  playing.album.images[0].url=ev.image_url;
+          displaySong(playing);
+        }
+      }
+      if(!playing) chatResponse.innerText='🤔 No match.';
+    }
   }catch(e){
     console.error('chat error',e);
     chatResponse.innerText='❌ Chat error';
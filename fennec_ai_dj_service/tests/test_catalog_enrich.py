@@ -0,0 +1,90 @@
+# tests/test_catalog_enrich.py
+"""
+catalog_enrich against the in-process StandInSpotify (no network).
+
+   cd fennec_ai_dj_service && python -m pytest -q tests
+"""
+import os, time, asyncio
+import pandas as pd
+import pytest
+
+from fennec_ai_dj.spotify_client import SpotifyClient
+from fennec_ai_dj.local_ml.catalog_store import Catalog, build_catalog
+from fennec_ai_dj.local_ml.catalog_enrich import (
+    Enricher, StandInSpotify, _Token, _done_ids, apply_enrichment,
+)
+
+CSV = os.path.join(os.path.dirname(__file__), "..", "fennec_ai_dj", "local_ml", "cleaned_tracks.csv")
+
+@pytest.fixture(autouse=True)
+def _client_credentials(monkeypatch):
+    monkeypatch.setenv("SPOTIFY_CLIENT_ID", "stand-in")
+    monkeypatch.setenv("SPOTIFY_CLIENT_SECRET", "stand-in")
+
+@pytest.fixture
+def catalog(tmp_path):
+    csv = tmp_path / "tracks.csv"
+    pd.read_csv(CSV, nrows=120).to_csv(csv, index=False)
+    out = str(tmp_path / "catalog")
+    build_catalog(str(csv), out, enrichment=None, models_dir=None)
+    return out
+
+def _enrich(stub:StandInSpotify, ids:list[str], checkpoint:str, concurrency:int=2) -> dict:
+    async def go():
+        client = SpotifyClient(base_url="https://stand-in/v1", transport=stub.transport())
+        try:
+            enr = Enricher(client, _Token(None, "https://stand-in/api/token"), checkpoint, concurrency)
+            await enr.run(ids)
+            return enr.stats
+        finally:
+            await client.aclose()
+    return asyncio.run(go())
+
+def _ids(catalog_dir:str) -> list[str]:
+    return [b.decode("ascii") for b in Catalog(catalog_dir).ids_b]
+
+# ─── back-off / auth ─────────────────────────────────────────────────────────
+def test_429_waits_for_retry_after(tmp_path):
+    ids  = [f"t{i:05d}" for i in range(100)]
+    stub = StandInSpotify(rate_limit=1, retry_after=0.3)
+    t0   = time.monotonic()
+    stats = _enrich(stub, ids, str(tmp_path / "ck.jsonl"), concurrency=1)
+    assert time.monotonic() - t0 >= 0.3
+    assert stats["rate_limited"] == 1 and stats["failed"] == 0
+    assert sorted(stub.log["served"]) == ids
+
+def test_401_refreshes_client_credentials_token(tmp_path):
+    ids  = [f"t{i:05d}" for i in range(200)]
+    stub = StandInSpotify(token_ttl=1)
+    stats = _enrich(stub, ids, str(tmp_path / "ck.jsonl"), concurrency=1)
+    assert stub.log["401"] >= 1 and stub.log["token"] >= 2
+    assert stats["failed"] == 0 and stats["batches"] == 4
+    assert sorted(stub.log["served"]) == ids
+
+# ─── checkpoint ──────────────────────────────────────────────────────────────
+def test_resume_fetches_only_unanswered_ids(tmp_path):
+    ids, ck = [f"t{i:05d}" for i in range(150)], str(tmp_path / "ck.jsonl")
+    first = StandInSpotify(reject={ids[60]}, unknown={ids[3]})
+    stats = _enrich(first, ids, ck)
+    assert stats["failed"] == 1 and stats["missing"] == 1
+    done = _done_ids(ck)
+    assert done == set(ids) - set(ids[50:100])          # the null answer counts as done
+
+    second = StandInSpotify()
+    _enrich(second, [t for t in ids if t not in done], ck)
+    assert sorted(second.log["served"]) == ids[50:100]
+    assert _done_ids(ck) == set(ids)
+
+# ─── apply ───────────────────────────────────────────────────────────────────
+def test_apply_writes_checkpoint_into_catalog(catalog, tmp_path):
+    ids, ck = _ids(catalog), str(tmp_path / "ck.jsonl")
+    _enrich(StandInSpotify(unknown={ids[0]}), ids, ck)
+    assert apply_enrichment(catalog, ck) == len(ids) - 1
+
+    cat = Catalog(catalog)
+    assert cat["album"][0] == "Unknown" and cat["image_url"][0] == ""
+    for i in (1, len(ids) - 1):
+        want = StandInSpotify.track(ids[i])
+        assert cat["album"][i] == want["album"]["name"]
+        assert cat["image_url"][i] == want["album"]["images"][0]["url"]
+        assert cat["popularity"][i] == want["popularity"]